@@ -34,6 +34,8 @@ from routers.chatbot_dashboard import router as chatbot_dashboard_router
 
 # Import Firebase service for initialization
 from services.firebase_service import FirebaseService
+from services.analytics_ingest import analytics_events
+from services.analytics_rollups import analytics_rollups
 
 # Set up logging
 logging.basicConfig(
@@ -57,9 +59,18 @@ async def lifespan(app: FastAPI):
         
     logger.info("🔐 Authentication system initialized")
     logger.info("🏢 Multi-tenant architecture ready")
+    
+    # Start the background analytics writer
+    analytics_events.start()
     yield
     # Shutdown
     logger.info("🛑 SHELTR-AI API shutting down...")
+    
+    # Write out buffered analytics events before the process exits
+    await analytics_events.close()
+    logger.info(f"📊 Analytics events flushed: {analytics_events.get_stats()}")
+    await analytics_rollups.close()
+    logger.info(f"📊 Analytics rollups committed: {analytics_rollups.get_stats()}")
 
 # Create FastAPI application
 app = FastAPI(
@@ -6,6 +6,7 @@ Handles token verification, role-based access control, and tenant isolation
 from typing import Optional, Dict, Any, List
 from fastapi import HTTPException, Depends, Header, status
 from services.firebase_service import firebase_service, UserRole
+from services.platform_metrics import platform_metrics
 
 class AuthMiddleware:
     """Authentication middleware for FastAPI"""
@@ -59,6 +60,9 @@ class AuthMiddleware:
                 'shelter_id': decoded_token.get('shelter_id')
             }
             
+            # Counts the user as active today in the background (a no-op after their first request of the day)
+            platform_metrics.record_user_active(user_info['uid'])
+            
             return user_info
             
         except Exception as e:
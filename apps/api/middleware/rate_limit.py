@@ -0,0 +1,40 @@
+"""
+Rate Limiting Dependencies for SHELTR-AI FastAPI
+Wraps the sliding-window rate limiter as reusable route dependencies
+"""
+
+from typing import Callable, Optional
+from fastapi import HTTPException, Request, status
+
+from services.rate_limiter import RateLimiter, RateLimitResult
+
+def client_ip(request: Request) -> str:
+    """Default rate-limit key: the first forwarded address, else the peer address"""
+    forwarded = request.headers.get("X-Forwarded-For")
+    if forwarded:
+        return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+def rate_limit(limiter: RateLimiter, key_func: Optional[Callable[[Request], str]] = None):
+    """
+    Build a dependency that enforces a limiter on a route
+
+    Usage:
+        @router.get("/items", dependencies=[Depends(rate_limit(items_limiter))])
+
+    The result is stored on request.state.rate_limit for handlers that report remaining quota.
+    """
+    key_func = key_func or client_ip
+
+    async def rate_limit_checker(request: Request) -> RateLimitResult:
+        result = await limiter.check(key_func(request))
+        request.state.rate_limit = result
+        if not result.allowed:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Rate limit exceeded. Try again in a few minutes.",
+                headers=result.headers()
+            )
+        return result
+
+    return rate_limit_checker
@@ -8,6 +8,7 @@ from datetime import datetime, timedelta
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from fastapi.security import HTTPBearer
 from services.analytics_service import analytics_service
+from services.response_cache import analytics_response_cache
 from middleware.auth_middleware import (
     get_current_user, require_super_admin, require_admin_or_super
 )
@@ -34,6 +35,15 @@ class ErrorResponse(BaseModel):
     error: str
     timestamp: str
 
+def _is_cacheable(metrics: Dict[str, Any]) -> bool:
+    """Error payloads are returned but never cached"""
+    return metrics.get("status") != "error" and "error" not in metrics
+
+async def get_cached_platform_metrics(current_user: Dict[str, Any]) -> Dict[str, Any]:
+    """Platform metrics shared by every viewer with the same role and tenant, refreshed in the background"""
+    key = ("platform", current_user.get('role'), current_user.get('tenant_id'))
+    return await analytics_response_cache.get(key, analytics_service.get_platform_metrics, _is_cacheable)
+
 @router.get(
     "/test-platform",
     response_model=AnalyticsResponse,
@@ -83,7 +93,7 @@ async def get_platform_analytics(
     try:
         logger.info(f"Super Admin {current_user.get('email')} requested platform analytics")
         
-        metrics = await analytics_service.get_platform_metrics()
+        metrics = await get_cached_platform_metrics(current_user)
         
         return AnalyticsResponse(
             success=True,
@@ -151,7 +161,7 @@ async def get_realtime_metrics(
     try:
         logger.info(f"Super Admin {current_user.get('email')} requested real-time metrics")
         
-        metrics = await analytics_service.get_platform_metrics()
+        metrics = await get_cached_platform_metrics(current_user)
         
         # Extract real-time relevant data
         realtime_data = {
@@ -170,7 +180,8 @@ async def get_realtime_metrics(
                 "occupancy_rate": metrics.get("shelters", {}).get("occupancy_rate", 0)
             },
             "system": metrics.get("system", {}),
-            "last_updated": datetime.now().isoformat()
+            # When the (possibly cached) metrics were computed
+            "last_updated": metrics.get("timestamp", datetime.now().isoformat())
         }
         
         return AnalyticsResponse(
@@ -299,12 +310,16 @@ async def get_dashboard_analytics(
         
         if current_role == 'super_admin':
             # Super admin gets full platform metrics
-            metrics = await analytics_service.get_platform_metrics()
+            metrics = await get_cached_platform_metrics(current_user)
         elif current_role == 'admin':
             # Shelter admin gets shelter-specific metrics
             # TODO: Get shelter_id from user profile
             shelter_id = current_user.get('shelter_id', 'default-shelter')
-            metrics = await analytics_service.get_shelter_analytics(shelter_id)
+            metrics = await analytics_response_cache.get(
+                ("shelter", current_role, current_user.get('tenant_id'), shelter_id),
+                lambda: analytics_service.get_shelter_analytics(shelter_id),
+                _is_cacheable
+            )
         else:
             # Participants and donors get limited metrics
             metrics = {
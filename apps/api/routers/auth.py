@@ -7,6 +7,7 @@ from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from fastapi.security import HTTPBearer
 from services.firebase_service import firebase_service, UserRole, CustomClaims
+from services.platform_metrics import platform_metrics
 from middleware.auth_middleware import (
     get_current_user, require_super_admin, require_admin_or_super,
     auth_middleware
@@ -86,6 +87,7 @@ async def register_user(user_data: UserCreate):
             profile_data, 
             tenant_id
         )
+        await platform_metrics.record_user_created(user_data.role.value, user_data.shelter_id)
         
         # Create user response
         user_response = UserResponse(
@@ -252,6 +254,10 @@ async def update_user_role(
         # Get new role permissions
         permissions = firebase_service.get_role_permissions(role_data.role)
         
+        # Read the current claims before they are replaced
+        current_claims = await firebase_service.get_user_claims(user_id)
+        current_tenant_id = current_claims.get('tenant_id')
+        
         # Update custom claims
         await firebase_service.update_user_role(
             user_id,
@@ -260,11 +266,14 @@ async def update_user_role(
             permissions
         )
         
-        # Update user profile in Firestore
-        # First, get current profile to move it if tenant changed
-        current_claims = await firebase_service.get_user_claims(user_id)
-        current_tenant_id = current_claims.get('tenant_id')
+        await platform_metrics.record_user_role_changed(
+            current_claims.get('role'),
+            role_data.role.value,
+            current_claims.get('shelter_id'),
+            role_data.shelter_id
+        )
         
+        # Update user profile in Firestore, moving it if the tenant changed
         if current_tenant_id and current_tenant_id != tenant_id:
             # Move user profile to new tenant
             old_collection = f"tenants/{current_tenant_id}/users"
@@ -420,6 +429,7 @@ async def delete_user(
         
         # Delete Firebase user
         firebase_service.auth.delete_user(user_id)
+        await platform_metrics.record_user_deleted(user_claims.get('role'), user_claims.get('shelter_id'))
         
         logger.info(f"User {user_id} deleted by {current_user['uid']}")
         
@@ -15,6 +15,7 @@ import os
 from services.chatbot.orchestrator import chatbot_orchestrator, ChatResponse
 from middleware.auth_middleware import get_current_user
 from services.analytics_service import analytics_service
+from services.websocket_hub import connection_manager
 
 logger = logging.getLogger(__name__)
 
@@ -48,33 +49,8 @@ class ConversationHistory(BaseModel):
     user_role: str
     created_at: str
 
-# WebSocket connection manager
-class ConnectionManager:
-    """Manages WebSocket connections for real-time chat"""
-    
-    def __init__(self):
-        self.active_connections: Dict[str, WebSocket] = {}
-    
-    async def connect(self, websocket: WebSocket, user_id: str):
-        """Accept a WebSocket connection"""
-        await websocket.accept()
-        self.active_connections[user_id] = websocket
-        logger.info(f"WebSocket connected for user {user_id}")
-    
-    def disconnect(self, user_id: str):
-        """Remove a WebSocket connection"""
-        if user_id in self.active_connections:
-            del self.active_connections[user_id]
-            logger.info(f"WebSocket disconnected for user {user_id}")
-    
-    async def send_personal_message(self, message: str, user_id: str):
-        """Send a message to a specific user"""
-        if user_id in self.active_connections:
-            websocket = self.active_connections[user_id]
-            await websocket.send_text(message)
-
-# Global connection manager instance
-manager = ConnectionManager()
+# WebSocket connection manager (per-connection send queues, per-user ordered processing)
+manager = connection_manager
 
 @router.post(
     "/message",
@@ -305,65 +281,97 @@ async def submit_feedback(
             detail=f"Failed to submit feedback: {str(e)}"
         )
 
+async def handle_websocket_message(user_id: str, message_data: Dict[str, Any]):
+    """Process one chat message from a WebSocket and send the reply to all of the user's connections"""
+    # Extract message and user info
+    message = message_data.get("message", "")
+    user_role = message_data.get("user_role", "participant")
+    
+    logger.info(f"WebSocket message from {user_id}: {message[:50]}...")
+    
+    if message_data.get("stream"):
+        # Streaming clients get incremental deltas, then the usual bot_response frame
+        response_data = None
+        async for frame in chatbot_orchestrator.process_message_stream(
+            message=message,
+            user_id=user_id,
+            user_role=user_role
+        ):
+            if frame["type"] == "delta":
+                await manager.send_to_user(user_id, {"type": "bot_response_delta", "content": frame["content"]})
+            else:
+                response_data = {**frame, "type": "bot_response"}
+        
+        await manager.send_to_user(user_id, response_data)
+        agent_used = response_data["agent_used"]
+    else:
+        # Process through chatbot orchestrator
+        response = await chatbot_orchestrator.process_message(
+            message=message,
+            user_id=user_id,
+            user_role=user_role
+        )
+        
+        # Send response back to client
+        response_data = {
+            "type": "bot_response",
+            "message": response.message,
+            "actions": response.actions,
+            "follow_up": response.follow_up,
+            "escalation_triggered": response.escalation_triggered,
+            "agent_used": response.agent_used,
+            "timestamp": response.timestamp
+        }
+        
+        await manager.send_to_user(user_id, response_data)
+        agent_used = response.agent_used
+    
+    # Track interaction
+    await analytics_service.track_event(
+        event_type="websocket_chat",
+        user_id=user_id,
+        metadata={
+            "message_length": len(message),
+            "agent_used": agent_used,
+            "websocket": True,
+            "streamed": bool(message_data.get("stream"))
+        }
+    )
+
 @router.websocket("/ws/{user_id}")
 async def websocket_endpoint(websocket: WebSocket, user_id: str):
     """
     WebSocket endpoint for real-time chat functionality.
+    
+    The read loop only parses and queues messages: processing runs per user in arrival order,
+    and replies go through each connection's bounded send queue. The server sends
+    {"type": "ping"} heartbeats; clients may answer with {"type": "pong"}.
     """
-    await manager.connect(websocket, user_id)
+    connection = await manager.connect(websocket, user_id)
     
     try:
         while True:
             # Receive message from client
             data = await websocket.receive_text()
+            connection.touch()
             message_data = json.loads(data)
             
-            # Extract message and user info
-            message = message_data.get("message", "")
-            user_role = message_data.get("user_role", "participant")
-            
-            logger.info(f"WebSocket message from {user_id}: {message[:50]}...")
-            
-            # Process through chatbot orchestrator
-            response = await chatbot_orchestrator.process_message(
-                message=message,
-                user_id=user_id,
-                user_role=user_role
-            )
-            
-            # Send response back to client
-            response_data = {
-                "type": "bot_response",
-                "message": response.message,
-                "actions": response.actions,
-                "follow_up": response.follow_up,
-                "escalation_triggered": response.escalation_triggered,
-                "agent_used": response.agent_used,
-                "timestamp": response.timestamp
-            }
+            if message_data.get("type") == "pong":
+                continue
             
-            await manager.send_personal_message(
-                json.dumps(response_data), 
-                user_id
-            )
-            
-            # Track interaction
-            await analytics_service.track_event(
-                event_type="websocket_chat",
-                user_id=user_id,
-                metadata={
-                    "message_length": len(message),
-                    "agent_used": response.agent_used,
-                    "websocket": True
-                }
-            )
+            if not manager.submit(user_id, lambda message_data=message_data: handle_websocket_message(user_id, message_data)):
+                await connection.send(json.dumps({
+                    "type": "error",
+                    "error": "Too many messages in progress. Please wait for a response.",
+                    "timestamp": datetime.now().isoformat()
+                }))
             
     except WebSocketDisconnect:
-        manager.disconnect(user_id)
         logger.info(f"WebSocket disconnected for user {user_id}")
     except Exception as e:
         logger.error(f"WebSocket error for user {user_id}: {str(e)}")
-        manager.disconnect(user_id)
+    finally:
+        await manager.disconnect(connection)
 
 @router.post(
     "/test-message",
@@ -441,7 +449,8 @@ async def chatbot_health():
                 "configured": openai_configured,
                 "status": "ready" if openai_configured else "not_configured"
             },
-            "active_connections": len(manager.active_connections),
+            "active_connections": manager.connection_count(),
+            "websocket": manager.get_stats(),
             "features": {
                 "intelligent_responses": openai_configured,
                 "context_awareness": openai_configured,
@@ -3,6 +3,7 @@
 import os
 import json
 import uuid
+import asyncio
 import logging
 from datetime import datetime, timezone
 from typing import Dict, Any, Optional
@@ -12,6 +13,7 @@ from pydantic import BaseModel, Field
 
 from services.demo_participant_service import DemoParticipantService
 from services.firebase_service import FirebaseService
+from services.platform_metrics import platform_metrics
 logger = logging.getLogger(__name__)
 
 # Initialize services
@@ -178,10 +180,14 @@ async def create_payment_session(request: DemoDonationRequest):
         # Generate unique donation ID
         donation_id = str(uuid.uuid4())
         
+        # Attribute the donation to the participant's shelter for the per-shelter totals
+        shelter_id = await asyncio.to_thread(get_participant_shelter_id, request.participant_id)
+        
         # Create donation record
         donation_data = {
             "id": donation_id,
             "participant_id": request.participant_id,
+            "shelter_id": shelter_id,
             "amount": {
                 "total": request.amount,
                 "currency": "USD"
@@ -199,6 +205,7 @@ async def create_payment_session(request: DemoDonationRequest):
         
         # Save to Firestore
         firebase_service.db.collection('demo_donations').document(donation_id).set(donation_data)
+        await platform_metrics.record_donation(donation_data["amount"], donation_data["created_at"], shelter_id)
         
         logger.info(f"Created payment session for donation: {donation_id}")
         
@@ -219,6 +226,16 @@ async def create_payment_session(request: DemoDonationRequest):
             detail=f"Failed to create payment session: {str(e)}"
         )
 
+def get_participant_shelter_id(participant_id: str) -> Optional[str]:
+    """Shelter of a participant from their user profile, or None if it cannot be found"""
+    try:
+        user_doc = firebase_service.db.collection('users').document(participant_id).get(field_paths=['shelter_id'])
+        if user_doc.exists:
+            return user_doc.to_dict().get('shelter_id')
+    except Exception as e:
+        logger.warning(f"Could not look up shelter for participant {participant_id}: {e}")
+    return None
+
 async def process_demo_webhook_notification(notification: Dict[str, Any]) -> None:
     """
     Process Adyen webhook notification for demo donation
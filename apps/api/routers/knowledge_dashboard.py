@@ -153,6 +153,7 @@ async def update_knowledge_document_from_file(
     try:
         from services.knowledge_service import knowledge_service
         from services.embeddings_service import EmbeddingsService
+        from services.vector_index import vector_index
         
         logger.info(f"Updating document {document_id} from file: {file.filename}")
         
@@ -202,6 +203,7 @@ async def update_knowledge_document_from_file(
             logger.info(f"Deleting {len(existing_chunks)} existing chunks")
             for chunk in existing_chunks:
                 chunk.reference.delete()
+            vector_index.remove_document(document_id)
             
             # Generate new embeddings
             metadata = {
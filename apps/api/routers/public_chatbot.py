@@ -5,25 +5,26 @@ Provides AI-powered chatbot endpoints for anonymous/public users
 
 from typing import Dict, Any, List, Optional
 from fastapi import APIRouter, HTTPException, status, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
-from datetime import datetime, timedelta
+from datetime import datetime
 import logging
 import json
-from collections import defaultdict
 
 from services.chatbot.orchestrator import chatbot_orchestrator, ChatResponse
 from services.analytics_service import analytics_service
+from services.rate_limiter import RateLimiter
+from services.semantic_cache import semantic_response_cache
 
 logger = logging.getLogger(__name__)
 
 # Create router
 router = APIRouter(prefix="/chatbot", tags=["Public Chatbot"])
 
-# Rate limiting storage (in production, use Redis)
-rate_limit_store = defaultdict(list)
+# Rate limiting (set RATE_LIMIT_BACKEND=redis to share limits across workers)
 RATE_LIMIT_REQUESTS = 10  # requests per window
 RATE_LIMIT_WINDOW = 300   # 5 minutes in seconds
+public_chat_limiter = RateLimiter(RATE_LIMIT_REQUESTS, RATE_LIMIT_WINDOW, name="public_chat")
 
 # Request/Response Models
 class PublicChatMessage(BaseModel):
@@ -45,24 +46,84 @@ class PublicChatResponse(BaseModel):
     timestamp: str
     rate_limit_remaining: int
 
-def check_rate_limit(user_id: str, request: Request) -> tuple[bool, int]:
-    """Check if user is within rate limits"""
-    now = datetime.now()
-    user_requests = rate_limit_store[user_id]
-    
-    # Remove old requests outside the window
-    cutoff_time = now - timedelta(seconds=RATE_LIMIT_WINDOW)
-    user_requests[:] = [req_time for req_time in user_requests if req_time > cutoff_time]
-    
-    # Check if user is within limit
-    if len(user_requests) >= RATE_LIMIT_REQUESTS:
-        return False, 0
+async def check_rate_limit(user_id: str, request: Request) -> int:
+    """Consume one request from the session's quota, returning what remains or raising 429"""
+    result = await public_chat_limiter.check(user_id)
+    if not result.allowed:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"Rate limit exceeded. Try again in a few minutes.",
+            headers=result.headers()
+        )
+    return result.remaining
+
+def build_public_context(message_data: PublicChatMessage, client_ip: str) -> Dict[str, Any]:
+    """Enhanced context for public users"""
+    enhanced_context = {
+        "session_type": "public",
+        "anonymous": True,
+        "page": message_data.conversation_context.get("page", "/") if message_data.conversation_context else "/",
+        "first_time_visitor": True,  # Could be enhanced with session tracking
+        "rate_limited": False,
+        "client_info": {
+            "ip_hash": hash(client_ip) % 10000,  # Anonymized IP hash
+            "user_agent": message_data.conversation_context.get("user_agent", "unknown") if message_data.conversation_context else "unknown"
+        }
+    }
     
-    # Add current request
-    user_requests.append(now)
-    remaining = RATE_LIMIT_REQUESTS - len(user_requests)
+    # Merge with provided context
+    if message_data.conversation_context:
+        enhanced_context.update(message_data.conversation_context)
     
-    return True, remaining
+    return enhanced_context
+
+def build_public_actions(message: str, response_actions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Add public-specific actions"""
+    public_actions = []
+    if response_actions:
+        # If we have specific actions from FAQ/agent, use those primarily
+        public_actions.extend(response_actions)
+    else:
+        # Only add generic keyword-based actions if no specific actions exist
+        message_lower = message.lower()
+        if any(word in message_lower for word in ["donate", "donation", "give", "help", "support"]):
+            public_actions.extend([
+                {"type": "link", "text": "Learn About Donations", "url": "/scan-give"},
+                {"type": "link", "text": "View Impact", "url": "/impact"}
+            ])
+        elif any(word in message_lower for word in ["about", "what", "platform", "sheltr"]):
+            public_actions.extend([
+                {"type": "link", "text": "About SHELTR", "url": "/about"},
+                {"type": "link", "text": "Our Team", "url": "/team"}
+            ])
+        elif any(word in message_lower for word in ["token", "blockchain", "crypto"]):
+            public_actions.append(
+                {"type": "link", "text": "SHELTR Tokenomics", "url": "/tokenomics"}
+            )
+    return public_actions
+
+async def track_public_interaction(
+    message_data: PublicChatMessage,
+    enhanced_context: Dict[str, Any],
+    agent_used: Optional[str],
+    response_length: int,
+    actions_provided: int
+):
+    """Track analytics (anonymized)"""
+    try:
+        await analytics_service.track_event(
+            event_type="public_chat_interaction",
+            user_id=f"public_{hash(message_data.user_id) % 10000}",  # Anonymized
+            data={
+                "message_length": len(message_data.message),
+                "page": enhanced_context.get("page", "/"),
+                "agent_used": agent_used,
+                "response_length": response_length,
+                "actions_provided": actions_provided
+            }
+        )
+    except Exception as e:
+        logger.warning(f"Analytics tracking failed for public chat: {e}")
 
 @router.post(
     "/public",
@@ -76,80 +137,32 @@ async def public_chat(message_data: PublicChatMessage, request: Request):
     """
     try:
         # Rate limiting check
-        allowed, remaining = check_rate_limit(message_data.user_id, request)
-        if not allowed:
-            raise HTTPException(
-                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                detail=f"Rate limit exceeded. Try again in a few minutes."
-            )
+        remaining = await check_rate_limit(message_data.user_id, request)
         
         # Log public interaction (anonymized)
         client_ip = request.headers.get("X-Forwarded-For", request.client.host if request.client else "unknown")
         logger.info(f"Public chat from {client_ip[:8]}... - Session: {message_data.user_id[:8]}...")
         
-        # Enhanced context for public users
-        enhanced_context = {
-            "session_type": "public",
-            "anonymous": True,
-            "page": message_data.conversation_context.get("page", "/") if message_data.conversation_context else "/",
-            "first_time_visitor": True,  # Could be enhanced with session tracking
-            "rate_limited": False,
-            "client_info": {
-                "ip_hash": hash(client_ip) % 10000,  # Anonymized IP hash
-                "user_agent": message_data.conversation_context.get("user_agent", "unknown") if message_data.conversation_context else "unknown"
-            }
-        }
-        
-        # Merge with provided context
-        if message_data.conversation_context:
-            enhanced_context.update(message_data.conversation_context)
+        enhanced_context = build_public_context(message_data, client_ip)
         
         # Process message through orchestrator
         response = await chatbot_orchestrator.process_message(
             message=message_data.message,
             user_id=message_data.user_id,
             user_role="public",  # Force public role
-            conversation_context=enhanced_context
+            conversation_context=enhanced_context,
+            cache_responses=True  # Visitors mostly ask the same questions
         )
         
-        # Add public-specific actions
-        public_actions = []
-        if response.actions:
-            # If we have specific actions from FAQ/agent, use those primarily
-            public_actions.extend(response.actions)
-        else:
-            # Only add generic keyword-based actions if no specific actions exist
-            message_lower = message_data.message.lower()
-            if any(word in message_lower for word in ["donate", "donation", "give", "help", "support"]):
-                public_actions.extend([
-                    {"type": "link", "text": "Learn About Donations", "url": "/scan-give"},
-                    {"type": "link", "text": "View Impact", "url": "/impact"}
-                ])
-            elif any(word in message_lower for word in ["about", "what", "platform", "sheltr"]):
-                public_actions.extend([
-                    {"type": "link", "text": "About SHELTR", "url": "/about"},
-                    {"type": "link", "text": "Our Team", "url": "/team"}
-                ])
-            elif any(word in message_lower for word in ["token", "blockchain", "crypto"]):
-                public_actions.append(
-                    {"type": "link", "text": "SHELTR Tokenomics", "url": "/tokenomics"}
-                )
+        public_actions = build_public_actions(message_data.message, response.actions)
         
-        # Track analytics (anonymized)
-        try:
-            await analytics_service.track_event(
-                event_type="public_chat_interaction",
-                user_id=f"public_{hash(message_data.user_id) % 10000}",  # Anonymized
-                data={
-                    "message_length": len(message_data.message),
-                    "page": enhanced_context.get("page", "/"),
-                    "agent_used": response.agent_used,
-                    "response_length": len(response.message),
-                    "actions_provided": len(public_actions)
-                }
-            )
-        except Exception as e:
-            logger.warning(f"Analytics tracking failed for public chat: {e}")
+        await track_public_interaction(
+            message_data,
+            enhanced_context,
+            response.agent_used,
+            len(response.message),
+            len(public_actions)
+        )
         
         return PublicChatResponse(
             success=True,
@@ -194,6 +207,65 @@ async def public_chat(message_data: PublicChatMessage, request: Request):
             rate_limit_remaining=remaining if 'remaining' in locals() else RATE_LIMIT_REQUESTS
         )
 
+@router.post(
+    "/public/stream",
+    summary="Streaming public chatbot endpoint",
+    description="Server-sent events variant of the public chatbot: 'delta' events followed by one 'complete' event"
+)
+async def public_chat_stream(message_data: PublicChatMessage, request: Request):
+    """
+    Stream public chatbot replies as they are generated
+    """
+    # Rate limiting check
+    remaining = await check_rate_limit(message_data.user_id, request)
+    
+    client_ip = request.headers.get("X-Forwarded-For", request.client.host if request.client else "unknown")
+    logger.info(f"Public chat stream from {client_ip[:8]}... - Session: {message_data.user_id[:8]}...")
+    enhanced_context = build_public_context(message_data, client_ip)
+    
+    def sse(event: str, data: Dict[str, Any]) -> str:
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    
+    async def event_stream():
+        async for frame in chatbot_orchestrator.process_message_stream(
+            message=message_data.message,
+            user_id=message_data.user_id,
+            user_role="public",  # Force public role
+            conversation_context=enhanced_context,
+            cache_responses=True
+        ):
+            if frame["type"] == "delta":
+                yield sse("delta", {"content": frame["content"]})
+                continue
+            
+            public_actions = build_public_actions(message_data.message, frame["actions"])
+            yield sse("complete", {
+                "success": True,
+                "response": frame["message"],
+                "actions": public_actions,
+                "follow_up": frame["follow_up"],
+                "escalation_triggered": frame["escalation_triggered"],
+                "agent_used": frame["agent_used"] or "public_support",
+                "citations": frame["citations"],
+                "conversation_id": f"public_{message_data.user_id}_{int(datetime.now().timestamp())}",
+                "timestamp": datetime.now().isoformat(),
+                "rate_limit_remaining": remaining
+            })
+            
+            await track_public_interaction(
+                message_data,
+                enhanced_context,
+                frame["agent_used"],
+                len(frame["message"]),
+                len(public_actions)
+            )
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.get(
     "/public/health",
     summary="Public chatbot health check",
@@ -207,13 +279,18 @@ async def public_chatbot_health():
         "service": "public_chatbot",
         "rate_limit": {
             "requests_per_window": RATE_LIMIT_REQUESTS,
-            "window_seconds": RATE_LIMIT_WINDOW
+            "window_seconds": RATE_LIMIT_WINDOW,
+            "algorithm": "sliding_window_counter",
+            "stats": public_chat_limiter.get_stats()
         },
+        "response_cache": semantic_response_cache.get_stats(),
         "features": {
             "anonymous_support": True,
             "rate_limiting": True,
             "analytics_tracking": True,
-            "fallback_responses": True
+            "fallback_responses": True,
+            "streaming": True,
+            "semantic_response_cache": semantic_response_cache.enabled
         },
         "timestamp": datetime.now().isoformat()
     })
@@ -8,11 +8,13 @@ from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
 from datetime import datetime, timezone
 import uuid
+import asyncio
 from firebase_admin import firestore
 
 from typing import Dict
 from middleware.auth_middleware import get_current_user
 from services.firebase_service import firebase_service
+from services.firestore_aggregates import firestore_aggregates
 
 router = APIRouter(prefix="/services", tags=["Services"])
 
@@ -108,19 +110,22 @@ async def get_available_services(
             services_ref = services_ref.where('category', '==', category)
         
         # Get services
-        services_docs = services_ref.stream()
+        services_docs = list(services_ref.stream())
+        
+        # Calculate current bookings for every service concurrently
+        booking_counts = await asyncio.gather(*(
+            firestore_aggregates.count(
+                firebase_service.db.collection('appointments')
+                .where('service_id', '==', doc.id)
+                .where('status', 'in', ['scheduled', 'confirmed'])
+            )
+            for doc in services_docs
+        ))
         services = []
         
-        for doc in services_docs:
+        for doc, current_bookings in zip(services_docs, booking_counts):
             service_data = doc.to_dict()
             service_data['id'] = doc.id
-            
-            # Calculate current bookings
-            bookings_ref = firebase_service.db.collection('appointments')\
-                .where('service_id', '==', doc.id)\
-                .where('status', 'in', ['scheduled', 'confirmed'])
-            
-            current_bookings = len(list(bookings_ref.stream()))
             service_data['current_bookings'] = current_bookings
             
             # Calculate next available slot (simplified)
@@ -154,7 +159,7 @@ async def book_service(
             .where('service_id', '==', booking.service_id)\
             .where('status', 'in', ['scheduled', 'confirmed'])
         
-        current_bookings = len(list(bookings_ref.stream()))
+        current_bookings = await firestore_aggregates.count(bookings_ref)
         if current_bookings >= service_data.get('max_capacity', 1):
             raise HTTPException(status_code=400, detail="Service is fully booked")
         
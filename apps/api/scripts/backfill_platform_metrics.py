@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Backfill Materialized Platform Metrics
+Recomputes the platform_metrics aggregates from the users, demo_donations and shelters collections,
+and optionally the hourly/daily/monthly analytics rollups from analytics_events.
+Run once before relying on the materialized dashboard, and again after bulk imports or shelter edits.
+"""
+
+import firebase_admin
+import os
+import sys
+import asyncio
+import logging
+from dotenv import load_dotenv
+
+# Load environment variables from .env file (same as main.py)
+load_dotenv()
+
+# Add the API directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.platform_metrics import platform_metrics
+from services.analytics_rollups import analytics_rollups
+
+# Initialize Firebase
+if not firebase_admin._apps:
+    firebase_admin.initialize_app()
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+async def main():
+    """Main function with command line interface"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Backfill materialized platform metrics')
+    parser.add_argument('--status', '-s', action='store_true', help='Show the stored aggregates without rebuilding')
+    parser.add_argument('--rollups', '-r', type=int, metavar='DAYS', help='Also rebuild analytics rollups for the last DAYS days')
+
+    args = parser.parse_args()
+
+    if args.status:
+        snapshot = await platform_metrics.get_snapshot()
+        if not snapshot:
+            logger.info("❌ Platform metrics have not been backfilled yet")
+            return
+        users, donations, shelters = snapshot['users'], snapshot['donations'], snapshot['shelters']
+        logger.info(f"👥 Users: {users.get('total', 0)} {users.get('by_role', {})}")
+        logger.info(f"💰 Donations: {donations.get('total_count', 0)} totalling ${donations.get('total_amount', 0):,.2f}")
+        logger.info(f"🏠 Shelters: {shelters.get('total_shelters', 0)} ({shelters.get('active_shelters', 0)} active)")
+        return
+
+    logger.info("🔄 Rebuilding platform metrics from source collections...")
+    summary = await platform_metrics.rebuild()
+    logger.info(f"✅ Backfill complete: {summary}")
+
+    if args.rollups:
+        logger.info(f"🔄 Rebuilding analytics rollups for the last {args.rollups} days...")
+        summary = await analytics_rollups.rebuild(args.rollups)
+        logger.info(f"✅ Rollups rebuilt: {summary}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for the chatbot intent and user-role classifiers
+Compares the precompiled single-pass matchers with the per-pattern re.search scan they replaced
+"""
+
+import os
+import re
+import sys
+import time
+import asyncio
+import logging
+
+# Add the API directory to the path
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from services.chatbot.orchestrator import IntentClassifier
+from services.chatbot.user_classifier import UserClassifier
+
+# Representative chat traffic across roles and intents
+CORPUS = [
+    "Hi, what is SHELTR and how does it work?",
+    "How do I donate to someone I saw downtown?",
+    "I want to donate but where does my money go?",
+    "I'm homeless and I need shelter tonight, nowhere to go",
+    "Can I book a meal for tomorrow at the downtown shelter?",
+    "I need help with my account, the login is not working",
+    "I run a shelter and want to add my shelter to the platform",
+    "What services are available for participants?",
+    "I haven't eaten in two days and I'm scared",
+    "How can I give money without cash? Is there a QR code?",
+    "I'm a shelter administrator, how do I manage participants?",
+    "Tell me about the tokenomics and blockchain transparency",
+    "My password reset email never arrived",
+    "Where can I find the shelter hours and address?",
+    "I want to help financially and understand the impact of donations",
+    "I'm a case manager looking for temporary shelter for a client",
+    "Sign up for the job training program please",
+    "thanks!",
+    "Is there a way to schedule an appointment for counseling?",
+    "I work at a shelter and our staff need training on the dashboard",
+    "I need food and a place to shower, I'm struggling with housing",
+    "Explain how the smart contract splits each donation",
+    "There is an error on the donate page, the button is broken",
+    "We are a facility with 40 residents, can we join?",
+] * 4
+
+def legacy_intent(classifier: IntentClassifier, message: str) -> str:
+    """Category chosen by the original one-re.search-per-pattern loop"""
+    message_lower = message.lower()
+    for category, patterns in (
+        ("emergency", classifier.emergency_patterns),
+        ("service", classifier.service_patterns),
+        ("information", classifier.information_patterns),
+        ("support", classifier.support_patterns),
+    ):
+        for pattern in patterns:
+            if re.search(pattern, message_lower):
+                return category
+    return "general"
+
+def legacy_role_scores(classifier: UserClassifier, message: str) -> dict:
+    """Role scores computed by the original per-pattern scan"""
+    message_lower = message.lower().strip()
+    scores = {}
+    for role, indicators in classifier.role_indicators.items():
+        score = 0
+        score += 40 * sum(1 for p in indicators["strong_indicators"] if re.search(p, message_lower))
+        score += 20 * sum(1 for p in indicators["medium_indicators"] if re.search(p, message_lower))
+        context_matches = sum(1 for clue in indicators["context_clues"] if clue.lower() in message_lower)
+        scores[role] = score + min(context_matches * 3, 20)
+    return scores
+
+def time_per_message(func, rounds: int = 20) -> float:
+    """Average microseconds per message over the corpus"""
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for message in CORPUS:
+            func(message)
+    return (time.perf_counter() - start) / (rounds * len(CORPUS)) * 1e6
+
+async def main():
+    print("🧪 Classifier micro-benchmark")
+    print("="*50)
+
+    # Silence per-message classifier logging so it does not skew timings
+    logging.disable(logging.INFO)
+    intent_classifier = IntentClassifier()
+    user_classifier = UserClassifier()
+
+    # The single-pass matchers must agree with the old scan on every message
+    mismatches = 0
+    for message in CORPUS:
+        intent = await intent_classifier.classify(message, "public")
+        category = {
+            "crisis_intervention": "emergency",
+            "service_booking": "service",
+            "general_inquiry": "information",
+            "technical_support": "support",
+        }.get(intent.subcategory, "general")
+        _, _, metadata = await user_classifier.classify_user_role(message)
+        if category != legacy_intent(intent_classifier, message) or \
+                metadata["all_scores"] != legacy_role_scores(user_classifier, message):
+            mismatches += 1
+            print(f"❌ Mismatch: {message}")
+    print(f"✅ {len(CORPUS) - mismatches}/{len(CORPUS)} messages classified identically")
+
+    intent_legacy = time_per_message(lambda m: legacy_intent(intent_classifier, m))
+    intent_compiled = time_per_message(lambda m: intent_classifier.matcher.scan(m.lower()))
+    role_legacy = time_per_message(lambda m: legacy_role_scores(user_classifier, m))
+
+    def compiled_role_scan(message: str):
+        message_lower = message.lower().strip()
+        user_classifier.indicator_matcher.scan(message_lower)
+        return [clue for clue in user_classifier.context_clues if clue in message_lower]
+
+    role_compiled = time_per_message(compiled_role_scan)
+
+    print(f"\n📊 Intent matching: {intent_legacy:.1f}µs → {intent_compiled:.1f}µs per message ({intent_legacy / intent_compiled:.1f}x)")
+    print(f"📊 Role matching:   {role_legacy:.1f}µs → {role_compiled:.1f}µs per message ({role_legacy / role_compiled:.1f}x)")
+
+if __name__ == "__main__":
+    asyncio.run(main())
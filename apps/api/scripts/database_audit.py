@@ -16,6 +16,11 @@ from datetime import datetime
 from collections import defaultdict
 import sys
 
+# Add the API directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.firestore_aggregates import firestore_aggregates
+
 # Set up enhanced logging
 logging.basicConfig(
     level=logging.INFO,
@@ -112,7 +117,7 @@ class DatabaseAuditor:
                 
                 # Get basic stats
                 docs = list(collection_ref.limit(10).stream())
-                total_docs = len(list(collection_ref.stream()))
+                total_docs = firestore_aggregates.count_blocking(collection_ref)
                 
                 # Analyze sample documents for schema
                 sample_schemas = []
@@ -0,0 +1,272 @@
+"""
+SHELTR-AI Analytics Event Ingestion
+Buffers analytics events in memory and writes them to Firestore in batches from a background flusher
+"""
+
+import os
+import json
+import uuid
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, Any, Optional, Callable, Awaitable
+
+from firebase_admin import firestore
+
+from services.bulk_writer import FirestoreBulkWriter
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_POLICIES = ('drop_newest', 'drop_oldest', 'spill')
+
+class AnalyticsEventBuffer:
+    """
+    Bounded in-process event buffer with a single background flusher
+
+    Enqueueing never waits on Firestore. The flusher writes when a batch fills up or the
+    flush interval elapses. When the buffer is full the overflow policy decides the fate
+    of events: drop the new event, drop the oldest buffered one, or spill it to a local
+    JSON-lines file that is replayed on the next start.
+    """
+
+    MAX_ATTEMPTS = 5  # Events Firestore keeps rejecting are dropped after this many flushes
+
+    def __init__(
+        self,
+        collection: str = "analytics_events",
+        max_events: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        flush_interval: Optional[float] = None,
+        overflow_policy: Optional[str] = None,
+        spill_path: Optional[str] = None
+    ):
+        self._db = None
+        self.collection = collection
+        self.max_events = max_events or int(os.getenv("ANALYTICS_BUFFER_SIZE", 10000))
+        self.batch_size = min(
+            batch_size or int(os.getenv("ANALYTICS_FLUSH_BATCH_SIZE", 200)),
+            FirestoreBulkWriter.MAX_BATCH_SIZE
+        )
+        self.flush_interval = flush_interval or float(os.getenv("ANALYTICS_FLUSH_INTERVAL_SECONDS", 2))
+        self.overflow_policy = (overflow_policy or os.getenv("ANALYTICS_OVERFLOW_POLICY", "drop_oldest")).lower()
+        if self.overflow_policy not in OVERFLOW_POLICIES:
+            logger.warning(f"Unknown analytics overflow policy {self.overflow_policy}, using drop_oldest")
+            self.overflow_policy = "drop_oldest"
+        self.spill_path = spill_path or os.getenv("ANALYTICS_SPILL_PATH", "/tmp/sheltr_analytics_spill.jsonl")
+
+        # [event, attempts] pairs, oldest first
+        self._events: deque = deque()
+        self._wake: Optional[asyncio.Event] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self._closing = False
+        # Called with the events of each batch that was written, e.g. to update rollups
+        self._flush_listeners: List[Callable[[List[Dict[str, Any]]], Awaitable[None]]] = []
+
+        # Counters
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.spilled = 0
+        self.failed_flushes = 0
+
+    @property
+    def db(self):
+        """Lazy initialization of Firestore client"""
+        if self._db is None:
+            self._db = firestore.client()
+        return self._db
+
+    def add_flush_listener(self, listener: Callable[[List[Dict[str, Any]]], Awaitable[None]]):
+        """Register a coroutine called with every batch of events written to Firestore"""
+        self._flush_listeners.append(listener)
+
+    def enqueue(self, event: Dict[str, Any]) -> bool:
+        """Buffer an event for the next flush; False if it was dropped or spilled"""
+        # The document id is fixed up front (and survives spilling), so rewriting an event after a
+        # commit that timed out but was applied overwrites it instead of creating a duplicate
+        event.setdefault('event_id', uuid.uuid4().hex)
+        if len(self._events) >= self.max_events:
+            if self.overflow_policy == "drop_newest" or self._closing:
+                self.dropped += 1
+                return False
+            if self.overflow_policy == "spill":
+                self._spill([event])
+                return False
+            self._events.popleft()
+            self.dropped += 1
+
+        self._events.append([event, 0])
+        self.enqueued += 1
+        self._ensure_flusher()
+        if len(self._events) >= self.batch_size and self._wake is not None:
+            self._wake.set()
+        return True
+
+    def start(self):
+        """Start the flusher and replay events spilled by a previous run"""
+        self._closing = False
+        self._replay_spill()
+        self._ensure_flusher()
+
+    async def close(self, timeout: float = 10.0):
+        """Let the flusher write out everything still buffered, then spill or drop what did not make it"""
+        self._closing = True
+        if self._flusher is None and self._events:
+            # Events arrived before any loop was running
+            self._wake = asyncio.Event()
+            self._flusher = asyncio.get_running_loop().create_task(self._flush_loop())
+        if self._flusher is not None:
+            self._wake.set()
+            try:
+                await asyncio.wait_for(self._flusher, timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Analytics drain timed out with {len(self._events)} events left")
+            except Exception as e:
+                logger.error(f"Error draining analytics events: {str(e)}")
+            self._flusher = None
+
+        if self._events:
+            remaining = [event for event, _ in self._events]
+            self._events.clear()
+            if self.overflow_policy == "spill":
+                self._spill(remaining)
+            else:
+                self.dropped += len(remaining)
+                logger.warning(f"Dropped {len(remaining)} analytics events at shutdown")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'buffered': len(self._events),
+            'max_events': self.max_events,
+            'batch_size': self.batch_size,
+            'flush_interval': self.flush_interval,
+            'overflow_policy': self.overflow_policy,
+            'enqueued': self.enqueued,
+            'written': self.written,
+            'dropped': self.dropped,
+            'spilled': self.spilled,
+            'failed_flushes': self.failed_flushes,
+            'flusher_running': self._flusher is not None and not self._flusher.done()
+        }
+
+    def _ensure_flusher(self):
+        if self._closing or (self._flusher is not None and not self._flusher.done()):
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # No loop yet (e.g. import time); start() picks the events up later
+        self._wake = asyncio.Event()
+        self._flusher = loop.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        """Flush on a full batch or every flush_interval; exits once the buffer is drained after close()"""
+        backoff = self.flush_interval
+        while True:
+            if not self._closing:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+
+            try:
+                while self._events:
+                    if not await self._flush_batch():
+                        break
+            except Exception as e:
+                logger.error(f"Analytics flush failed: {str(e)}")
+
+            if not self._events:
+                backoff = self.flush_interval
+                if self._closing:
+                    return
+                continue
+
+            # Firestore is failing; back off instead of hammering it every interval
+            self.failed_flushes += 1
+            if self._closing:
+                return
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 60)
+
+    async def _flush_batch(self) -> bool:
+        """Write up to one batch; failed events go back to the front of the buffer. False if nothing was written."""
+        batch = [self._events.popleft() for _ in range(min(self.batch_size, len(self._events)))]
+
+        try:
+            writer = FirestoreBulkWriter(self.db, max_batch_size=self.batch_size)
+            collection = self.db.collection(self.collection)
+            for i, (event, _) in enumerate(batch):
+                writer.set(collection.document(event['event_id']), event, key=str(i))
+            result = await writer.flush()
+        except BaseException:
+            # Nothing was confirmed written; keep the batch for the next attempt
+            self._events.extendleft(reversed(batch))
+            raise
+        self.written += len(result.succeeded)
+        if result.succeeded:
+            await self._notify_flushed([batch[int(key)][0] for key in result.succeeded])
+
+        if result.failed:
+            failed = []
+            for key in result.failed:
+                entry = batch[int(key)]
+                # Only rejected writes count towards MAX_ATTEMPTS; an outage must not drop events
+                if key not in result.transient:
+                    entry[1] += 1
+                if entry[1] < self.MAX_ATTEMPTS:
+                    failed.append(entry)
+                else:
+                    self.dropped += 1
+            room = self.max_events - len(self._events)
+            # Oldest failures go back first; whatever does not fit follows the overflow policy
+            self._events.extendleft(reversed(failed[:room]))
+            overflow = failed[room:]
+            if overflow:
+                if self.overflow_policy == "spill":
+                    self._spill([event for event, _ in overflow])
+                else:
+                    self.dropped += len(overflow)
+            logger.warning(f"{len(result.failed)} analytics events failed to write: {next(iter(result.failed.values()))}")
+        return bool(result.succeeded)
+
+    async def _notify_flushed(self, events: List[Dict[str, Any]]):
+        for listener in self._flush_listeners:
+            try:
+                await listener(events)
+            except Exception as e:
+                logger.error(f"Analytics flush listener failed: {str(e)}")
+
+    def _spill(self, events: List[Dict[str, Any]]):
+        try:
+            with open(self.spill_path, "a") as f:
+                for event in events:
+                    f.write(json.dumps(event, default=lambda value: value.isoformat() if isinstance(value, datetime) else str(value)) + "\n")
+            self.spilled += len(events)
+        except Exception as e:
+            self.dropped += len(events)
+            logger.error(f"Error spilling analytics events: {str(e)}")
+
+    def _replay_spill(self):
+        if not os.path.exists(self.spill_path):
+            return
+        replayed = 0
+        try:
+            with open(self.spill_path) as f:
+                lines = f.readlines()
+            os.remove(self.spill_path)
+            for line in lines:
+                event = json.loads(line)
+                if isinstance(event.get("timestamp"), str):
+                    event["timestamp"] = datetime.fromisoformat(event["timestamp"])
+                if self.enqueue(event):
+                    replayed += 1
+        except Exception as e:
+            logger.error(f"Error replaying spilled analytics events: {str(e)}")
+        if replayed:
+            logger.info(f"Replayed {replayed} spilled analytics events")
+
+# Create singleton instance
+analytics_events = AnalyticsEventBuffer()
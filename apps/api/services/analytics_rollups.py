@@ -0,0 +1,445 @@
+"""
+SHELTR-AI Analytics Rollups
+Hourly, daily and monthly rollup documents for analytics events, donations and signups,
+and a query engine that answers date-range reports by merging the fewest rollups that cover the range
+"""
+
+import os
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Any, Optional, Iterable, Tuple
+
+from firebase_admin import firestore
+
+from services.bulk_writer import FirestoreBulkWriter
+from services.hyperloglog import HyperLogLog
+from services.analytics_ingest import analytics_events
+
+logger = logging.getLogger(__name__)
+
+# Users that are not counted as distinct active users
+ANONYMOUS_USERS = ('anonymous', '', None)
+
+def to_utc(value: Any) -> Optional[datetime]:
+    """Timezone-aware UTC datetime for a Firestore timestamp, datetime or ISO string (naive values are taken as UTC)"""
+    if not value:
+        return None
+    try:
+        if isinstance(value, str):
+            value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        if not isinstance(value, datetime):
+            return None
+        if value.tzinfo is None:
+            return value.replace(tzinfo=timezone.utc)
+        return value.astimezone(timezone.utc)
+    except Exception:
+        return None
+
+def _next_month(value: datetime) -> datetime:
+    return value.replace(year=value.year + value.month // 12, month=value.month % 12 + 1)
+
+class AnalyticsRollups:
+    """
+    Rollup documents live in the analytics_rollups collection with ids hour_YYYY-MM-DDTHH,
+    day_YYYY-MM-DD and month_YYYY-MM. Every write lands in all three levels, so a bucket is
+    current even while its period is still running.
+
+    Distinct active users are not stored in the rollups: each bucket has a fixed-size
+    HyperLogLog sketch under the same id in analytics_rollup_users, so no document grows with
+    the number of users. Counts and sketches are coalesced in memory and committed once per
+    commit_interval, so each bucket is written at most that often per worker however busy it is.
+    """
+
+    def __init__(self):
+        self._db = None
+        self.collection = os.getenv("ANALYTICS_ROLLUP_COLLECTION", "analytics_rollups")
+        self.users_collection = os.getenv("ANALYTICS_ROLLUP_USERS_COLLECTION", "analytics_rollup_users")
+        self.commit_interval = float(os.getenv("ANALYTICS_ROLLUP_COMMIT_SECONDS", 10))
+        self.sketch_precision = int(os.getenv("ANALYTICS_ROLLUP_SKETCH_PRECISION", 12))
+
+        # Counts and sketches waiting for the next commit
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._pending_users: Dict[str, HyperLogLog] = {}
+        self._committer: Optional[asyncio.Task] = None
+        self._closing = False
+
+        # Counters
+        self.commits = 0
+        self.commit_errors = 0
+
+    @property
+    def db(self):
+        """Lazy initialization of Firestore client"""
+        if self._db is None:
+            self._db = firestore.client()
+        return self._db
+
+    # Bucketing
+
+    @staticmethod
+    def buckets_for(at: datetime) -> List[Tuple[str, str, datetime]]:
+        """(doc id, level, bucket start) for the hour, day and month containing a UTC instant"""
+        hour = at.replace(minute=0, second=0, microsecond=0)
+        day = hour.replace(hour=0)
+        month = day.replace(day=1)
+        return [
+            (f"hour_{hour:%Y-%m-%dT%H}", 'hour', hour),
+            (f"day_{day:%Y-%m-%d}", 'day', day),
+            (f"month_{month:%Y-%m}", 'month', month)
+        ]
+
+    @staticmethod
+    def plan(start: datetime, end: datetime, now: Optional[datetime] = None) -> List[str]:
+        """
+        Rollup ids that exactly tile [start, end), widened to whole hours, using whole months
+        and days wherever they fit so that long ranges need few reads
+
+        Nothing is recorded after now, so when the range reaches the present the still-running
+        month or day bucket covers its tail: a day-aligned 90-day report ending today reads about
+        15 rollups (the days up to the first whole month, then months) instead of about 45.
+        """
+        cursor = to_utc(start).replace(minute=0, second=0, microsecond=0)
+        end = to_utc(end)
+        if end.minute or end.second or end.microsecond:
+            end = end.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+        now = to_utc(now or datetime.now(timezone.utc))
+        open_ended = end >= now
+        stop = min(end, now) if open_ended else end
+
+        def fits(bucket_end: datetime) -> bool:
+            return open_ended or bucket_end <= end
+
+        doc_ids = []
+        while cursor < stop:
+            if cursor.day == 1 and cursor.hour == 0 and fits(_next_month(cursor)):
+                doc_ids.append(f"month_{cursor:%Y-%m}")
+                cursor = _next_month(cursor)
+            elif cursor.hour == 0 and fits(cursor + timedelta(days=1)):
+                doc_ids.append(f"day_{cursor:%Y-%m-%d}")
+                cursor += timedelta(days=1)
+            else:
+                doc_ids.append(f"hour_{cursor:%Y-%m-%dT%H}")
+                cursor += timedelta(hours=1)
+        return doc_ids
+
+    def _accumulate(
+        self,
+        docs: Dict[str, Dict[str, Any]],
+        users: Dict[str, HyperLogLog],
+        at: Any,
+        event_type: Optional[str] = None,
+        user_id: Optional[str] = None,
+        donation_amount: float = 0.0,
+        new_user: bool = False
+    ):
+        """Add one event, donation or signup to the in-memory rollups and sketches for its hour, day and month"""
+        at = to_utc(at)
+        if at is None:
+            return
+        for doc_id, level, bucket_start in self.buckets_for(at):
+            doc = docs.setdefault(doc_id, {'level': level, 'start': bucket_start})
+            if event_type:
+                doc['event_count'] = doc.get('event_count', 0) + 1
+                events = doc.setdefault('events', {})
+                events[event_type] = events.get(event_type, 0) + 1
+            if user_id not in ANONYMOUS_USERS:
+                if doc_id not in users:
+                    users[doc_id] = HyperLogLog(self.sketch_precision)
+                users[doc_id].add(user_id)
+            if donation_amount > 0:
+                doc['donation_amount'] = doc.get('donation_amount', 0.0) + donation_amount
+                doc['donation_count'] = doc.get('donation_count', 0) + 1
+            if new_user:
+                doc['new_users'] = doc.get('new_users', 0) + 1
+
+    # Live updates
+
+    async def apply_events(self, events: List[Dict[str, Any]]):
+        """Fold a batch of written analytics events into the rollups (registered as a flush listener)"""
+        for event in events:
+            self._accumulate(
+                self._pending, self._pending_users,
+                event.get('timestamp'), event.get('event_type', 'unknown'), event.get('user_id')
+            )
+        self._schedule_commit()
+
+    async def record_donation(self, amount: float, at: Any = None):
+        """Count a donation in the rollups for its time"""
+        self._accumulate(self._pending, self._pending_users, at or datetime.now(timezone.utc), donation_amount=amount)
+        self._schedule_commit()
+
+    async def record_new_user(self, at: Any = None):
+        """Count a signup in the rollups for its time"""
+        self._accumulate(self._pending, self._pending_users, at or datetime.now(timezone.utc), new_user=True)
+        self._schedule_commit()
+
+    async def commit(self) -> bool:
+        """Write the pending counts and sketches now; on failure they are kept for the next commit"""
+        docs, users = self._pending, self._pending_users
+        if not docs and not users:
+            return True
+        self._pending, self._pending_users = {}, {}
+        try:
+            await asyncio.to_thread(self._commit_blocking, docs, users)
+            self.commits += 1
+            return True
+        except Exception as e:
+            self.commit_errors += 1
+            logger.error(f"Error updating analytics rollups: {str(e)}")
+            for doc_id, doc in docs.items():
+                self._add_counts(self._pending.setdefault(doc_id, {}), doc)
+            for doc_id, sketch in users.items():
+                if doc_id in self._pending_users:
+                    sketch.merge(self._pending_users[doc_id])
+                self._pending_users[doc_id] = sketch
+            self._schedule_commit()
+            return False
+
+    async def close(self):
+        """Commit whatever is pending; call after analytics_events.close(), whose last flush feeds it"""
+        self._closing = True
+        if self._committer is not None and not self._committer.done():
+            self._committer.cancel()
+        self._committer = None
+        await self.commit()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'pending_rollups': len(self._pending),
+            'pending_sketches': len(self._pending_users),
+            'commit_interval': self.commit_interval,
+            'commits': self.commits,
+            'commit_errors': self.commit_errors
+        }
+
+    def _schedule_commit(self):
+        if self._closing or (self._committer is not None and not self._committer.done()):
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # No loop (e.g. a script); close() commits the pending counts
+        self._committer = loop.create_task(self._commit_later())
+
+    async def _commit_later(self):
+        await asyncio.sleep(self.commit_interval)
+        # Shielded so close() cancelling the timer never abandons a commit halfway
+        await asyncio.shield(self.commit())
+
+    def _commit_blocking(self, docs: Dict[str, Dict[str, Any]], users: Dict[str, HyperLogLog]):
+        """
+        One transaction that merges the sketches into the stored ones (register-wise max, so a
+        retried transaction is harmless) and adds the counts as increments
+        """
+        collection = self.db.collection(self.collection)
+        users_collection = self.db.collection(self.users_collection)
+        refs = {doc_id: users_collection.document(doc_id) for doc_id in users}
+
+        @firestore.transactional
+        def write(transaction):
+            merged = {doc_id: HyperLogLog(sketch.precision, sketch.to_bytes()) for doc_id, sketch in users.items()}
+            if refs:
+                for snapshot in self.db.get_all(list(refs.values()), transaction=transaction):
+                    stored = self._sketch(snapshot.to_dict()) if snapshot.exists else None
+                    if stored is not None:
+                        merged[snapshot.id].merge(stored)
+            for doc_id, sketch in merged.items():
+                transaction.set(refs[doc_id], {'registers': sketch.to_bytes()})
+            for doc_id, doc in docs.items():
+                transaction.set(collection.document(doc_id), self._increments(doc), merge=True)
+
+        write(self.db.transaction())
+
+    @staticmethod
+    def _increments(doc: Dict[str, Any]) -> Dict[str, Any]:
+        """Accumulated counts as Increment transforms, for merging into the stored rollup"""
+        def increments(value):
+            if isinstance(value, dict):
+                return {key: increments(item) for key, item in value.items()}
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                return firestore.Increment(value)
+            return value
+
+        return {key: (value if key in ('level', 'start') else increments(value)) for key, value in doc.items()}
+
+    @staticmethod
+    def _add_counts(target: Dict[str, Any], source: Dict[str, Any]):
+        """Add one accumulated rollup into another"""
+        for key, value in source.items():
+            if isinstance(value, dict):
+                AnalyticsRollups._add_counts(target.setdefault(key, {}), value)
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                target[key] = target.get(key, 0) + value
+            else:
+                target.setdefault(key, value)
+
+    def _sketch(self, data: Optional[Dict[str, Any]]) -> Optional[HyperLogLog]:
+        """A stored sketch, or None if it is missing or was written with another precision"""
+        registers = (data or {}).get('registers')
+        if not registers or len(registers) != 1 << self.sketch_precision:
+            return None
+        return HyperLogLog(self.sketch_precision, registers)
+
+    # Queries
+
+    async def summarize(self, start: datetime, end: datetime) -> Dict[str, Any]:
+        """Totals for [start, end) merged from the covering rollups"""
+        doc_ids = self.plan(start, end)
+        docs, sketches = await asyncio.gather(self._read(doc_ids), self._read_sketches(doc_ids))
+        merged = self._merge(docs.values())
+        return {
+            'start': to_utc(start).isoformat(),
+            'end': to_utc(end).isoformat(),
+            'event_count': merged['event_count'],
+            'events': merged['events'],
+            'donations': {
+                'amount': round(merged['donation_amount'], 2),
+                'count': merged['donation_count']
+            },
+            'new_users': merged['new_users'],
+            'active_users': HyperLogLog.union(sketches.values(), self.sketch_precision).count(),
+            'rollups_read': len(doc_ids)
+        }
+
+    async def growth(self, now: Optional[datetime] = None) -> Optional[Dict[str, Any]]:
+        """
+        Period-over-period growth from the last 60 complete days and active-user counts up to now,
+        or None without data. Growth compares whole days, since today's partial bucket would always
+        trail yesterday's.
+        """
+        today = to_utc(now or datetime.now(timezone.utc)).replace(hour=0, minute=0, second=0, microsecond=0)
+        day_ids = [f"day_{today - timedelta(days=offset):%Y-%m-%d}" for offset in range(60, -1, -1)]
+        docs, sketches = await asyncio.gather(self._read(day_ids), self._read_sketches(day_ids))
+        if not docs:
+            return None
+        by_day = [docs.get(doc_id, {}) for doc_id in day_ids]
+
+        def window(length: int, offset: int = 0) -> Dict[str, Any]:
+            stop = len(by_day) - offset
+            return self._merge(by_day[stop - length:stop])
+
+        def active(length: int, offset: int = 0) -> HyperLogLog:
+            stop = len(day_ids) - offset
+            return HyperLogLog.union(
+                (sketches[doc_id] for doc_id in day_ids[stop - length:stop] if doc_id in sketches),
+                self.sketch_precision
+            )
+
+        def change(current: float, previous: float) -> float:
+            if not previous:
+                return 100.0 if current else 0.0
+            return round((current - previous) / previous * 100, 1)
+
+        user_growth, donation_growth = {}, {}
+        for period, length in (('daily', 1), ('weekly', 7), ('monthly', 30)):
+            # Offset by one day to leave out today
+            current, previous = window(length, 1), window(length, length + 1)
+            user_growth[period] = change(current['new_users'], previous['new_users'])
+            donation_growth[period] = change(current['donation_amount'], previous['donation_amount'])
+
+        this_week, last_week = active(7), active(7, 7)
+        this_week_count, last_week_count = this_week.count(), last_week.count()
+        # |A ∩ B| = |A| + |B| - |A ∪ B|, clamped because each term is an estimate
+        both_weeks = HyperLogLog.union((this_week, last_week), self.sketch_precision).count()
+        retained = min(max(this_week_count + last_week_count - both_weeks, 0), this_week_count, last_week_count)
+
+        return {
+            "user_growth": user_growth,
+            "donation_growth": donation_growth,
+            "engagement_metrics": {
+                "daily_active_users": active(1).count(),
+                "weekly_active_users": this_week_count,
+                "monthly_active_users": active(30).count(),
+                "retention_rate": round(retained / last_week_count * 100, 1) if last_week_count else 0.0
+            }
+        }
+
+    async def _read(self, doc_ids: List[str], collection: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        """Fetch rollups (or sketches) in one get_all round trip; missing buckets are simply absent"""
+        if not doc_ids:
+            return {}
+        collection = self.db.collection(collection or self.collection)
+        refs = [collection.document(doc_id) for doc_id in doc_ids]
+        snapshots = await asyncio.to_thread(lambda: list(self.db.get_all(refs)))
+        return {snapshot.id: snapshot.to_dict() for snapshot in snapshots if snapshot.exists}
+
+    async def _read_sketches(self, doc_ids: List[str]) -> Dict[str, HyperLogLog]:
+        """The active-user sketches stored for the given buckets"""
+        sketches = {}
+        for doc_id, data in (await self._read(doc_ids, self.users_collection)).items():
+            sketch = self._sketch(data)
+            if sketch is not None:
+                sketches[doc_id] = sketch
+        return sketches
+
+    @staticmethod
+    def _merge(docs: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+        merged = {
+            'event_count': 0,
+            'events': {},
+            'donation_amount': 0.0,
+            'donation_count': 0,
+            'new_users': 0
+        }
+        for doc in docs:
+            merged['event_count'] += doc.get('event_count', 0)
+            for event_type, count in doc.get('events', {}).items():
+                merged['events'][event_type] = merged['events'].get(event_type, 0) + count
+            merged['donation_amount'] += doc.get('donation_amount', 0.0)
+            merged['donation_count'] += doc.get('donation_count', 0)
+            merged['new_users'] += doc.get('new_users', 0)
+        return merged
+
+    # Backfill
+
+    async def rebuild(self, days: int = 90) -> Dict[str, Any]:
+        """
+        Recompute the rollups and sketches covering the last `days` days (widened to whole months)
+        from analytics_events, demo_donations and the user profiles, overwriting the stored documents
+        """
+        start = (datetime.now(timezone.utc) - timedelta(days=days)).replace(
+            day=1, hour=0, minute=0, second=0, microsecond=0
+        )
+        docs: Dict[str, Dict[str, Any]] = {}
+        users: Dict[str, HyperLogLog] = {}
+
+        events = self.db.collection('analytics_events').where('timestamp', '>=', start)
+        for snapshot in events.select(['event_type', 'user_id', 'timestamp']).stream():
+            event = snapshot.to_dict()
+            self._accumulate(docs, users, event.get('timestamp'), event.get('event_type', 'unknown'), event.get('user_id'))
+
+        # Imported lazily: platform_metrics imports this module
+        from services.platform_metrics import donation_value, user_profiles
+
+        for snapshot in self.db.collection('demo_donations').select(['amount', 'created_at']).stream():
+            donation = snapshot.to_dict()
+            created_at = to_utc(donation.get('created_at'))
+            if created_at and created_at >= start:
+                self._accumulate(docs, users, created_at, donation_amount=donation_value(donation.get('amount')))
+
+        # createdAt is stored both as timestamps and as strings, so it cannot be range-filtered server side;
+        # profiles from the web app use createdAt, those from /auth/register created_at
+        for snapshot in user_profiles(self.db).select(['createdAt', 'created_at']).stream():
+            data = snapshot.to_dict()
+            created_at = to_utc(data.get('createdAt') or data.get('created_at'))
+            if created_at and created_at >= start:
+                self._accumulate(docs, users, created_at, new_user=True)
+
+        writer = FirestoreBulkWriter(self.db)
+        collection = self.db.collection(self.collection)
+        users_collection = self.db.collection(self.users_collection)
+        for doc_id, doc in docs.items():
+            writer.set(collection.document(doc_id), doc, key=doc_id)
+        for doc_id, sketch in users.items():
+            writer.set(users_collection.document(doc_id), {'registers': sketch.to_bytes()}, key=f"users/{doc_id}")
+        result = await writer.flush()
+
+        logger.info(f"Analytics rollups rebuilt from {start.date().isoformat()}: {len(result.succeeded)} written, {len(result.failed)} failed")
+        return {'since': start.isoformat(), 'written': len(result.succeeded), 'failed': len(result.failed)}
+
+# Create singleton instance
+analytics_rollups = AnalyticsRollups()
+
+# Rollups follow the events the background flusher actually wrote
+analytics_events.add_flush_listener(analytics_rollups.apply_events)
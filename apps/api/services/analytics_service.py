@@ -3,11 +3,16 @@ SHELTR-AI Analytics Service
 Provides real-time analytics and metrics for the platform
 """
 
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from typing import Dict, List, Any, Optional
 import asyncio
 from firebase_admin import firestore
 from services.firebase_service import firebase_service
+from services.platform_metrics import platform_metrics
+from services.analytics_ingest import analytics_events
+from services.analytics_rollups import analytics_rollups
+from services.response_cache import analytics_response_cache
+from services.firestore_aggregates import firestore_aggregates
 import logging
 
 logger = logging.getLogger(__name__)
@@ -27,16 +32,29 @@ class AnalyticsService:
     async def get_platform_metrics(self) -> Dict[str, Any]:
         """Get comprehensive platform metrics for Super Admin dashboard"""
         try:
-            # Run all analytics queries in parallel
-            tasks = [
-                self._get_user_metrics(),
-                self._get_donation_metrics(),
-                self._get_shelter_metrics(),
-                self._get_system_health_metrics(),
-                self._get_growth_metrics()
-            ]
-            
-            user_metrics, donation_metrics, shelter_metrics, health_metrics, growth_metrics = await asyncio.gather(*tasks)
+            # Materialized counters replace the collection scans once the backfill job has run
+            snapshot = await platform_metrics.get_snapshot() if self.db else None
+            if snapshot:
+                user_metrics = self._user_metrics_from_snapshot(snapshot['users'])
+                donation_metrics = self._donation_metrics_from_snapshot(snapshot['donations'])
+                shelter_metrics = self._shelter_metrics_from_snapshot(snapshot['shelters'], user_metrics)
+                health_metrics, growth_metrics = await asyncio.gather(
+                    self._get_system_health_metrics(),
+                    self._get_growth_metrics()
+                )
+            else:
+                if self.db:
+                    logger.warning("Platform metrics not materialized yet, scanning collections (run scripts/backfill_platform_metrics.py)")
+                # Run all analytics queries in parallel
+                tasks = [
+                    self._get_user_metrics(),
+                    self._get_donation_metrics(),
+                    self._get_shelter_metrics(),
+                    self._get_system_health_metrics(),
+                    self._get_growth_metrics()
+                ]
+                
+                user_metrics, donation_metrics, shelter_metrics, health_metrics, growth_metrics = await asyncio.gather(*tasks)
             
             return {
                 "timestamp": datetime.now().isoformat(),
@@ -56,6 +74,54 @@ class AnalyticsService:
                 "status": "error"
             }
     
+    def _user_metrics_from_snapshot(self, users: Dict[str, Any]) -> Dict[str, Any]:
+        """User metrics from the materialized users aggregate"""
+        total_users = users.get('total', 0)
+        by_role = users.get('by_role', {})
+        roles_count = {role: by_role.get(role, 0) for role in ('super_admin', 'admin', 'participant', 'donor')}
+        new_this_week = platform_metrics.sum_days(users.get('daily_new', {}), 7)
+        
+        # Maintained as users make their first authenticated request of the day
+        active_today = users.get('daily_active', {}).get(datetime.utcnow().date().isoformat(), 0)
+        
+        return {
+            "total": total_users,
+            "active_today": active_today,
+            "new_this_week": new_this_week,
+            "by_role": roles_count,
+            "growth_rate": round((new_this_week / max(total_users, 1)) * 100, 2)
+        }
+    
+    def _donation_metrics_from_snapshot(self, donations: Dict[str, Any]) -> Dict[str, Any]:
+        """Donation metrics from the materialized donations aggregate"""
+        total_amount = donations.get('total_amount', 0.0)
+        total_count = donations.get('total_count', 0)
+        daily = donations.get('daily', {})
+        
+        return {
+            "total_amount": round(total_amount, 2),
+            "total_count": total_count,
+            "average_amount": round(total_amount / max(total_count, 1), 2),
+            "today_amount": round(platform_metrics.sum_days(daily, 1, 'amount'), 2),
+            "today_count": platform_metrics.sum_days(daily, 1, 'count'),
+            "growth_rate": 15.4 if total_count > 0 else 0.0
+        }
+    
+    def _shelter_metrics_from_snapshot(self, shelters: Dict[str, Any], user_metrics: Dict[str, Any]) -> Dict[str, Any]:
+        """Shelter metrics from the materialized shelters aggregate; participants come from the user counters"""
+        total_capacity = shelters.get('total_capacity', 0)
+        current_occupancy = shelters.get('current_occupancy', 0)
+        
+        return {
+            "total_shelters": shelters.get('total_shelters', 0),
+            "active_shelters": shelters.get('active_shelters', 0),
+            "total_capacity": total_capacity,
+            "current_occupancy": current_occupancy,
+            "occupancy_rate": round((current_occupancy / max(total_capacity, 1)) * 100, 1),
+            "services_provided": shelters.get('services_provided', 0),
+            "participants_served": user_metrics["by_role"]["participant"]
+        }
+    
     async def _get_user_metrics(self) -> Dict[str, Any]:
         """Get user-related metrics"""
         try:
@@ -275,8 +341,7 @@ class AnalyticsService:
             # Get actual participant count from users collection
             users_ref = self.db.collection('users')
             participants_query = users_ref.where('role', '==', 'participant')
-            participants = participants_query.stream()
-            participants_served = len(list(participants))
+            participants_served = await firestore_aggregates.count(participants_query)
             
             # Calculate overall occupancy rate
             overall_occupancy_rate = (current_occupancy / max(total_capacity, 1)) * 100
@@ -314,6 +379,8 @@ class AnalyticsService:
                 "active_connections": 127,
                 "database_health": "excellent",
                 "api_health": "operational",
+                "analytics_ingest": analytics_events.get_stats(),
+                "response_cache": analytics_response_cache.get_stats(),
                 "last_updated": datetime.now().isoformat()
             }
             
@@ -324,9 +391,13 @@ class AnalyticsService:
     async def _get_growth_metrics(self) -> Dict[str, Any]:
         """Get growth and trend metrics"""
         try:
-            # This would typically analyze historical data
-            # For now, providing realistic mock data
+            # Period-over-period figures from the daily rollups
+            if self.db:
+                growth = await analytics_rollups.growth()
+                if growth:
+                    return growth
             
+            # No rollups yet (or local mode): providing realistic mock data
             return {
                 "user_growth": {
                     "daily": 3.2,
@@ -384,20 +455,22 @@ class AnalyticsService:
             return {"error": str(e)}
     
     async def track_event(self, event_type: str, user_id: str, metadata: Dict[str, Any]) -> bool:
-        """Track an analytics event"""
+        """Track an analytics event (buffered; written to Firestore in the background)"""
         try:
+            if not self.db:
+                return False
+            
             event_data = {
                 "event_type": event_type,
                 "user_id": user_id,
                 "metadata": metadata,
-                "timestamp": firestore.SERVER_TIMESTAMP,
+                # Captured here rather than SERVER_TIMESTAMP because the write happens later, in a batch
+                "timestamp": datetime.now(timezone.utc),
                 "date": datetime.now().date().isoformat()
             }
             
-            # Store in analytics events collection
-            self.db.collection('analytics_events').add(event_data)
-            
-            return True
+            # Queue for the analytics events collection
+            return analytics_events.enqueue(event_data)
             
         except Exception as e:
             logger.error(f"Error tracking event: {str(e)}")
@@ -424,6 +497,17 @@ class AnalyticsService:
         try:
             metrics = await self.get_platform_metrics()
             
+            # A date-only end (midnight) includes that whole day
+            period_end = end_date + timedelta(days=1) if end_date.time() == datetime.min.time() else end_date
+            period = await analytics_rollups.summarize(start_date, period_end) if self.db else None
+            
+            if period:
+                donated = period['donations']['amount']
+                growth = f"{period['new_users']} new users in period"
+            else:
+                donated = metrics.get('donations', {}).get('total_amount', 0)
+                growth = f"{metrics.get('growth', {}).get('user_growth', {}).get('monthly', 0)}% monthly growth"
+            
             return {
                 "report_type": "platform_summary",
                 "period": {
@@ -432,11 +516,12 @@ class AnalyticsService:
                 },
                 "generated_at": datetime.now().isoformat(),
                 "metrics": metrics,
+                "period_metrics": period,
                 "summary": {
-                    "total_impact": f"${metrics.get('donations', {}).get('total_amount', 0):,.2f} donated",
+                    "total_impact": f"${donated:,.2f} donated",
                     "people_helped": metrics.get('shelters', {}).get('participants_served', 0),
                     "shelters_active": metrics.get('shelters', {}).get('total_shelters', 0),
-                    "platform_growth": f"{metrics.get('growth', {}).get('user_growth', {}).get('monthly', 0)}% monthly growth"
+                    "platform_growth": growth
                 }
             }
             
@@ -0,0 +1,145 @@
+"""
+SHELTR-AI Firestore Bulk Writer
+Groups Firestore writes into batches and commits them off the event loop
+"""
+
+import asyncio
+import logging
+from typing import Dict, List, Any, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Rejections caused by a particular write (bad data, a create that already exists, a missing
+# document), matched by class name so google.api_core is not a hard dependency. Anything else,
+# such as timeouts, unavailability or exhausted quota, would fail every individual replay too.
+WRITE_ERRORS = ('BadRequest', 'InvalidArgument', 'FailedPrecondition', 'Conflict', 'AlreadyExists',
+                'NotFound', 'ValueError', 'TypeError')
+
+def is_write_error(error: BaseException) -> bool:
+    """Whether an error was caused by the content of a write rather than by the transport"""
+    return any(cls.__name__ in WRITE_ERRORS for cls in type(error).__mro__)
+
+class BulkWriteResult:
+    """Outcome of a bulk flush, keyed by the caller-supplied write keys"""
+    def __init__(self):
+        self.succeeded: List[str] = []
+        self.failed: Dict[str, str] = {}
+        # Failed keys whose writes were never judged (transport errors); retrying them later may succeed
+        self.transient: Set[str] = set()
+
+class FirestoreBulkWriter:
+    """Queues writes and commits them in groups of up to the Firestore batch limit"""
+
+    MAX_BATCH_SIZE = 500  # Firestore limit on writes per batch commit
+
+    def __init__(self, db, max_batch_size: int = MAX_BATCH_SIZE, max_concurrent_commits: int = 4):
+        self.db = db
+        self.max_batch_size = min(max_batch_size, self.MAX_BATCH_SIZE)
+        self.max_concurrent_commits = max_concurrent_commits
+        self._pending: List[Dict[str, Any]] = []
+
+    def create(self, doc_ref, data: Dict[str, Any], key: Optional[str] = None):
+        """Queue creation of a new document"""
+        self._queue('create', doc_ref, data, key)
+
+    def set(self, doc_ref, data: Dict[str, Any], key: Optional[str] = None):
+        """Queue an overwrite of a document"""
+        self._queue('set', doc_ref, data, key)
+
+    def delete(self, doc_ref, key: Optional[str] = None):
+        """Queue deletion of a document"""
+        self._queue('delete', doc_ref, None, key)
+
+    @property
+    def pending(self) -> int:
+        """Number of queued writes not yet committed"""
+        return len(self._pending)
+
+    async def flush(self) -> BulkWriteResult:
+        """Commit every queued write, isolating failures to the writes that caused them"""
+        operations, self._pending = self._pending, []
+        result = BulkWriteResult()
+        if not operations:
+            return result
+
+        semaphore = asyncio.Semaphore(self.max_concurrent_commits)
+
+        async def commit_group(group: List[Dict[str, Any]]):
+            async with semaphore:
+                await self._commit_group(group, result)
+
+        await asyncio.gather(*(
+            commit_group(operations[i:i + self.max_batch_size])
+            for i in range(0, len(operations), self.max_batch_size)
+        ))
+
+        if result.failed:
+            logger.warning(f"Bulk write committed {len(result.succeeded)} writes, {len(result.failed)} failed")
+        return result
+
+    def _queue(self, op: str, doc_ref, data: Optional[Dict[str, Any]], key: Optional[str]):
+        """Add a write to the pending queue"""
+        self._pending.append({
+            'op': op,
+            'ref': doc_ref,
+            'data': data,
+            'key': key or doc_ref.id
+        })
+
+    async def _commit_group(self, group: List[Dict[str, Any]], result: BulkWriteResult):
+        """
+        Commit one group atomically
+
+        If the batch is rejected because of a bad write, the writes are replayed one by one to keep
+        the good ones. Transport failures fail the whole group instead, since replays would fail too.
+        """
+        batch = self.db.batch()
+        queued = []
+        for operation in group:
+            try:
+                self._apply(batch, operation)
+                queued.append(operation)
+            except Exception as e:
+                # The client rejected the data before sending anything
+                result.failed[operation['key']] = str(e)
+        if not queued:
+            return
+
+        try:
+            await asyncio.to_thread(batch.commit)
+            result.succeeded.extend(operation['key'] for operation in queued)
+            return
+        except Exception as e:
+            if not is_write_error(e):
+                logger.warning(f"Batch commit of {len(queued)} writes failed: {str(e)}")
+                for operation in queued:
+                    result.failed[operation['key']] = str(e)
+                    result.transient.add(operation['key'])
+                return
+            logger.warning(f"Batch commit of {len(queued)} writes rejected, retrying individually: {str(e)}")
+
+        # A rejected batch writes nothing, so replay each write on its own to keep the good ones
+        for operation in queued:
+            try:
+                await asyncio.to_thread(self._commit_single, operation)
+                result.succeeded.append(operation['key'])
+            except Exception as e:
+                result.failed[operation['key']] = str(e)
+
+    def _apply(self, batch, operation: Dict[str, Any]):
+        """Add a queued write to a WriteBatch"""
+        if operation['op'] == 'create':
+            batch.create(operation['ref'], operation['data'])
+        elif operation['op'] == 'set':
+            batch.set(operation['ref'], operation['data'])
+        else:
+            batch.delete(operation['ref'])
+
+    def _commit_single(self, operation: Dict[str, Any]):
+        """Write a single queued operation directly"""
+        if operation['op'] == 'create':
+            operation['ref'].create(operation['data'])
+        elif operation['op'] == 'set':
+            operation['ref'].set(operation['data'])
+        else:
+            operation['ref'].delete()
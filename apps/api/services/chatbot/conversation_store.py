@@ -0,0 +1,264 @@
+"""
+SHELTR-AI Conversation Store
+Pluggable storage for chatbot conversation contexts: a bounded in-process LRU or a shared Redis backend
+"""
+
+import os
+import time
+import logging
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Callable
+
+logger = logging.getLogger(__name__)
+
+class ConversationStore:
+    """Where conversation contexts live between messages"""
+
+    async def get(self, user_id: str) -> Optional[Any]:
+        """Load a user's context, or None if there is no live conversation"""
+        raise NotImplementedError
+
+    async def save(self, user_id: str, context: Any):
+        """Persist a user's context after it has been updated"""
+        raise NotImplementedError
+
+    async def delete(self, user_id: str):
+        """Forget a user's conversation"""
+        raise NotImplementedError
+
+    async def update(self, user_id: str, mutate: Callable[[Any], bool]) -> bool:
+        """
+        Apply mutate to the stored context and save it, unless another save lands in between
+
+        mutate returns False to leave the context unchanged. Returns whether a change was saved.
+        """
+        context = await self.get(user_id)
+        if context is None or not mutate(context):
+            return False
+        await self.save(user_id, context)
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Backend-specific counters"""
+        return {}
+
+class InMemoryConversationStore(ConversationStore):
+    """LRU + sliding TTL store bounded by entry count and approximate memory use"""
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        ttl_seconds: Optional[int] = None,
+        size_of: Optional[Callable[[Any], int]] = None
+    ):
+        self.max_entries = max_entries or int(os.getenv("CONVERSATION_STORE_MAX_ENTRIES", 10000))
+        self.max_bytes = max_bytes or int(os.getenv("CONVERSATION_STORE_MAX_BYTES", 64 * 1024 * 1024))
+        self.ttl_seconds = ttl_seconds or int(os.getenv("CONVERSATION_TTL_SECONDS", 3600))
+        self.size_of = size_of or (lambda context: context.estimate_size())
+
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # user_id -> (expires_at, context, size)
+        self._bytes = 0
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    async def get(self, user_id: str) -> Optional[Any]:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, context, size = entry
+        if expires_at <= time.time():
+            self._remove(user_id)
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        # Reading a conversation keeps it alive
+        self._entries[user_id] = (time.time() + self.ttl_seconds, context, size)
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return context
+
+    async def save(self, user_id: str, context: Any):
+        self._remove(user_id)
+        size = self.size_of(context)
+        self._entries[user_id] = (time.time() + self.ttl_seconds, context, size)
+        self._bytes += size
+        self._evict()
+
+    async def delete(self, user_id: str):
+        self._remove(user_id)
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'backend': 'memory',
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'approx_bytes': self._bytes,
+            'max_bytes': self.max_bytes,
+            'ttl_seconds': self.ttl_seconds,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations
+        }
+
+    def _remove(self, user_id: str):
+        """Drop an entry and release its accounted size"""
+        entry = self._entries.pop(user_id, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+    def _evict(self):
+        """Expire stale conversations, then evict least recently used ones until within bounds"""
+        now = time.time()
+        # TTLs slide on access, so the least recently used entries are also the first to expire
+        while self._entries:
+            user_id, (expires_at, _, _) = next(iter(self._entries.items()))
+            if expires_at > now:
+                break
+            self._remove(user_id)
+            self.expirations += 1
+
+        while len(self._entries) > self.max_entries or (self._bytes > self.max_bytes and len(self._entries) > 1):
+            user_id = next(iter(self._entries))
+            self._remove(user_id)
+            self.evictions += 1
+
+class RedisConversationStore(ConversationStore):
+    """Shares serialized contexts between workers through any Redis-protocol server"""
+
+    def __init__(
+        self,
+        client,
+        encode: Callable[[Any], bytes],
+        decode: Callable[[bytes], Any],
+        ttl_seconds: Optional[int] = None,
+        key_prefix: str = "sheltr:conversation:"
+    ):
+        # Any client exposing async get/set/delete works, e.g. redis.asyncio or a local fake;
+        # update() also needs redis-style transactional pipelines (WATCH/MULTI/EXEC)
+        self.client = client
+        self.encode = encode
+        self.decode = decode
+        self.ttl_seconds = ttl_seconds or int(os.getenv("CONVERSATION_TTL_SECONDS", 3600))
+        self.key_prefix = key_prefix
+        self.update_attempts = 3
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.decode_errors = 0
+        self.conflicts = 0
+
+    def _key(self, user_id: str) -> str:
+        return f"{self.key_prefix}{user_id}"
+
+    async def update(self, user_id: str, mutate: Callable[[Any], bool]) -> bool:
+        """Optimistic read-modify-write: WATCH the key and retry if a turn saved it meanwhile"""
+        key = self._key(user_id)
+        for _ in range(self.update_attempts):
+            try:
+                async with self.client.pipeline(transaction=True) as pipe:
+                    await pipe.watch(key)
+                    payload = await pipe.get(key)
+                    if payload is None:
+                        return False
+                    context = self.decode(payload)
+                    if not mutate(context):
+                        return False
+                    pipe.multi()
+                    pipe.set(key, self.encode(context), ex=self.ttl_seconds)
+                    await pipe.execute()
+                    return True
+            except Exception as e:
+                if type(e).__name__ == 'WatchError':
+                    self.conflicts += 1
+                    continue
+                self.errors += 1
+                logger.error(f"Error updating conversation for {user_id}: {str(e)}")
+                return False
+
+        logger.warning(f"Gave up updating conversation for {user_id} after {self.update_attempts} conflicts")
+        return False
+
+    async def get(self, user_id: str) -> Optional[Any]:
+        try:
+            payload = await self.client.get(self._key(user_id))
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Error loading conversation for {user_id}: {str(e)}")
+            return None
+
+        if payload is None:
+            self.misses += 1
+            return None
+
+        try:
+            context = self.decode(payload)
+        except Exception as e:
+            # A corrupt or incompatible payload would fail every message; drop it and start over
+            self.decode_errors += 1
+            logger.error(f"Discarding undecodable conversation for {user_id}: {str(e)}")
+            await self.delete(user_id)
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return context
+
+    async def save(self, user_id: str, context: Any):
+        try:
+            await self.client.set(self._key(user_id), self.encode(context), ex=self.ttl_seconds)
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Error saving conversation for {user_id}: {str(e)}")
+
+    async def delete(self, user_id: str):
+        try:
+            await self.client.delete(self._key(user_id))
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Error deleting conversation for {user_id}: {str(e)}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'backend': 'redis',
+            'ttl_seconds': self.ttl_seconds,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'errors': self.errors,
+            'decode_errors': self.decode_errors,
+            'conflicts': self.conflicts
+        }
+
+def create_conversation_store(
+    encode: Callable[[Any], bytes],
+    decode: Callable[[bytes], Any]
+) -> ConversationStore:
+    """Build the backend selected by CONVERSATION_STORE ('memory' or 'redis')"""
+    backend = os.getenv("CONVERSATION_STORE", "memory").lower()
+
+    if backend == "redis":
+        try:
+            import redis.asyncio as redis_asyncio
+
+            client = redis_asyncio.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+            logger.info("Conversation store: redis")
+            return RedisConversationStore(client, encode, decode)
+        except ImportError:
+            logger.warning("redis package not installed, falling back to in-memory conversation store")
+
+    logger.info("Conversation store: memory")
+    return InMemoryConversationStore()
@@ -4,18 +4,25 @@ Master agent that routes user inquiries to specialized AI agents
 Enhanced with OpenAI intelligence, FAQ matching, and user role detection
 """
 
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, AsyncIterator, Awaitable
 from datetime import datetime
+import asyncio
 import logging
 import json
-import re
+import struct
+import time
+from collections import deque
 from enum import Enum
 
 # Import OpenAI service and prompts
 from services.openai_service import openai_service
+from services.openai_scheduler import Priority
 from services.chatbot.prompts import get_enhanced_prompt, SYSTEM_PROMPTS
 from services.faq_service import faq_service
 from services.chatbot.user_classifier import user_classifier
+from services.chatbot.pattern_matcher import PatternMatcher
+from services.chatbot.conversation_store import create_conversation_store
+from services.semantic_cache import semantic_response_cache
 
 logger = logging.getLogger(__name__)
 
@@ -34,6 +41,19 @@ class UrgencyLevel(Enum):
     HIGH = "high"
     CRITICAL = "critical"
 
+class StageTimer:
+    """Records the wall-clock duration of named pipeline stages in milliseconds"""
+    def __init__(self):
+        self.timings: Dict[str, float] = {}
+    
+    async def run(self, stage: str, awaitable: Awaitable):
+        """Await a stage and record how long it took"""
+        start = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            self.timings[stage] = round((time.perf_counter() - start) * 1000, 2)
+
 class Intent:
     """Represents a classified user intent"""
     def __init__(
@@ -51,6 +71,13 @@ class Intent:
         self.entities = entities
         self.urgency = urgency
         self.requires_escalation = requires_escalation
+    
+    @property
+    def request_priority(self) -> Priority:
+        """OpenAI scheduling class: crises are served ahead of all other traffic"""
+        if self.category == IntentCategory.EMERGENCY or self.urgency == UrgencyLevel.CRITICAL:
+            return Priority.EMERGENCY
+        return Priority.CHAT
 
 class ChatResponse:
     """Standardized chatbot response"""
@@ -100,57 +127,62 @@ class IntentClassifier:
             r"\b(help\s+with|assistance|support)\b",
             r"\b(account|login|password|access)\b"
         ]
+        
+        # One precompiled scanner over every pattern, labelled by category
+        self.matcher = PatternMatcher(
+            [("emergency", pattern) for pattern in self.emergency_patterns] +
+            [("service", pattern) for pattern in self.service_patterns] +
+            [("information", pattern) for pattern in self.information_patterns] +
+            [("support", pattern) for pattern in self.support_patterns]
+        )
     
     async def classify(self, message: str, user_role: str) -> Intent:
         """Classify a user message into an intent"""
         try:
             message_lower = message.lower()
+            categories = set(self.matcher.scan(message_lower))
             
             # Check for emergency patterns first
-            for pattern in self.emergency_patterns:
-                if re.search(pattern, message_lower):
-                    return Intent(
-                        category=IntentCategory.EMERGENCY,
-                        subcategory="crisis_intervention",
-                        confidence=0.95,
-                        entities={"original_message": message},
-                        urgency=UrgencyLevel.CRITICAL,
-                        requires_escalation=True
-                    )
+            if "emergency" in categories:
+                return Intent(
+                    category=IntentCategory.EMERGENCY,
+                    subcategory="crisis_intervention",
+                    confidence=0.95,
+                    entities={"original_message": message},
+                    urgency=UrgencyLevel.CRITICAL,
+                    requires_escalation=True
+                )
             
             # Check for service booking patterns
-            for pattern in self.service_patterns:
-                if re.search(pattern, message_lower):
-                    service_type = self._extract_service_type(message_lower)
-                    return Intent(
-                        category=IntentCategory.ACTION,
-                        subcategory="service_booking",
-                        confidence=0.85,
-                        entities={"service_type": service_type, "user_role": user_role},
-                        urgency=UrgencyLevel.MEDIUM
-                    )
+            if "service" in categories:
+                service_type = self._extract_service_type(message_lower)
+                return Intent(
+                    category=IntentCategory.ACTION,
+                    subcategory="service_booking",
+                    confidence=0.85,
+                    entities={"service_type": service_type, "user_role": user_role},
+                    urgency=UrgencyLevel.MEDIUM
+                )
             
             # Check for information requests
-            for pattern in self.information_patterns:
-                if re.search(pattern, message_lower):
-                    return Intent(
-                        category=IntentCategory.INFORMATION,
-                        subcategory="general_inquiry",
-                        confidence=0.80,
-                        entities={"query_type": "information", "user_role": user_role},
-                        urgency=UrgencyLevel.LOW
-                    )
+            if "information" in categories:
+                return Intent(
+                    category=IntentCategory.INFORMATION,
+                    subcategory="general_inquiry",
+                    confidence=0.80,
+                    entities={"query_type": "information", "user_role": user_role},
+                    urgency=UrgencyLevel.LOW
+                )
             
             # Check for support requests
-            for pattern in self.support_patterns:
-                if re.search(pattern, message_lower):
-                    return Intent(
-                        category=IntentCategory.SUPPORT,
-                        subcategory="technical_support",
-                        confidence=0.75,
-                        entities={"issue_type": "technical", "user_role": user_role},
-                        urgency=UrgencyLevel.MEDIUM
-                    )
+            if "support" in categories:
+                return Intent(
+                    category=IntentCategory.SUPPORT,
+                    subcategory="technical_support",
+                    confidence=0.75,
+                    entities={"issue_type": "technical", "user_role": user_role},
+                    urgency=UrgencyLevel.MEDIUM
+                )
             
             # Default: general information
             return Intent(
@@ -239,50 +271,292 @@ class AgentRouter:
         # Default to technical support for unknown roles
         return "technical_support"
 
+_TEXT_LENGTH = struct.Struct("<I")
+_NO_TEXT = 0xFFFFFFFF  # length marker for None
+
+def _pack_text(parts: List[bytes], value: Optional[str]):
+    """Append a length-prefixed UTF-8 string (or None) to a binary payload"""
+    if value is None:
+        parts.append(_TEXT_LENGTH.pack(_NO_TEXT))
+        return
+    encoded = value.encode("utf-8")
+    parts.append(_TEXT_LENGTH.pack(len(encoded)))
+    parts.append(encoded)
+
+def _unpack_text(payload: bytes, offset: int) -> tuple:
+    """Read a string written by _pack_text, returning (value, next offset)"""
+    (length,) = _TEXT_LENGTH.unpack_from(payload, offset)
+    offset += _TEXT_LENGTH.size
+    if length == _NO_TEXT:
+        return None, offset
+    return payload[offset:offset + length].decode("utf-8"), offset + length
+
+class MessageRecord:
+    """One user/bot exchange in a conversation's history"""
+    __slots__ = (
+        "timestamp", "user_message", "bot_response", "intent_category",
+        "intent_subcategory", "intent_confidence", "agent", "escalation"
+    )
+    
+    _NUMBERS = struct.Struct("<ddB")
+    
+    def __init__(
+        self,
+        timestamp: float,
+        user_message: str,
+        bot_response: str,
+        intent_category: str,
+        intent_subcategory: str,
+        intent_confidence: float,
+        agent: Optional[str],
+        escalation: bool
+    ):
+        self.timestamp = timestamp
+        self.user_message = user_message
+        self.bot_response = bot_response
+        self.intent_category = intent_category
+        self.intent_subcategory = intent_subcategory
+        self.intent_confidence = intent_confidence
+        self.agent = agent
+        self.escalation = escalation
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """The exchange in the shape handlers and the history API expect"""
+        return {
+            "timestamp": datetime.fromtimestamp(self.timestamp).isoformat(),
+            "user_message": self.user_message,
+            "bot_response": self.bot_response,
+            "intent": {
+                "category": self.intent_category,
+                "subcategory": self.intent_subcategory,
+                "confidence": self.intent_confidence
+            },
+            "agent": self.agent,
+            "escalation": self.escalation
+        }
+    
+    def pack(self, parts: List[bytes]):
+        """Append the binary form of this record"""
+        parts.append(self._NUMBERS.pack(self.timestamp, self.intent_confidence, self.escalation))
+        for value in (self.user_message, self.bot_response, self.intent_category, self.intent_subcategory, self.agent):
+            _pack_text(parts, value)
+    
+    @classmethod
+    def unpack(cls, payload: bytes, offset: int) -> tuple:
+        """Read a record written by pack, returning (record, next offset)"""
+        timestamp, confidence, escalation = cls._NUMBERS.unpack_from(payload, offset)
+        offset += cls._NUMBERS.size
+        texts = []
+        for _ in range(5):
+            value, offset = _unpack_text(payload, offset)
+            texts.append(value)
+        user_message, bot_response, category, subcategory, agent = texts
+        return cls(timestamp, user_message, bot_response, category, subcategory, confidence, agent, bool(escalation)), offset
+
 class ConversationContext:
     """Maintains conversation state and history"""
+    __slots__ = (
+        "user_id", "user_role", "conversation_id", "current_intent", "current_message",
+        "active_agent", "escalation_level", "metadata", "created_at", "shelter_id",
+        "summary", "summarized_count", "exchange_count", "_history", "_views"
+    )
+    
+    HISTORY_CAPACITY = 20  # Keep only last 20 messages for performance
+    
+    _FORMAT_VERSION = 1
+    _HEADER = struct.Struct("<BdiH")
+    _COUNTERS = struct.Struct("<II")
     
     def __init__(self, user_id: str, user_role: str):
         self.user_id = user_id
         self.user_role = user_role
         self.conversation_id = f"{user_id}_{datetime.now().timestamp()}"
-        self.message_history = []
         self.current_intent = None
+        self.current_message = ""
         self.active_agent = None
         self.escalation_level = 0
         self.metadata = {}
         self.created_at = datetime.now()
+        self.shelter_id = None
+        
+        # Rolling summary of the first summarized_count exchanges (exchange_count never drops)
+        self.summary: Optional[str] = None
+        self.summarized_count = 0
+        self.exchange_count = 0
+        
+        # Fixed-capacity ring buffer; appends past capacity drop the oldest exchange in place
+        self._history: deque = deque(maxlen=self.HISTORY_CAPACITY)
+        self._views: Dict[int, List[Dict]] = {}
     
     def add_message(self, message: str, response: ChatResponse, intent: Intent):
         """Add a message exchange to the conversation history"""
-        self.message_history.append({
-            "timestamp": datetime.now().isoformat(),
-            "user_message": message,
-            "bot_response": response.message,
-            "intent": {
-                "category": intent.category.value,
-                "subcategory": intent.subcategory,
-                "confidence": intent.confidence
-            },
-            "agent": response.agent_used,
-            "escalation": response.escalation_triggered
-        })
-        
-        # Keep only last 20 messages for performance
-        if len(self.message_history) > 20:
-            self.message_history = self.message_history[-20:]
+        self._history.append(MessageRecord(
+            timestamp=time.time(),
+            user_message=message,
+            bot_response=response.message,
+            intent_category=intent.category.value,
+            intent_subcategory=intent.subcategory,
+            intent_confidence=intent.confidence,
+            agent=response.agent_used,
+            escalation=response.escalation_triggered
+        ))
+        self.exchange_count += 1
+        self._views.clear()
+    
+    @property
+    def message_history(self) -> List[Dict]:
+        """Full history as dicts (cached until the next exchange; treat as read-only)"""
+        return self.get_recent_context(self.HISTORY_CAPACITY)
+    
+    @property
+    def message_count(self) -> int:
+        """Number of exchanges currently held"""
+        return len(self._history)
+    
+    @property
+    def last_user_message(self) -> str:
+        """The most recent user message in the history, or an empty string"""
+        return self._history[-1].user_message if self._history else ""
     
     def get_recent_context(self, num_messages: int = 5) -> List[Dict]:
-        """Get recent conversation context"""
-        return self.message_history[-num_messages:] if self.message_history else []
+        """Get recent conversation context (cached until the next exchange; treat as read-only)"""
+        view = self._views.get(num_messages)
+        if view is None:
+            records = list(self._history)[-num_messages:] if self._history else []
+            view = [record.to_dict() for record in records]
+            self._views[num_messages] = view
+        return view
+    
+    def get_unsummarized_context(self, limit: Optional[int] = None) -> List[Dict]:
+        """Exchanges not yet folded into the rolling summary, at most the newest `limit`"""
+        pending = self.exchange_count - self.summarized_count
+        if limit is not None:
+            pending = min(pending, limit)
+        return self.get_recent_context(pending) if pending > 0 else []
+    
+    def exchanges_to_summarize(self, keep_recent: int) -> tuple:
+        """(exchanges, through) to fold into the summary, leaving the last keep_recent verbatim"""
+        through = self.exchange_count - keep_recent
+        first_held = self.exchange_count - len(self._history)
+        start = max(self.summarized_count, first_held) - first_held
+        stop = through - first_held
+        if stop <= start:
+            return [], self.summarized_count
+        return [record.to_dict() for record in list(self._history)[start:stop]], through
+    
+    def apply_summary(self, summary: str, through: int) -> bool:
+        """Install a summary covering the first `through` exchanges unless a newer one exists"""
+        if through <= self.summarized_count or through > self.exchange_count:
+            return False
+        self.summary = summary
+        self.summarized_count = through
+        return True
+    
+    def estimate_size(self) -> int:
+        """Approximate memory footprint in bytes, used by the conversation store's budget"""
+        size = 400 + len(self.user_id) + len(self.conversation_id) + len(self.summary or "")
+        for record in self._history:
+            size += 200 + len(record.user_message) + len(record.bot_response)
+        return size
+    
+    def serialize(self) -> bytes:
+        """Compact binary encoding for shared conversation stores"""
+        parts = [self._HEADER.pack(
+            self._FORMAT_VERSION, self.created_at.timestamp(), self.escalation_level, len(self._history)
+        ), self._COUNTERS.pack(self.exchange_count, self.summarized_count)]
+        for value in (self.user_id, self.user_role, self.conversation_id, self.active_agent, self.shelter_id):
+            _pack_text(parts, value)
+        _pack_text(parts, json.dumps(self.metadata, separators=(",", ":")) if self.metadata else None)
+        _pack_text(parts, self.summary)
+        for record in self._history:
+            record.pack(parts)
+        return b"".join(parts)
+    
+    @classmethod
+    def deserialize(cls, payload: bytes) -> "ConversationContext":
+        """Decode a context produced by serialize; other formats raise ValueError so the store discards them"""
+        if payload[:1] != bytes([cls._FORMAT_VERSION]):
+            raise ValueError(f"Unsupported conversation format: {payload[:1]!r}")
+        _, created_at, escalation_level, count = cls._HEADER.unpack_from(payload, 0)
+        offset = cls._HEADER.size
+        exchange_count, summarized_count = cls._COUNTERS.unpack_from(payload, offset)
+        offset += cls._COUNTERS.size
+        
+        texts = []
+        for _ in range(7):
+            value, offset = _unpack_text(payload, offset)
+            texts.append(value)
+        user_id, user_role, conversation_id, active_agent, shelter_id, metadata, summary = texts
+        
+        context = cls(user_id, user_role)
+        context.conversation_id = conversation_id
+        context.active_agent = active_agent
+        context.shelter_id = shelter_id
+        context.escalation_level = escalation_level
+        context.metadata = json.loads(metadata) if metadata else {}
+        context.created_at = datetime.fromtimestamp(created_at)
+        context.summary = summary
+        context.summarized_count = summarized_count
+        context.exchange_count = exchange_count
+        for _ in range(count):
+            record, offset = MessageRecord.unpack(payload, offset)
+            context._history.append(record)
+        return context
+
+class MessageTurn:
+    """Per-message state shared by the blocking and streaming pipelines"""
+    def __init__(
+        self,
+        message: str,
+        context: ConversationContext,
+        user_role: str,
+        faq_match: Optional[Dict[str, Any]],
+        detected_role: str,
+        role_confidence: float,
+        role_metadata: Dict[str, Any],
+        should_handoff: bool,
+        suggested_agent: Optional[str],
+        intent: Intent,
+        timer: StageTimer
+    ):
+        self.message = message
+        self.context = context
+        self.user_role = user_role
+        self.faq_match = faq_match
+        self.detected_role = detected_role
+        self.role_confidence = role_confidence
+        self.role_metadata = role_metadata
+        self.should_handoff = should_handoff
+        self.suggested_agent = suggested_agent
+        self.intent = intent
+        self.timer = timer
+        self.handoff_message = (
+            user_classifier.generate_handoff_message(detected_role, suggested_agent, role_confidence)
+            if should_handoff else None
+        )
+    
+    @property
+    def uses_faq(self) -> bool:
+        """Whether the FAQ match is confident enough to answer directly"""
+        return bool(self.faq_match and self.faq_match["confidence"] > 70)
 
 class ChatbotOrchestrator:
     """Master orchestrator for the chatbot system"""
     
+    # Rolling summaries: the newest exchanges stay verbatim (and are the only raw history sent),
+    # older ones are folded into the summary in small batches
+    SUMMARY_KEEP_RECENT = 3
+    SUMMARY_REFRESH_BATCH = 2
+    SUMMARY_MAX_TOKENS = 150
+    
     def __init__(self):
         self.intent_classifier = IntentClassifier()
         self.agent_router = AgentRouter()
-        self.active_conversations = {}  # In production, use Redis
+        self.conversation_store = create_conversation_store(
+            encode=ConversationContext.serialize,
+            decode=ConversationContext.deserialize
+        )
+        self._summary_tasks: Dict[str, asyncio.Task] = {}
         
         logger.info("🤖 Chatbot Orchestrator initialized")
     
@@ -291,125 +565,345 @@ class ChatbotOrchestrator:
         message: str,
         user_id: str,
         user_role: str,
-        conversation_context: Optional[Dict] = None
+        conversation_context: Optional[Dict] = None,
+        cache_responses: bool = False
     ) -> ChatResponse:
-        """Process a user message with FAQ checking, role detection, and agent routing"""
+        """
+        Process a user message with FAQ checking, role detection, and agent routing
+        
+        With cache_responses, generated answers are shared through the semantic response cache.
+        """
         try:
-            # Get or create conversation context
-            context = await self._get_conversation_context(user_id, user_role)
-            
-            # Store current message in context for handlers to use
-            context.current_message = message
-            
-            # 1. First, check for FAQ matches (quick responses)
-            faq_match = await faq_service.find_faq_match(message, user_role)
-            
-            # 2. Classify user role (detect if they're participant, donor, admin, etc.)
-            detected_role, role_confidence, role_metadata = await user_classifier.classify_user_role(
-                message=message,
-                conversation_history=context.get_recent_context(),
-                current_role=user_role
-            )
-            
-            # 3. Update user role if we detected a different one with high confidence
-            if detected_role != user_role and role_confidence > 80:
-                logger.info(f"🔄 User role updated: {user_role} → {detected_role} (confidence: {role_confidence}%)")
-                context.user_role = detected_role
-                user_role = detected_role  # Update for this session
-            
-            # 4. Check if we should suggest agent handoff
-            should_handoff, suggested_agent = user_classifier.should_suggest_agent_handoff(
-                detected_role, context.active_agent or "public_information", role_confidence
-            )
+            turn = await self._prepare_turn(message, user_id, user_role)
             
             # 5. If we have a high-confidence FAQ match, use it
-            if faq_match and faq_match["confidence"] > 70:
-                logger.info(f"📋 Using FAQ response: {faq_match['id']}")
-                
-                response = ChatResponse(
-                    message=faq_match["answer"],
-                    actions=faq_match["actions"],
-                    agent_used=f"faq_{faq_match['category']}",
-                    metadata={
-                        "faq_id": faq_match["id"],
-                        "faq_confidence": faq_match["confidence"],
-                        "role_detected": detected_role,
-                        "role_confidence": role_confidence
-                    }
-                )
-                
-                # Add handoff suggestion if appropriate
-                if should_handoff:
-                    handoff_message = user_classifier.generate_handoff_message(
-                        detected_role, suggested_agent, role_confidence
-                    )
-                    response.message += f"\n\n{handoff_message}"
-                    response.metadata["handoff_suggested"] = suggested_agent
-                
-                # Update conversation history
-                intent = await self.intent_classifier.classify(message, user_role)
-                context.add_message(message, response, intent)
-                
-                return response
+            if turn.uses_faq:
+                return await self._complete_faq_turn(turn)
             
             # 6. If no FAQ match, proceed with normal agent routing
-            # Classify the intent
-            intent = await self.intent_classifier.classify(message, user_role)
-            context.current_intent = intent
-            
-            # Debug logging to track message flow
-            logger.info(f"🔍 DEBUG: Processing message='{message}' from {user_role} user {user_id}: {intent.category.value}")
+            intent, selected_agent = await self._route_turn(turn)
             
-            # Route to appropriate agent (use suggested agent if handoff recommended)
-            if should_handoff and suggested_agent:
-                selected_agent = suggested_agent
-                logger.info(f"🤝 Agent handoff: {context.active_agent} → {selected_agent}")
+            cached, cache_ticket = await self._lookup_cached_response(turn, selected_agent) if cache_responses else (None, None)
+            if cached:
+                response = cached
             else:
-                selected_agent = self.agent_router.select_agent(intent, user_role)
+                # Generate response based on agent and intent
+                response = await turn.timer.run(
+                    "generation", self._generate_response(intent, turn.context, selected_agent)
+                )
+                self._store_cached_response(turn, selected_agent, cache_ticket, response)
             
-            context.active_agent = selected_agent
+            return await self._complete_agent_turn(turn, intent, response)
             
-            # Generate response based on agent and intent
-            response = await self._generate_response(intent, context, selected_agent)
+        except Exception as e:
+            logger.error(f"Error processing message: {str(e)}")
+            return ChatResponse(
+                message="I'm sorry, I encountered an error while processing your message. Please try again or contact support if the issue persists.",
+                agent_used="error_handler"
+            )
+    
+    async def process_message_stream(
+        self,
+        message: str,
+        user_id: str,
+        user_role: str,
+        conversation_context: Optional[Dict] = None,
+        cache_responses: bool = False
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Process a user message, yielding text delta frames and then one trailing 'complete' frame"""
+        try:
+            turn = await self._prepare_turn(message, user_id, user_role)
             
-            # Add role detection metadata
-            response.metadata = response.metadata or {}
-            response.metadata.update({
-                "role_detected": detected_role,
-                "role_confidence": role_confidence,
-                "role_evidence": role_metadata.get("evidence", [])
-            })
+            if turn.uses_faq:
+                response = await self._complete_faq_turn(turn)
+                yield {"type": "delta", "content": response.message}
+                yield self._complete_frame(response)
+                return
             
-            # Add handoff message if we switched agents
-            if should_handoff and suggested_agent:
-                handoff_message = user_classifier.generate_handoff_message(
-                    detected_role, suggested_agent, role_confidence
-                )
-                response.message = f"{handoff_message}\n\n{response.message}"
+            intent, selected_agent = await self._route_turn(turn)
             
-            # Update conversation history
-            context.add_message(message, response, intent)
+            # The handoff notice leads the reply, so it can go out before generation starts
+            if turn.should_handoff and turn.suggested_agent:
+                yield {"type": "delta", "content": f"{turn.handoff_message}\n\n"}
             
-            # Handle escalation if needed
-            if intent.requires_escalation or intent.urgency == UrgencyLevel.CRITICAL:
-                await self._handle_escalation(context, intent)
-                response.escalation_triggered = True
+            cached, cache_ticket = await self._lookup_cached_response(turn, selected_agent) if cache_responses else (None, None)
+            if cached:
+                response = cached
+                yield {"type": "delta", "content": cached.message}
+            else:
+                response = None
+                generation_started = time.perf_counter()
+                async for frame in self._stream_response(intent, turn.context, selected_agent):
+                    if frame["type"] == "delta":
+                        yield frame
+                    else:
+                        response = frame["response"]
+                turn.timer.timings["generation"] = round((time.perf_counter() - generation_started) * 1000, 2)
+                self._store_cached_response(turn, selected_agent, cache_ticket, response)
             
-            return response
+            response = await self._complete_agent_turn(turn, intent, response)
+            yield self._complete_frame(response)
             
         except Exception as e:
-            logger.error(f"Error processing message: {str(e)}")
-            return ChatResponse(
+            logger.error(f"Error streaming message: {str(e)}")
+            yield self._complete_frame(ChatResponse(
                 message="I'm sorry, I encountered an error while processing your message. Please try again or contact support if the issue persists.",
                 agent_used="error_handler"
+            ))
+    
+    async def _prepare_turn(self, message: str, user_id: str, user_role: str) -> MessageTurn:
+        """Load context, then match FAQs, detect the user's role and classify intent"""
+        timer = StageTimer()
+        
+        # Get or create conversation context
+        context = await timer.run("context", self._get_conversation_context(user_id, user_role))
+        
+        # Store current message in context for handlers to use
+        context.current_message = message
+        
+        # 1-2. FAQ matching, role detection and intent classification only need the raw message,
+        # so each result is computed exactly once. They are quick in-process CPU work with no I/O,
+        # so they run one after another; gathering them would not overlap anything.
+        faq_match = await timer.run("faq_match", faq_service.find_faq_match(message, user_role))
+        detected_role, role_confidence, role_metadata = await timer.run(
+            "role_classification",
+            user_classifier.classify_user_role(
+                message=message,
+                conversation_history=context.get_recent_context(),
+                current_role=user_role
             )
+        )
+        intent = await timer.run("intent_classification", self.intent_classifier.classify(message, user_role))
+        
+        # 3. Update user role if we detected a different one with high confidence
+        if detected_role != user_role and role_confidence > 80:
+            logger.info(f"🔄 User role updated: {user_role} → {detected_role} (confidence: {role_confidence}%)")
+            context.user_role = detected_role
+            user_role = detected_role  # Update for this session
+            # The role only feeds the intent's entities, so patch it instead of classifying again
+            if "user_role" in intent.entities:
+                intent.entities["user_role"] = detected_role
+        
+        # 4. Check if we should suggest agent handoff
+        should_handoff, suggested_agent = user_classifier.should_suggest_agent_handoff(
+            detected_role, context.active_agent or "public_information", role_confidence
+        )
+        
+        return MessageTurn(
+            message=message,
+            context=context,
+            user_role=user_role,
+            faq_match=faq_match,
+            detected_role=detected_role,
+            role_confidence=role_confidence,
+            role_metadata=role_metadata,
+            should_handoff=should_handoff,
+            suggested_agent=suggested_agent,
+            intent=intent,
+            timer=timer
+        )
+    
+    async def _complete_faq_turn(self, turn: MessageTurn) -> ChatResponse:
+        """Answer from the matched FAQ and record the exchange"""
+        faq_match = turn.faq_match
+        logger.info(f"📋 Using FAQ response: {faq_match['id']}")
+        
+        response = ChatResponse(
+            message=faq_match["answer"],
+            actions=faq_match["actions"],
+            agent_used=f"faq_{faq_match['category']}",
+            metadata={
+                "faq_id": faq_match["id"],
+                "faq_confidence": faq_match["confidence"],
+                "role_detected": turn.detected_role,
+                "role_confidence": turn.role_confidence
+            }
+        )
+        
+        # Add handoff suggestion if appropriate
+        if turn.should_handoff:
+            response.message += f"\n\n{turn.handoff_message}"
+            response.metadata["handoff_suggested"] = turn.suggested_agent
+        
+        response.metadata["stage_timings_ms"] = turn.timer.timings
+        
+        # Update conversation history
+        turn.context.add_message(turn.message, response, turn.intent)
+        await self._save_conversation_context(turn.context)
+        
+        return response
+    
+    async def _route_turn(self, turn: MessageTurn) -> tuple:
+        """Pick the agent that should answer the already classified intent"""
+        context = turn.context
+        intent = turn.intent
+        context.current_intent = intent
+        
+        # Debug logging to track message flow
+        logger.info(f"🔍 DEBUG: Processing message='{turn.message}' from {turn.user_role} user {context.user_id}: {intent.category.value}")
+        
+        # Route to appropriate agent (use suggested agent if handoff recommended)
+        if turn.should_handoff and turn.suggested_agent:
+            selected_agent = turn.suggested_agent
+            logger.info(f"🤝 Agent handoff: {context.active_agent} → {selected_agent}")
+        else:
+            selected_agent = self.agent_router.select_agent(intent, turn.user_role)
+        
+        context.active_agent = selected_agent
+        return intent, selected_agent
+    
+    async def _complete_agent_turn(self, turn: MessageTurn, intent: Intent, response: ChatResponse) -> ChatResponse:
+        """Attach role metadata and handoff notice, record the exchange and escalate if needed"""
+        context = turn.context
+        
+        # Add role detection metadata
+        response.metadata = response.metadata or {}
+        response.metadata.update({
+            "role_detected": turn.detected_role,
+            "role_confidence": turn.role_confidence,
+            "role_evidence": turn.role_metadata.get("evidence", []),
+            "stage_timings_ms": {**turn.timer.timings, **response.metadata.get("stage_timings_ms", {})}
+        })
+        logger.debug(f"Stage timings (ms): {response.metadata['stage_timings_ms']}")
+        
+        # Add handoff message if we switched agents
+        if turn.should_handoff and turn.suggested_agent:
+            response.message = f"{turn.handoff_message}\n\n{response.message}"
+        
+        # Update conversation history
+        context.add_message(turn.message, response, intent)
+        
+        # Handle escalation if needed
+        if intent.requires_escalation or intent.urgency == UrgencyLevel.CRITICAL:
+            await self._handle_escalation(context, intent)
+            response.escalation_triggered = True
+        
+        await self._save_conversation_context(context)
+        return response
+    
+    async def _lookup_cached_response(self, turn: MessageTurn, agent: str) -> tuple:
+        """
+        Answer from the semantic response cache if a close enough question was already answered
+        for the same role and agent. Returns (response or None, ticket for storing a miss or None).
+        """
+        intent = turn.intent
+        if (not semantic_response_cache.enabled or not openai_service.is_available() or
+                intent.category == IntentCategory.EMERGENCY or intent.requires_escalation or
+                intent.urgency == UrgencyLevel.CRITICAL):
+            return None, None
+        
+        # Follow-ups depend on earlier turns, so a cached standalone answer would ignore the history
+        if turn.context.message_count > 0:
+            return None, None
+        
+        try:
+            # Lazy import to avoid circular imports
+            from services.embeddings_service import embeddings_service
+            embedding = await turn.timer.run("response_cache", embeddings_service.embed_query(turn.message))
+        except Exception as e:
+            logger.warning(f"Response cache lookup skipped: {str(e)}")
+            return None, None
+        
+        cached = semantic_response_cache.lookup(embedding, turn.user_role, agent)
+        if cached:
+            return ChatResponse(
+                message=cached["message"],
+                actions=list(cached["actions"]),
+                follow_up=cached["follow_up"],
+                agent_used=cached["agent_used"],
+                metadata={
+                    **cached["metadata"],
+                    "response_cache": {"hit": True, "similarity": cached["similarity"]}
+                }
+            ), None
+        
+        return None, {"embedding": embedding, "generation": semantic_response_cache.generation}
+    
+    def _store_cached_response(self, turn: MessageTurn, agent: str, ticket: Optional[Dict[str, Any]], response: ChatResponse):
+        """Share a freshly generated answer unless it escalated or came from a fallback path"""
+        if (ticket is None or response is None or response.escalation_triggered or
+                response.agent_used == "error_handler" or response.metadata.get("rag_failed") or
+                response.metadata.get("stream_interrupted")):
+            return
+        
+        semantic_response_cache.store(ticket["embedding"], turn.user_role, agent, turn.message, {
+            "message": response.message,
+            "actions": list(response.actions),
+            "follow_up": response.follow_up,
+            "agent_used": response.agent_used,
+            "metadata": {
+                key: response.metadata[key]
+                for key in ("knowledge_sources", "sources_used", "knowledge_available")
+                if key in response.metadata
+            }
+        }, ticket["generation"])
+    
+    def _complete_frame(self, response: ChatResponse) -> Dict[str, Any]:
+        """Trailing stream frame carrying the full message, actions and citations"""
+        return {
+            "type": "complete",
+            "message": response.message,
+            "actions": response.actions,
+            "follow_up": response.follow_up,
+            "escalation_triggered": response.escalation_triggered,
+            "agent_used": response.agent_used,
+            "citations": response.metadata.get("knowledge_sources", []),
+            "timestamp": response.timestamp
+        }
     
     async def _get_conversation_context(self, user_id: str, user_role: str) -> ConversationContext:
         """Get or create conversation context for a user"""
-        if user_id not in self.active_conversations:
-            self.active_conversations[user_id] = ConversationContext(user_id, user_role)
+        context = await self.conversation_store.get(user_id)
+        if context is None:
+            context = ConversationContext(user_id, user_role)
+        return context
+    
+    async def _save_conversation_context(self, context: ConversationContext):
+        """Write the context back so the next message, on any worker, sees this turn"""
+        await self.conversation_store.save(context.user_id, context)
+        self._schedule_summary_refresh(context)
+    
+    def _schedule_summary_refresh(self, context: ConversationContext):
+        """Fold older exchanges into the rolling summary in the background, off the request path"""
+        if context.user_id in self._summary_tasks or not openai_service.is_available():
+            return
         
-        return self.active_conversations[user_id]
+        exchanges, through = context.exchanges_to_summarize(self.SUMMARY_KEEP_RECENT)
+        if len(exchanges) < self.SUMMARY_REFRESH_BATCH:
+            return
+        
+        user_id = context.user_id
+        task = asyncio.create_task(self._refresh_summary(
+            user_id, context.conversation_id, context.summary, exchanges, through
+        ))
+        self._summary_tasks[user_id] = task
+        task.add_done_callback(lambda _: self._summary_tasks.pop(user_id, None))
+    
+    async def _refresh_summary(
+        self,
+        user_id: str,
+        conversation_id: str,
+        previous_summary: Optional[str],
+        exchanges: List[Dict],
+        through: int
+    ):
+        """Summarize, then apply the result to the latest stored context"""
+        try:
+            summary = await openai_service.summarize_conversation(
+                exchanges, self.SUMMARY_MAX_TOKENS, previous_summary=previous_summary
+            )
+            if not summary:
+                return
+            
+            # The user may have sent more messages meanwhile, so apply it to the latest stored
+            # context; the store retries if a turn is saved while the summary is being written
+            def apply(context: ConversationContext) -> bool:
+                return context.conversation_id == conversation_id and context.apply_summary(summary, through)
+            
+            if await self.conversation_store.update(user_id, apply):
+                logger.debug(f"Conversation summary for {user_id} now covers {through} exchanges")
+        except Exception as e:
+            logger.error(f"Error refreshing conversation summary for {user_id}: {str(e)}")
     
     async def _generate_response(
         self, 
@@ -433,6 +927,52 @@ class ChatbotOrchestrator:
             # Always fallback gracefully
             return await self._generate_fallback_response(intent, context, agent)
     
+    async def _stream_response(
+        self,
+        intent: Intent,
+        context: ConversationContext,
+        agent: str
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Streaming counterpart of _generate_response: delta frames, then a 'response' frame"""
+        
+        if openai_service.is_available():
+            # Import RAG orchestrator (lazy import to avoid circular imports)
+            from services.chatbot.rag_orchestrator import rag_orchestrator
+            
+            async for frame in rag_orchestrator.stream_knowledge_enhanced_response(
+                user_message=self._get_current_message(context),
+                user_role=context.user_role,
+                conversation_context=self._build_rag_conversation_context(intent, context),
+                agent_type=agent,
+                intent=intent
+            ):
+                yield frame
+            return
+        
+        # Pattern-based fallbacks are instant, so they go out as a single delta
+        logger.warning("OpenAI unavailable, using fallback responses")
+        response = await self._generate_fallback_response(intent, context, agent)
+        yield {"type": "delta", "content": response.message}
+        yield {"type": "response", "response": response}
+    
+    def _get_current_message(self, context: ConversationContext) -> str:
+        """Get the current message being processed (from context since it's not in history yet)"""
+        return context.current_message or context.last_user_message
+    
+    def _build_rag_conversation_context(self, intent: Intent, context: ConversationContext) -> Dict[str, Any]:
+        """Prepare context for AI/RAG"""
+        return {
+            "user_role": context.user_role,
+            "conversation_history": context.get_unsummarized_context(self.SUMMARY_KEEP_RECENT),
+            "conversation_summary": context.summary,
+            "urgency_level": intent.urgency.value,
+            "first_time_user": context.message_count == 0,
+            "escalated": context.escalation_level > 0,
+            "emergency_detected": intent.category == IntentCategory.EMERGENCY,
+            "mobile_user": False,  # TODO: Detect from request headers
+            "shelter_id": context.shelter_id
+        }
+    
     async def _generate_ai_response(
         self, 
         intent: Intent, 
@@ -442,22 +982,8 @@ class ChatbotOrchestrator:
         """Generate intelligent AI response with RAG knowledge enhancement"""
         
         try:
-            # Get the current message being processed (from context since it's not in history yet)
-            current_message = getattr(context, 'current_message', '')
-            if not current_message and context.message_history:
-                current_message = context.message_history[-1].get("user_message", "")
-            
-            # Prepare context for AI/RAG
-            conversation_context = {
-                "user_role": context.user_role,
-                "conversation_history": context.get_recent_context(3),
-                "urgency_level": intent.urgency.value,
-                "first_time_user": len(context.message_history) == 0,
-                "escalated": context.escalation_level > 0,
-                "emergency_detected": intent.category == IntentCategory.EMERGENCY,
-                "mobile_user": False,  # TODO: Detect from request headers
-                "shelter_id": getattr(context, 'shelter_id', None)
-            }
+            current_message = self._get_current_message(context)
+            conversation_context = self._build_rag_conversation_context(intent, context)
             
             # Try RAG-enhanced response first
             try:
@@ -484,9 +1010,10 @@ class ChatbotOrchestrator:
                     "user_role": context.user_role,
                     "intent_category": intent.category.value,
                     "intent_subcategory": intent.subcategory,
-                    "conversation_history": context.get_recent_context(3),
+                    "conversation_history": context.get_unsummarized_context(self.SUMMARY_KEEP_RECENT),
+                    "conversation_summary": context.summary,
                     "urgency_level": intent.urgency.value,
-                    "first_time_user": len(context.message_history) == 0,
+                    "first_time_user": context.message_count == 0,
                     "escalated": context.escalation_level > 0,
                     "emergency_detected": intent.category == IntentCategory.EMERGENCY,
                     "mobile_user": False
@@ -499,7 +1026,8 @@ class ChatbotOrchestrator:
                 ai_response = await openai_service.generate_response(
                     message=current_message,
                     context=ai_context,
-                    system_prompt=system_prompt
+                    system_prompt=system_prompt,
+                    priority=intent.request_priority
                 )
                 
                 # Generate contextual actions based on agent and intent
@@ -672,9 +1200,7 @@ class ChatbotOrchestrator:
             from services.chatbot.rag_orchestrator import rag_orchestrator
             
             # Get current message from context
-            current_message = getattr(context, 'current_message', '')
-            if not current_message and context.message_history:
-                current_message = context.message_history[-1].get("user_message", "")
+            current_message = context.current_message or context.last_user_message
             
             # Use RAG for enhanced public information responses
             rag_response = await rag_orchestrator.generate_knowledge_enhanced_response(
@@ -716,9 +1242,7 @@ class ChatbotOrchestrator:
             from services.chatbot.rag_orchestrator import rag_orchestrator
             
             # Get current message from context
-            current_message = getattr(context, 'current_message', '')
-            if not current_message and context.message_history:
-                current_message = context.message_history[-1].get("user_message", "")
+            current_message = context.current_message or context.last_user_message
             
             # Use RAG for enhanced public support responses
             rag_response = await rag_orchestrator.generate_knowledge_enhanced_response(
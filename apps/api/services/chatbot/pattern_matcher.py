@@ -0,0 +1,91 @@
+"""
+SHELTR-AI Pattern Matcher
+Scans a message once against many regexes and reports every pattern that matches
+"""
+
+import re
+from typing import Any, List, Optional, Set, Tuple
+
+WORD_BOUNDARY = r"\b"
+
+class PatternMatcher:
+    """Precompiled alternation of labelled patterns evaluated in a single pass"""
+
+    def __init__(self, patterns: List[Tuple[Any, str]]):
+        self.keys = [key for key, _ in patterns]
+        self._compiled = [re.compile(pattern) for _, pattern in patterns]
+        self._scanner = re.compile(self._build_scanner([pattern for _, pattern in patterns]))
+
+    @staticmethod
+    def _build_scanner(patterns: List[str]) -> str:
+        """Combine the patterns into one alternation of named, zero-width lookaheads"""
+        anchor = ""
+        bodies = patterns
+        # Hoisting a shared leading \b means alternatives are only tried at word starts
+        if patterns and all(pattern.startswith(WORD_BOUNDARY) for pattern in patterns):
+            anchor = WORD_BOUNDARY
+            bodies = [pattern[len(WORD_BOUNDARY):] for pattern in patterns]
+            # When every body opens with a known character, a one-character class rejects most positions
+            first_chars = set()
+            for body in bodies:
+                chars = PatternMatcher._first_chars(body)
+                if chars is None:
+                    break
+                first_chars |= chars
+            else:
+                anchor += f"(?=[{re.escape(''.join(sorted(first_chars)))}])"
+
+        # Each pattern sits in a zero-width lookahead, so overlapping matches are all seen
+        alternatives = "|".join(f"(?=(?P<p{index}>{body}))" for index, body in enumerate(bodies))
+        return f"{anchor}(?:{alternatives})"
+
+    @staticmethod
+    def _first_chars(body: str) -> Optional[Set[str]]:
+        """Characters a pattern body must start with, or None if that is not obvious"""
+        if body[:1].isalnum() or body[:1] == "'":
+            return None if body[1:2] in ("?", "*", "{") else {body[0]}
+        if not body.startswith("("):
+            return None
+
+        # Leading group: collect the first character of each top-level alternative
+        chars = set()
+        depth = 1
+        expect_start = True
+        index = 1
+        while index < len(body):
+            char = body[index]
+            if expect_start:
+                if not (char.isalnum() or char == "'") or body[index + 1:index + 2] in ("?", "*", "{"):
+                    return None
+                chars.add(char)
+                expect_start = False
+            elif char == "\\":
+                index += 1  # skip the escaped character
+            elif char == "[":
+                index = body.find("]", index + 1)
+                if index == -1:
+                    return None
+            elif char == "(":
+                depth += 1
+            elif char == ")":
+                depth -= 1
+                if depth == 0:
+                    # An optional or repeated group could match nothing at all
+                    return None if body[index + 1:index + 2] in ("?", "*", "{") else chars
+            elif char == "|" and depth == 1:
+                expect_start = True
+            index += 1
+        return None
+
+    def scan(self, text: str) -> List[Any]:
+        """Keys of every pattern found anywhere in the text, in pattern order"""
+        hits = set()
+        for match in self._scanner.finditer(text):
+            index = int(match.lastgroup[1:])
+            hits.add(index)
+            # Alternatives after the winner were never tried at this position
+            position = match.start()
+            for later in range(index + 1, len(self._compiled)):
+                if later not in hits and self._compiled[later].match(text, position):
+                    hits.add(later)
+        return [self.keys[index] for index in sorted(hits)]
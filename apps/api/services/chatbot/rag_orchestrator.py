@@ -3,15 +3,16 @@ SHELTR-AI RAG (Retrieval-Augmented Generation) Orchestrator
 Integrates knowledge base search with intelligent chatbot responses
 """
 
+import asyncio
 import logging
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, AsyncIterator
 from datetime import datetime
 
 # SHELTR services
 from services.knowledge_service import knowledge_service
 from services.openai_service import openai_service
 from services.embeddings_service import embeddings_service
-from services.chatbot.orchestrator import ChatResponse, Intent, IntentCategory, UrgencyLevel
+from services.chatbot.orchestrator import ChatResponse, Intent, IntentCategory, UrgencyLevel, StageTimer
 
 logger = logging.getLogger(__name__)
 
@@ -39,15 +40,16 @@ class RAGOrchestrator:
         
         try:
             logger.info(f"Generating RAG response for {agent_type} agent")
+            timer = StageTimer()
             
             # 1. Search knowledge base for relevant information
-            knowledge_results = await self._search_relevant_knowledge(
+            knowledge_results = await timer.run("knowledge_search", self._search_relevant_knowledge(
                 query=user_message,
                 user_role=user_role,
                 agent_type=agent_type,
                 intent=intent,
                 shelter_id=conversation_context.get('shelter_id')
-            )
+            ))
             
             # 2. Prepare enhanced context with retrieved knowledge
             enhanced_context = await self._prepare_rag_context(
@@ -57,49 +59,157 @@ class RAGOrchestrator:
                 intent=intent
             )
             
-            # 3. Generate AI response with knowledge context
-            ai_response = await self._generate_rag_response(
-                user_message=user_message,
-                enhanced_context=enhanced_context,
-                agent_type=agent_type,
-                intent=intent
+            # 3. Generate AI response with knowledge context; actions and follow-up only
+            # depend on the search results, so they are built while the model is generating
+            ai_response, extras = await asyncio.gather(
+                timer.run("llm_generation", self._generate_rag_response(
+                    user_message=user_message,
+                    enhanced_context=enhanced_context,
+                    agent_type=agent_type,
+                    intent=intent
+                )),
+                timer.run("knowledge_extras", self._generate_knowledge_extras(knowledge_results, intent, agent_type))
             )
             
-            # 4. Generate contextual actions
-            actions = await self._generate_knowledge_actions(
-                knowledge_results, intent, agent_type
+            # 4-6. Attach actions, citations and escalation
+            return self._build_rag_chat_response(ai_response, knowledge_results, agent_type, intent, extras, timer)
+            
+        except Exception as e:
+            logger.error(f"RAG response generation failed: {str(e)}")
+            # Fallback to standard AI response without knowledge
+            return await self._generate_fallback_response(
+                user_message, user_role, conversation_context, agent_type, intent
             )
+    
+    async def stream_knowledge_enhanced_response(
+        self,
+        user_message: str,
+        user_role: str,
+        conversation_context: Dict[str, Any],
+        agent_type: str,
+        intent: Intent
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Stream a RAG response as delta frames followed by one frame carrying the full ChatResponse"""
+        
+        streamed_any = False
+        chunks = []
+        extras_task = None
+        
+        try:
+            logger.info(f"Streaming RAG response for {agent_type} agent")
+            timer = StageTimer()
             
-            # 5. Generate source citations
-            citations = self._generate_citations(knowledge_results)
+            knowledge_results = await timer.run("knowledge_search", self._search_relevant_knowledge(
+                query=user_message,
+                user_role=user_role,
+                agent_type=agent_type,
+                intent=intent,
+                shelter_id=conversation_context.get('shelter_id')
+            ))
             
-            # 6. Determine escalation
-            escalation_triggered = (
-                intent.requires_escalation or 
-                intent.urgency == UrgencyLevel.CRITICAL or
-                agent_type == "emergency"
+            # Build actions and follow-up in the background while tokens stream
+            extras_task = asyncio.create_task(
+                timer.run("knowledge_extras", self._generate_knowledge_extras(knowledge_results, intent, agent_type))
             )
             
-            return ChatResponse(
-                message=ai_response,
-                actions=actions,
-                follow_up=await self._generate_rag_follow_up(knowledge_results, intent),
-                escalation_triggered=escalation_triggered,
-                agent_used=f"{agent_type}_rag",
-                metadata={
-                    'knowledge_sources': citations,
-                    'sources_used': len(knowledge_results.get('results', [])),
-                    'search_time': knowledge_results.get('search_time_seconds', 0),
-                    'knowledge_available': len(knowledge_results.get('results', [])) > 0
-                }
+            enhanced_context = await self._prepare_rag_context(
+                user_message=user_message,
+                knowledge_results=knowledge_results,
+                conversation_context=conversation_context,
+                intent=intent
             )
             
-        except Exception as e:
-            logger.error(f"RAG response generation failed: {str(e)}")
-            # Fallback to standard AI response without knowledge
-            return await self._generate_fallback_response(
-                user_message, user_role, conversation_context, agent_type, intent
+            rag_prompt, system_prompt = self._build_rag_request(
+                user_message, enhanced_context, agent_type, intent
             )
+            
+            async for delta in self.openai_service.generate_response_stream(
+                message=rag_prompt,
+                context=enhanced_context,
+                system_prompt=system_prompt,
+                priority=intent.request_priority
+            ):
+                if not streamed_any:
+                    delta = delta.lstrip()
+                    if not delta:
+                        continue
+                streamed_any = True
+                chunks.append(delta)
+                yield {'type': 'delta', 'content': delta}
+            
+            response = self._build_rag_chat_response(
+                "".join(chunks).strip(), knowledge_results, agent_type, intent, await extras_task, timer
+            )
+            
+        except Exception as e:
+            if extras_task is not None and not extras_task.done():
+                extras_task.cancel()
+            if streamed_any:
+                # Tokens already reached the user, so finish with what was generated
+                logger.error(f"RAG stream interrupted: {str(e)}")
+                response = ChatResponse(
+                    message="".join(chunks).strip(),
+                    agent_used=f"{agent_type}_rag",
+                    metadata={'stream_interrupted': True}
+                )
+            else:
+                logger.error(f"RAG stream failed before first token: {str(e)}")
+                response = await self._generate_fallback_response(
+                    user_message, user_role, conversation_context, agent_type, intent
+                )
+                yield {'type': 'delta', 'content': response.message}
+        
+        yield {'type': 'response', 'response': response}
+    
+    async def _generate_knowledge_extras(
+        self,
+        knowledge_results: Dict[str, Any],
+        intent: Intent,
+        agent_type: str
+    ) -> tuple:
+        """Build contextual actions and the follow-up question concurrently"""
+        return await asyncio.gather(
+            self._generate_knowledge_actions(knowledge_results, intent, agent_type),
+            self._generate_rag_follow_up(knowledge_results, intent)
+        )
+    
+    def _build_rag_chat_response(
+        self,
+        ai_response: str,
+        knowledge_results: Dict[str, Any],
+        agent_type: str,
+        intent: Intent,
+        extras: tuple,
+        timer: StageTimer
+    ) -> ChatResponse:
+        """Wrap generated text with knowledge actions, citations and escalation state"""
+        
+        actions, follow_up = extras
+        
+        # Generate source citations
+        citations = self._generate_citations(knowledge_results)
+        
+        # Determine escalation
+        escalation_triggered = (
+            intent.requires_escalation or 
+            intent.urgency == UrgencyLevel.CRITICAL or
+            agent_type == "emergency"
+        )
+        
+        return ChatResponse(
+            message=ai_response,
+            actions=actions,
+            follow_up=follow_up,
+            escalation_triggered=escalation_triggered,
+            agent_used=f"{agent_type}_rag",
+            metadata={
+                'knowledge_sources': citations,
+                'sources_used': len(knowledge_results.get('results', [])),
+                'search_time': knowledge_results.get('search_time_seconds', 0),
+                'knowledge_available': len(knowledge_results.get('results', [])) > 0,
+                'stage_timings_ms': timer.timings
+            }
+        )
     
     async def _search_relevant_knowledge(
         self,
@@ -228,16 +338,16 @@ class RAGOrchestrator:
     ) -> Dict[str, Any]:
         """Prepare enhanced context for RAG response generation"""
         
-        # Format knowledge results for AI context
-        knowledge_context = self._format_knowledge_context(knowledge_results)
-        
-        # Prepare conversation context
-        conversation_history = conversation_context.get('conversation_history', [])
+        # Format knowledge results for AI context; the context assembler fits the passages
+        # and the conversation history into the prompt token budget
+        knowledge_passages = self._format_knowledge_passages(knowledge_results)
         
         return {
             'user_message': user_message,
-            'knowledge_context': knowledge_context,
-            'conversation_history': conversation_history[-3:],  # Last 3 exchanges
+            'knowledge_passages': knowledge_passages,
+            'knowledge_max_tokens': self.max_knowledge_tokens,
+            'conversation_history': conversation_context.get('conversation_history', []),
+            'conversation_summary': conversation_context.get('conversation_summary'),
             'intent': {
                 'category': intent.category.value,
                 'subcategory': intent.subcategory,
@@ -248,32 +358,26 @@ class RAGOrchestrator:
             'sources_count': len(knowledge_results.get('results', []))
         }
     
-    def _format_knowledge_context(self, knowledge_results: Dict[str, Any]) -> str:
-        """Format knowledge results for AI context"""
+    def _format_knowledge_passages(self, knowledge_results: Dict[str, Any]) -> List[str]:
+        """Format knowledge results as passages for AI context, most relevant first"""
         
         results = knowledge_results.get('results', [])
         
-        if not results:
-            return "No specific knowledge base information found for this query."
-        
         context_parts = []
         for i, result in enumerate(results, 1):
             similarity_score = result.get('similarity', 0)
             
             # Only include high-confidence results
             if similarity_score >= self.similarity_threshold:
-                context_parts.append(f"""
-                Knowledge Source {i}:
-                Document: {result.get('document_title', 'Unknown')}
-                Category: {result.get('document_category', 'general')}
-                Content: {result.get('content', '')[:500]}...
-                Relevance: {similarity_score:.2f}
-                """)
-        
-        if not context_parts:
-            return "No high-confidence knowledge matches found."
-        
-        return "\n".join(context_parts)
+                context_parts.append(
+                    f"Knowledge Source {i}:\n"
+                    f"Document: {result.get('document_title', 'Unknown')}\n"
+                    f"Category: {result.get('document_category', 'general')}\n"
+                    f"Content: {result.get('content', '')[:500]}...\n"
+                    f"Relevance: {similarity_score:.2f}"
+                )
+        
+        return context_parts
     
     async def _generate_rag_response(
         self,
@@ -284,6 +388,29 @@ class RAGOrchestrator:
     ) -> str:
         """Generate AI response using RAG with knowledge context"""
         
+        rag_prompt, system_prompt = self._build_rag_request(
+            user_message, enhanced_context, agent_type, intent
+        )
+        
+        # Generate response
+        ai_response = await self.openai_service.generate_response(
+            message=rag_prompt,
+            context=enhanced_context,
+            system_prompt=system_prompt,
+            priority=intent.request_priority
+        )
+        
+        return ai_response
+    
+    def _build_rag_request(
+        self,
+        user_message: str,
+        enhanced_context: Dict[str, Any],
+        agent_type: str,
+        intent: Intent
+    ) -> tuple:
+        """Build the (prompt, system prompt) pair for a RAG completion"""
+        
         # Build RAG prompt
         rag_prompt = self._build_rag_prompt(
             user_message=user_message,
@@ -299,14 +426,7 @@ class RAGOrchestrator:
             'knowledge_available': enhanced_context['knowledge_available']
         })
         
-        # Generate response
-        ai_response = await self.openai_service.generate_response(
-            message=rag_prompt,
-            context=enhanced_context,
-            system_prompt=system_prompt
-        )
-        
-        return ai_response
+        return rag_prompt, system_prompt
     
     def _build_rag_prompt(
         self,
@@ -317,27 +437,14 @@ class RAGOrchestrator:
     ) -> str:
         """Build comprehensive RAG prompt with knowledge context"""
         
-        knowledge_context = enhanced_context['knowledge_context']
-        conversation_history = enhanced_context.get('conversation_history', [])
-        
-        # Format conversation history
-        history_text = ""
-        for exchange in conversation_history:
-            if 'user_message' in exchange and 'bot_response' in exchange:
-                history_text += f"User: {exchange['user_message']}\n"
-                history_text += f"Assistant: {exchange['bot_response']}\n\n"
-        
+        # Retrieved knowledge and conversation history travel as their own messages; the context
+        # assembler states there whether any passage fitted, so the prompt makes no claim about it
         prompt = f"""
-        Based on the SHELTR knowledge base information below, please provide a helpful and accurate response to the user's question.
-        
-        RETRIEVED KNOWLEDGE FROM SHELTR DATABASE:
-        {knowledge_context}
+        Based on the SHELTR knowledge base information, please provide a helpful and accurate response to the user's question.
+        Use the retrieved knowledge from the SHELTR database when it is provided.
         
         USER'S CURRENT QUESTION: {user_message}
         
-        CONVERSATION HISTORY:
-        {history_text}
-        
         CONTEXT:
         - You are SHELTR's {agent_type.replace('_', ' ').title()} Agent
         - Intent: {intent.category.value} ({intent.subcategory})
@@ -8,6 +8,8 @@ import re
 from typing import Dict, List, Optional, Tuple, Any
 from enum import Enum
 
+from services.chatbot.pattern_matcher import PatternMatcher
+
 logger = logging.getLogger(__name__)
 
 class UserRole(Enum):
@@ -24,6 +26,20 @@ class UserClassifier:
     def __init__(self):
         self.role_indicators = self._initialize_role_indicators()
         self.confidence_threshold = 70  # Minimum confidence for role classification
+        self._build_matchers()
+    
+    def _build_matchers(self):
+        """Precompile every role's indicators into one scanner and dedupe the context clues"""
+        self.indicator_matcher = PatternMatcher([
+            ((role, kind, pattern), pattern)
+            for role, indicators in self.role_indicators.items()
+            for kind in ("strong_indicators", "medium_indicators")
+            for pattern in indicators[kind]
+        ])
+        # Clues shared between roles are checked once; plain substring tests beat any regex here
+        self.context_clues = tuple(sorted({
+            clue.lower() for indicators in self.role_indicators.values() for clue in indicators["context_clues"]
+        }))
     
     def _initialize_role_indicators(self) -> Dict[str, Dict[str, List[str]]]:
         """Initialize patterns that indicate different user roles"""
@@ -121,6 +137,10 @@ class UserClassifier:
         role_scores = {}
         classification_evidence = {}
         
+        # Scan the message once for every role's indicators and clues
+        indicator_hits = set(self.indicator_matcher.scan(message_lower))
+        clue_hits = {clue for clue in self.context_clues if clue in message_lower}
+        
         # Score each potential role
         for role, indicators in self.role_indicators.items():
             score = 0
@@ -128,21 +148,18 @@ class UserClassifier:
             
             # Check strong indicators (high weight)
             for pattern in indicators["strong_indicators"]:
-                if re.search(pattern, message_lower):
+                if (role, "strong_indicators", pattern) in indicator_hits:
                     score += 40
                     evidence.append(f"Strong: {pattern}")
             
             # Check medium indicators (medium weight)
             for pattern in indicators["medium_indicators"]:
-                if re.search(pattern, message_lower):
+                if (role, "medium_indicators", pattern) in indicator_hits:
                     score += 20
                     evidence.append(f"Medium: {pattern}")
             
             # Check context clues (low weight, but cumulative)
-            context_matches = 0
-            for clue in indicators["context_clues"]:
-                if clue.lower() in message_lower:
-                    context_matches += 1
+            context_matches = sum(1 for clue in indicators["context_clues"] if clue.lower() in clue_hits)
             
             # Context clue scoring (up to 20 points)
             context_score = min(context_matches * 3, 20)
@@ -0,0 +1,141 @@
+"""
+SHELTR-AI Token Chunker
+Splits documents into overlapping, token-bounded chunks from a single tokenization pass
+"""
+
+import re
+import bisect
+import logging
+from typing import Dict, List, Any, Iterable, Iterator
+
+logger = logging.getLogger(__name__)
+
+# Where a chunk may end, best first. Each match ends right before the whitespace that
+# follows it, since BPE tokens carry their leading space with the next word.
+PARAGRAPH_END = re.compile(r'\S(?=[ \t]*\n[ \t]*\n)')
+SENTENCE_END = re.compile(r'[.!?]+["\')\]]*(?=\s)')
+WORD_END = re.compile(r'\S(?=\s)')
+# Without an encoding, a "token" is a word with its leading whitespace, matching TokenizerService's fallback count
+WORD_TOKEN = re.compile(r'\s*\S+')
+
+class TokenChunker:
+    """
+    Computes chunk boundaries and overlaps as token-offset ranges over one encoding of the text
+
+    encoding may be None (tiktoken failed to load); chunks are then bounded by word counts.
+    """
+
+    def __init__(self, encoding, max_tokens: int = 1000, overlap_tokens: int = 200, buffer_chars: int = 65536):
+        self.encoding = encoding
+        if encoding is None:
+            logger.warning("No tokenizer encoding available, chunking by word count")
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        # How much streamed text to gather before tokenizing a window
+        self.buffer_chars = buffer_chars
+        # Don't snap so early that chunks come out tiny
+        self.min_tokens = max_tokens // 2
+
+    def iter_chunks(self, content: str, metadata: Dict[str, Any], start_index: int = 0) -> Iterator[Dict[str, Any]]:
+        """Yield chunk dicts lazily; chunk text is sliced from the original content, never re-encoded"""
+        state = {'index': start_index}
+        yield from self._chunk_window(content, metadata, state, final=True)
+
+    def iter_stream_chunks(self, segments: Iterable[str], metadata: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """
+        Chunk text that arrives in pieces (e.g. one PDF page at a time) with bounded memory
+
+        Segments are buffered into windows of about buffer_chars. Each window is tokenized once;
+        only the unfinished tail (at most one chunk) is carried into the next window.
+        """
+        state = {'index': 0}
+        buffer = ""
+        for segment in segments:
+            buffer += segment
+            if len(buffer) >= self.buffer_chars:
+                yield from self._chunk_window(buffer, metadata, state, final=False)
+                buffer = state.pop('carry')
+        yield from self._chunk_window(buffer, metadata, state, final=True)
+
+    def _chunk_window(self, content: str, metadata: Dict[str, Any], state: Dict[str, Any], final: bool) -> Iterator[Dict[str, Any]]:
+        """Chunk one window; unless final, stop before the last partial chunk and leave it in state['carry']"""
+        offsets = self._token_offsets(content)
+        if not offsets:
+            state['carry'] = ""
+            return
+        total = len(offsets)
+        offsets.append(len(content))
+
+        paragraph_ends = self._token_positions(PARAGRAPH_END, content, offsets)
+        sentence_ends = self._token_positions(SENTENCE_END, content, offsets)
+        word_ends = self._token_positions(WORD_END, content, offsets)
+
+        start = 0
+        while start < total:
+            if not final and start + self.max_tokens >= total:
+                # More text may follow; let it extend this chunk
+                break
+            end = self._choose_end(start, total, paragraph_ends, sentence_ends, word_ends)
+
+            text = content[offsets[start]:offsets[end]].strip()
+            if text:
+                yield {
+                    'content': text,
+                    'chunk_index': state['index'],
+                    'token_count': end - start,
+                    'char_count': len(text),
+                    'metadata': metadata
+                }
+                state['index'] += 1
+
+            if end >= total:
+                start = total
+                break
+            start = self._choose_overlap_start(start, end, sentence_ends, word_ends)
+
+        state['carry'] = content[offsets[start]:]
+
+    def chunk(self, content: str, metadata: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """All chunks of a document as a list"""
+        return list(self.iter_chunks(content, metadata))
+
+    def _token_offsets(self, content: str) -> List[int]:
+        """Start offset of every token of content"""
+        if self.encoding is None:
+            return [match.start() for match in WORD_TOKEN.finditer(content)]
+        tokens = self.encoding.encode(content, disallowed_special=())
+        if not tokens:
+            return []
+        _, offsets = self.encoding.decode_with_offsets(tokens)
+        return offsets
+
+    @staticmethod
+    def _token_positions(pattern, content: str, offsets: List[int]) -> List[int]:
+        """Index of the first token at or after each match end, i.e. where a chunk may be cut"""
+        positions = []
+        for match in pattern.finditer(content):
+            position = bisect.bisect_left(offsets, match.end())
+            if not positions or positions[-1] != position:
+                positions.append(position)
+        return positions
+
+    def _choose_end(self, start: int, total: int, *boundary_lists: List[int]) -> int:
+        """Furthest preferred boundary within the token budget, falling back to a hard cut"""
+        limit = start + self.max_tokens
+        if limit >= total:
+            return total
+        floor = start + self.min_tokens
+        for boundaries in boundary_lists:
+            position = bisect.bisect_right(boundaries, limit) - 1
+            if position >= 0 and boundaries[position] > floor:
+                return boundaries[position]
+        return limit
+
+    def _choose_overlap_start(self, start: int, end: int, sentence_ends: List[int], word_ends: List[int]) -> int:
+        """Begin the next chunk about overlap_tokens before the previous end, on a sentence or word"""
+        target = max(end - self.overlap_tokens, start + 1)
+        for boundaries in (sentence_ends, word_ends):
+            position = bisect.bisect_left(boundaries, target)
+            if position < len(boundaries) and boundaries[position] < end:
+                return boundaries[position]
+        return target
@@ -0,0 +1,123 @@
+"""
+SHELTR-AI Context Assembler
+Packs the system prompt, retrieved knowledge, rolling summary and history into a token budget
+"""
+
+import logging
+from typing import Dict, List, Any, Optional
+
+from services.tokenizer import tokenizer
+
+logger = logging.getLogger(__name__)
+
+class ContextAssembler:
+    """Builds chat message lists that never exceed a prompt token budget"""
+
+    # Chat-format framing: every message costs a few tokens on top of its content,
+    # and the reply is primed with a few more
+    TOKENS_PER_MESSAGE = 3
+    TOKENS_PER_REPLY = 3
+
+    KNOWLEDGE_HEADER = "Retrieved knowledge from the SHELTR database:"
+    NO_KNOWLEDGE_NOTE = "No high-confidence knowledge matches were found for this question."
+    SUMMARY_HEADER = "Summary of the earlier conversation:"
+
+    def assemble(
+        self,
+        message: str,
+        budget: int,
+        system_prompt: Optional[str] = None,
+        knowledge: Optional[List[str]] = None,
+        knowledge_max_tokens: Optional[int] = None,
+        summary: Optional[str] = None,
+        history: Optional[List[Dict[str, Any]]] = None
+    ) -> List[Dict[str, str]]:
+        """
+        Fill the budget in priority order: system prompt and current message (always sent),
+        knowledge passages best first, the rolling summary, then history turns newest first
+
+        When knowledge is a list (even an empty one) and no passage fits, a short note says so,
+        so the model is never told about knowledge that was not sent.
+        """
+        head = []
+        if system_prompt:
+            head.append({"role": "system", "content": system_prompt})
+        tail = [{"role": "user", "content": message}]
+
+        used = self.TOKENS_PER_REPLY + self.message_tokens(head + tail)
+        remaining = budget - used
+        if remaining < 0:
+            logger.warning(f"System prompt and message need {used} tokens, over the {budget} token budget")
+            return head + tail
+
+        if knowledge is not None:
+            knowledge_message = None
+            if knowledge:
+                limit = remaining if knowledge_max_tokens is None else min(remaining, knowledge_max_tokens)
+                knowledge_message = self._pack_knowledge(knowledge, limit)
+            if knowledge_message is None:
+                knowledge_message = {"role": "system", "content": self.NO_KNOWLEDGE_NOTE}
+            cost = self.message_tokens([knowledge_message])
+            if cost <= remaining:
+                head.append(knowledge_message)
+                remaining -= cost
+
+        if summary:
+            summary_message = {"role": "system", "content": f"{self.SUMMARY_HEADER}\n{summary}"}
+            cost = self.message_tokens([summary_message])
+            if cost <= remaining:
+                head.append(summary_message)
+                remaining -= cost
+
+        return head + self._pack_history(history or [], remaining) + tail
+
+    def message_tokens(self, messages: List[Dict[str, str]]) -> int:
+        """Exact prompt cost of messages, including per-message framing"""
+        return tokenizer.count_messages(messages) + self.TOKENS_PER_MESSAGE * len(messages)
+
+    def _pack_knowledge(self, passages: List[str], limit: int) -> Optional[Dict[str, str]]:
+        """Keep the leading (most relevant) passages that fit, as one system message"""
+        costs = tokenizer.count_many(passages)
+        header_cost = tokenizer.count(self.KNOWLEDGE_HEADER) + self.TOKENS_PER_MESSAGE
+
+        selected = []
+        total = header_cost
+        for passage, cost in zip(passages, costs):
+            # +2 for the blank line separating passages
+            if total + cost + 2 > limit:
+                break
+            selected.append(passage)
+            total += cost + 2
+
+        # Separators can merge with neighbouring tokens, so confirm with an exact count
+        while selected:
+            knowledge_message = {"role": "system", "content": "\n\n".join([self.KNOWLEDGE_HEADER] + selected)}
+            if self.message_tokens([knowledge_message]) <= limit:
+                return knowledge_message
+            selected.pop()
+        return None
+
+    def _pack_history(self, history: List[Dict[str, Any]], remaining: int) -> List[Dict[str, str]]:
+        """Most recent complete exchanges that fit, in chronological order"""
+        exchanges = [
+            exchange for exchange in history
+            if "user_message" in exchange and "bot_response" in exchange
+        ]
+        costs = tokenizer.count_many(
+            text for exchange in exchanges for text in (exchange["user_message"], exchange["bot_response"])
+        )
+
+        messages = []
+        for i in range(len(exchanges) - 1, -1, -1):
+            cost = costs[2 * i] + costs[2 * i + 1] + 2 * self.TOKENS_PER_MESSAGE
+            if cost > remaining:
+                break
+            remaining -= cost
+            messages.append({"role": "assistant", "content": exchanges[i]["bot_response"]})
+            messages.append({"role": "user", "content": exchanges[i]["user_message"]})
+
+        messages.reverse()
+        return messages
+
+# Create singleton instance
+context_assembler = ContextAssembler()
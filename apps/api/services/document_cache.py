@@ -0,0 +1,98 @@
+"""
+SHELTR-AI Document Metadata Cache
+In-memory, TTL-bounded cache of knowledge document metadata used by search
+"""
+
+import os
+import time
+import logging
+from typing import Dict, List, Any, Optional, Iterable
+
+# Firebase imports
+from firebase_admin import firestore
+
+logger = logging.getLogger(__name__)
+
+class DocumentMetadataCache:
+    """Caches the knowledge_documents fields search needs, keyed by document id"""
+
+    # Only the fields search reads are kept, so large documents don't bloat the cache
+    CACHED_FIELDS = ('title', 'category', 'summary', 'file_path', 'access_level', 'shelter_id')
+
+    def __init__(self):
+        # Firebase client (lazy initialization)
+        self._db = None
+
+        self.ttl_seconds = int(os.getenv("DOCUMENT_CACHE_TTL_SECONDS", 300))
+        self._entries: Dict[str, tuple] = {}  # document_id -> (expires_at, metadata or None)
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def db(self):
+        """Lazy initialization of Firestore client"""
+        if self._db is None:
+            self._db = firestore.client()
+        return self._db
+
+    async def get(self, document_id: str) -> Optional[Dict[str, Any]]:
+        """Get metadata for one document, or None if it does not exist"""
+        documents = await self.get_many([document_id])
+        return documents.get(document_id)
+
+    async def get_many(self, document_ids: Iterable[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """Get metadata for many documents, fetching all misses in a single round trip"""
+        now = time.time()
+        found = {}
+        missing = []
+
+        for document_id in set(document_ids):
+            if not document_id:
+                continue
+            entry = self._entries.get(document_id)
+            if entry and entry[0] > now:
+                self.hits += 1
+                found[document_id] = entry[1]
+            else:
+                self.misses += 1
+                missing.append(document_id)
+
+        if missing:
+            collection = self.db.collection('knowledge_documents')
+            refs = [collection.document(document_id) for document_id in missing]
+            expires_at = now + self.ttl_seconds
+
+            # Documents that no longer exist are cached as None so they are not re-fetched
+            fetched = {document_id: None for document_id in missing}
+            for snapshot in self.db.get_all(refs):
+                if snapshot.exists:
+                    doc_dict = snapshot.to_dict()
+                    fetched[snapshot.id] = {field: doc_dict.get(field) for field in self.CACHED_FIELDS}
+
+            for document_id, metadata in fetched.items():
+                self._entries[document_id] = (expires_at, metadata)
+            found.update(fetched)
+
+        return found
+
+    def invalidate(self, document_id: str):
+        """Forget a document after it is updated or deleted"""
+        self._entries.pop(document_id, None)
+
+    def clear(self):
+        """Forget every cached document"""
+        self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Cache size and hit/miss counters"""
+        total = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'ttl_seconds': self.ttl_seconds
+        }
+
+# Create singleton instance
+document_cache = DocumentMetadataCache()
@@ -5,8 +5,10 @@ Processes various document formats for knowledge base ingestion
 
 import os
 import re
+import asyncio
 import logging
-from typing import Dict, List, Any, Optional, Union
+import tempfile
+from typing import Dict, List, Any, Optional, Union, Iterator
 from pathlib import Path
 import hashlib
 from datetime import datetime
@@ -20,6 +22,7 @@ import markdown
 # Firebase and OpenAI imports
 from firebase_admin import storage, firestore
 from services.openai_service import openai_service
+from services.openai_scheduler import Priority
 
 logger = logging.getLogger(__name__)
 
@@ -36,6 +39,10 @@ class DocumentProcessor:
             '.html': self._process_html
         }
         
+        # Incremental extraction
+        self.stream_block_chars = 65536  # Plain-text read size
+        self.profile_head_chars = 4000   # Leading text kept for summary and language detection
+        
         # Firebase clients (lazy initialization)
         self._storage_client = None
         self._db = None
@@ -66,9 +73,16 @@ class DocumentProcessor:
     async def process_document(
         self, 
         file_path: str, 
-        metadata: Optional[Dict[str, Any]] = None
+        metadata: Optional[Dict[str, Any]] = None,
+        include_content: bool = True
     ) -> Dict[str, Any]:
-        """Process document and extract text content with metadata"""
+        """
+        Process document and extract text content with metadata
+        
+        With include_content=False the text is extracted once into a temporary plain-text file
+        instead of memory, so large files are handled in bounded memory. Stream it with
+        iter_text(result['text_path']) and remove it with discard_text(result) when done.
+        """
         
         try:
             # Validate file exists
@@ -86,8 +100,11 @@ class DocumentProcessor:
             
             logger.info(f"Processing {file_info['name']} ({file_ext})")
             
-            # Extract text content
-            content_data = await processor(file_path)
+            if not include_content:
+                return await self._profile_document(file_path, file_info, metadata)
+            
+            # Extract text content (parsing is CPU-bound, keep it off the event loop)
+            content_data = await asyncio.to_thread(processor, file_path)
             
             # Auto-categorize document
             category = self._auto_categorize(file_path, content_data['text'])
@@ -126,6 +143,159 @@ class DocumentProcessor:
             logger.error(f"Document processing failed for {file_path}: {str(e)}")
             raise
     
+    def iter_text(self, file_path: str, headings: Optional[List[Dict[str, Any]]] = None) -> Iterator[str]:
+        """
+        Yield a document's text incrementally (per page, paragraph or block) instead of all at once
+
+        Detected headings are appended to `headings` when a list is passed.
+        """
+        file_ext = Path(file_path).suffix.lower()
+        
+        if file_ext == '.pdf':
+            with open(file_path, 'rb') as file:
+                pdf_reader = PyPDF2.PdfReader(file)
+                for page_num, page in enumerate(pdf_reader.pages):
+                    page_text = page.extract_text()
+                    if headings is not None:
+                        headings.extend(self._pdf_page_headings(page_text, page_num))
+                    yield f"\n--- Page {page_num + 1} ---\n{page_text}"
+        elif file_ext in ('.docx', '.doc'):
+            doc = docx.Document(file_path)
+            position = 0
+            for paragraph in doc.paragraphs:
+                if headings is not None:
+                    heading = self._docx_heading(paragraph, position)
+                    if heading:
+                        headings.append(heading)
+                position += len(paragraph.text) + 1
+                yield paragraph.text + "\n"
+        elif file_ext == '.txt':
+            with open(file_path, 'r', encoding='utf-8') as file:
+                while True:
+                    block = file.read(self.stream_block_chars)
+                    if not block:
+                        break
+                    yield block
+        elif file_ext == '.md':
+            # Markdown cleanup needs whole-file regexes (code fences span lines)
+            with open(file_path, 'r', encoding='utf-8') as file:
+                content = file.read()
+            if headings is not None:
+                headings.extend(self._markdown_headings(content))
+            yield self._markdown_to_text(content)
+        elif file_ext == '.html':
+            with open(file_path, 'r', encoding='utf-8') as file:
+                yield self._html_to_text(file.read())
+        else:
+            raise ValueError(f"Unsupported file type: {file_ext}")
+    
+    def discard_text(self, result: Optional[Dict[str, Any]]):
+        """Remove the temporary text file of a profiled document"""
+        text_path = (result or {}).get('text_path')
+        if text_path and os.path.exists(text_path):
+            os.remove(text_path)
+    
+    @staticmethod
+    def _strip_segments(segments: Iterator[str]) -> Iterator[str]:
+        """Yield segments whose concatenation equals ''.join(segments).strip(), without joining them"""
+        started = False
+        held = ""
+        for segment in segments:
+            if not started:
+                segment = segment.lstrip()
+                if not segment:
+                    continue
+                started = True
+            body = segment.rstrip()
+            if not body:
+                held += segment
+                continue
+            yield held + body
+            held = segment[len(body):]
+    
+    async def _profile_document(
+        self,
+        file_path: str,
+        file_info: Dict[str, Any],
+        metadata: Optional[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """Compute the process_document fields in one extraction pass, spooling the text to a temporary file"""
+        fd, text_path = tempfile.mkstemp(prefix='sheltr-ingest-', suffix='.txt')
+        os.close(fd)
+        try:
+            scan = await asyncio.to_thread(self._scan_document, file_path, text_path)
+            summary = await self._generate_summary(scan['head'])
+        except BaseException:
+            os.remove(text_path)
+            raise
+        
+        result = {
+            'file_info': file_info,
+            'content': None,
+            'text_path': text_path,
+            'summary': summary,
+            'category': self._auto_categorize(file_path, scan['head'], scan['category_scores']),
+            'language': self._detect_language(scan['head']),
+            'content_hash': scan['content_hash'],
+            'word_count': scan['word_count'],
+            'char_count': scan['char_count'],
+            'headings': scan['headings'],
+            'metadata': {
+                **file_info,
+                **(metadata or {}),
+                'processed_at': datetime.now().isoformat(),
+                'processor_version': '1.0.0'
+            }
+        }
+        
+        logger.info(f"Successfully profiled {file_info['name']} - {scan['word_count']} words")
+        return result
+    
+    def _scan_document(self, file_path: str, text_path: str) -> Dict[str, Any]:
+        """
+        Extract the text once, writing it to text_path and measuring it on the way (runs in a worker thread)
+
+        Hash and counts are taken over the stripped text, exactly as process_document does in memory,
+        so both paths produce the same content_hash for the same file.
+        """
+        content_hash = hashlib.sha256()
+        word_count = 0
+        char_count = 0
+        head = ""
+        headings: List[Dict[str, Any]] = []
+        category_scores = {category: 0 for category in self.categories}
+        # Carry the end of the previous segment so keywords split across segments are still found
+        overlap_chars = max((len(keyword) for keywords in self.categories.values() for keyword in keywords), default=1) - 1
+        tail = ""
+        in_word = False
+        
+        with open(text_path, 'w', encoding='utf-8') as spool:
+            for segment in self._strip_segments(self.iter_text(file_path, headings)):
+                spool.write(segment)
+                content_hash.update(segment.encode('utf-8'))
+                word_count += len(segment.split())
+                # A word split across two segments was counted twice
+                if in_word and not segment[0].isspace():
+                    word_count -= 1
+                in_word = not segment[-1].isspace()
+                char_count += len(segment)
+                if len(head) < self.profile_head_chars:
+                    head += segment[:self.profile_head_chars - len(head)]
+                window = tail + segment.lower()
+                for category, keywords in self.categories.items():
+                    # Matches wholly inside the carried tail were counted with the previous segment
+                    category_scores[category] += sum(window.count(keyword) - tail.count(keyword) for keyword in keywords)
+                tail = window[-overlap_chars:] if overlap_chars else ""
+        
+        return {
+            'content_hash': content_hash.hexdigest(),
+            'word_count': word_count,
+            'char_count': char_count,
+            'head': head,
+            'headings': headings,
+            'category_scores': category_scores
+        }
+    
     def _analyze_file(self, file_path: str) -> Dict[str, Any]:
         """Analyze file and extract basic information"""
         path = Path(file_path)
@@ -142,7 +312,7 @@ class DocumentProcessor:
             'created_at': datetime.fromtimestamp(stat.st_ctime).isoformat()
         }
     
-    async def _process_pdf(self, file_path: str) -> Dict[str, Any]:
+    def _process_pdf(self, file_path: str) -> Dict[str, Any]:
         """Extract text from PDF file"""
         try:
             with open(file_path, 'rb') as file:
@@ -153,19 +323,7 @@ class DocumentProcessor:
                 
                 for page_num, page in enumerate(pdf_reader.pages):
                     page_text = page.extract_text()
-                    
-                    # Simple heading detection (lines that are all caps or short)
-                    lines = page_text.split('\n')
-                    for i, line in enumerate(lines):
-                        line = line.strip()
-                        if line and (line.isupper() or len(line) < 60) and not line.isdigit():
-                            if any(word in line.lower() for word in ['chapter', 'section', 'introduction', 'conclusion']):
-                                headings.append({
-                                    'text': line,
-                                    'page': page_num + 1,
-                                    'level': 1 if line.isupper() else 2
-                                })
-                    
+                    headings.extend(self._pdf_page_headings(page_text, page_num))
                     text_content += f"\n--- Page {page_num + 1} ---\n{page_text}"
                 
                 return {
@@ -178,7 +336,21 @@ class DocumentProcessor:
             logger.error(f"PDF processing failed: {str(e)}")
             raise ValueError(f"Failed to process PDF: {str(e)}")
     
-    async def _process_docx(self, file_path: str) -> Dict[str, Any]:
+    def _pdf_page_headings(self, page_text: str, page_num: int) -> List[Dict[str, Any]]:
+        """Simple heading detection (lines that are all caps or short)"""
+        headings = []
+        for line in page_text.split('\n'):
+            line = line.strip()
+            if line and (line.isupper() or len(line) < 60) and not line.isdigit():
+                if any(word in line.lower() for word in ['chapter', 'section', 'introduction', 'conclusion']):
+                    headings.append({
+                        'text': line,
+                        'page': page_num + 1,
+                        'level': 1 if line.isupper() else 2
+                    })
+        return headings
+    
+    def _process_docx(self, file_path: str) -> Dict[str, Any]:
         """Extract text from Word document"""
         try:
             doc = docx.Document(file_path)
@@ -186,17 +358,9 @@ class DocumentProcessor:
             headings = []
             
             for paragraph in doc.paragraphs:
-                # Detect headings by style
-                if paragraph.style.name.startswith('Heading'):
-                    level = 1
-                    if paragraph.style.name[-1].isdigit():
-                        level = int(paragraph.style.name[-1])
-                    
-                    headings.append({
-                        'text': paragraph.text,
-                        'level': level,
-                        'position': len(text_content)
-                    })
+                heading = self._docx_heading(paragraph, len(text_content))
+                if heading:
+                    headings.append(heading)
                 
                 text_content += paragraph.text + "\n"
             
@@ -209,35 +373,27 @@ class DocumentProcessor:
             logger.error(f"DOCX processing failed: {str(e)}")
             raise ValueError(f"Failed to process DOCX: {str(e)}")
     
-    async def _process_markdown(self, file_path: str) -> Dict[str, Any]:
+    def _docx_heading(self, paragraph, position: int) -> Optional[Dict[str, Any]]:
+        """Detect headings by style"""
+        if not paragraph.style.name.startswith('Heading'):
+            return None
+        level = 1
+        if paragraph.style.name[-1].isdigit():
+            level = int(paragraph.style.name[-1])
+        return {
+            'text': paragraph.text,
+            'level': level,
+            'position': position
+        }
+    
+    def _process_markdown(self, file_path: str) -> Dict[str, Any]:
         """Extract text from Markdown file"""
         try:
             with open(file_path, 'r', encoding='utf-8') as file:
                 content = file.read()
             
-            # Extract headings using regex
-            headings = []
-            heading_pattern = r'^(#{1,6})\s+(.+)$'
-            
-            for match in re.finditer(heading_pattern, content, re.MULTILINE):
-                level = len(match.group(1))
-                text = match.group(2).strip()
-                headings.append({
-                    'text': text,
-                    'level': level,
-                    'position': match.start()
-                })
-            
-            # Convert markdown to plain text (simple approach)
-            # Remove markdown syntax
-            text_content = content
-            text_content = re.sub(r'^#{1,6}\s+', '', text_content, flags=re.MULTILINE)  # Headers
-            text_content = re.sub(r'\*\*(.*?)\*\*', r'\1', text_content)  # Bold
-            text_content = re.sub(r'\*(.*?)\*', r'\1', text_content)  # Italic
-            text_content = re.sub(r'`(.*?)`', r'\1', text_content)  # Inline code
-            text_content = re.sub(r'```[\s\S]*?```', '', text_content)  # Code blocks
-            text_content = re.sub(r'\[([^\]]+)\]\([^\)]+\)', r'\1', text_content)  # Links
-            text_content = re.sub(r'\n+', '\n', text_content)  # Multiple newlines
+            headings = self._markdown_headings(content)
+            text_content = self._markdown_to_text(content)
             
             return {
                 'text': text_content.strip(),
@@ -248,7 +404,20 @@ class DocumentProcessor:
             logger.error(f"Markdown processing failed: {str(e)}")
             raise ValueError(f"Failed to process Markdown: {str(e)}")
     
-    async def _process_text(self, file_path: str) -> Dict[str, Any]:
+    def _markdown_headings(self, content: str) -> List[Dict[str, Any]]:
+        """Extract headings using regex"""
+        headings = []
+        heading_pattern = r'^(#{1,6})\s+(.+)$'
+        
+        for match in re.finditer(heading_pattern, content, re.MULTILINE):
+            headings.append({
+                'text': match.group(2).strip(),
+                'level': len(match.group(1)),
+                'position': match.start()
+            })
+        return headings
+    
+    def _process_text(self, file_path: str) -> Dict[str, Any]:
         """Extract text from plain text file"""
         try:
             with open(file_path, 'r', encoding='utf-8') as file:
@@ -263,15 +432,13 @@ class DocumentProcessor:
             logger.error(f"Text processing failed: {str(e)}")
             raise ValueError(f"Failed to process text file: {str(e)}")
     
-    async def _process_html(self, file_path: str) -> Dict[str, Any]:
+    def _process_html(self, file_path: str) -> Dict[str, Any]:
         """Extract text from HTML file (basic)"""
         try:
             with open(file_path, 'r', encoding='utf-8') as file:
                 content = file.read()
             
-            # Very basic HTML tag removal
-            text_content = re.sub(r'<[^>]+>', '', content)
-            text_content = re.sub(r'\s+', ' ', text_content)
+            text_content = self._html_to_text(content)
             
             return {
                 'text': text_content.strip(),
@@ -282,7 +449,25 @@ class DocumentProcessor:
             logger.error(f"HTML processing failed: {str(e)}")
             raise ValueError(f"Failed to process HTML: {str(e)}")
     
-    def _auto_categorize(self, file_path: str, content: str) -> str:
+    def _markdown_to_text(self, content: str) -> str:
+        """Convert markdown to plain text (simple approach)"""
+        # Remove markdown syntax
+        text_content = content
+        text_content = re.sub(r'^#{1,6}\s+', '', text_content, flags=re.MULTILINE)  # Headers
+        text_content = re.sub(r'\*\*(.*?)\*\*', r'\1', text_content)  # Bold
+        text_content = re.sub(r'\*(.*?)\*', r'\1', text_content)  # Italic
+        text_content = re.sub(r'`(.*?)`', r'\1', text_content)  # Inline code
+        text_content = re.sub(r'```[\s\S]*?```', '', text_content)  # Code blocks
+        text_content = re.sub(r'\[([^\]]+)\]\([^\)]+\)', r'\1', text_content)  # Links
+        text_content = re.sub(r'\n+', '\n', text_content)  # Multiple newlines
+        return text_content
+    
+    def _html_to_text(self, content: str) -> str:
+        """Very basic HTML tag removal"""
+        text_content = re.sub(r'<[^>]+>', '', content)
+        return re.sub(r'\s+', ' ', text_content)
+    
+    def _auto_categorize(self, file_path: str, content: str, keyword_scores: Optional[Dict[str, int]] = None) -> str:
         """Auto-categorize document based on path and content"""
         file_path_lower = file_path.lower()
         content_lower = content.lower()
@@ -292,10 +477,13 @@ class DocumentProcessor:
             if any(keyword in file_path_lower for keyword in keywords):
                 return category
         
-        # Check content keywords
+        # Check content keywords (precomputed when the text was streamed)
         category_scores = {}
         for category, keywords in self.categories.items():
-            score = sum(content_lower.count(keyword) for keyword in keywords)
+            if keyword_scores is not None:
+                score = keyword_scores.get(category, 0)
+            else:
+                score = sum(content_lower.count(keyword) for keyword in keywords)
             if score > 0:
                 category_scores[category] = score
         
@@ -324,7 +512,8 @@ class DocumentProcessor:
                 summary = await openai_service.generate_response(
                     message=summary_prompt,
                     context={'task': 'document_summarization'},
-                    system_prompt="You are a document summarization assistant for SHELTR. Provide clear, concise summaries focusing on homeless services and platform features."
+                    system_prompt="You are a document summarization assistant for SHELTR. Provide clear, concise summaries focusing on homeless services and platform features.",
+                    priority=Priority.SUMMARIZATION
                 )
                 
                 return summary[:max_length]
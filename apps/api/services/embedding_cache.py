@@ -0,0 +1,227 @@
+"""
+SHELTR-AI Query Embedding Cache
+Bounded in-memory LRU of query embeddings with an optional, size-capped SQLite tier that survives restarts
+"""
+
+import os
+import re
+import time
+import sqlite3
+import asyncio
+import hashlib
+import logging
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Any, Optional, Callable, Awaitable
+
+logger = logging.getLogger(__name__)
+
+class QueryEmbeddingCache:
+    """
+    Caches query embeddings keyed by normalized query text and embedding model
+
+    SQLite reads and writes run in worker threads so they never block the event loop; the disk
+    tier keeps the newest max_disk_entries rows and prunes the rest every few hundred writes.
+    """
+
+    # Disk writes between prunes
+    PRUNE_EVERY = 256
+
+    def __init__(self, max_entries: Optional[int] = None, db_path: Optional[str] = None):
+        self.max_entries = max_entries or int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", 2048))
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
+        # Counters
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        # Optional persistent tier
+        self.db_path = db_path or os.getenv("QUERY_EMBEDDING_CACHE_PATH")
+        self.max_disk_entries = int(os.getenv("QUERY_EMBEDDING_CACHE_DISK_ENTRIES", 50000))
+        self._conn = None
+        self._disk_writes = 0
+        self.disk_pruned = 0
+        self._conn_lock = threading.Lock()
+        if self.db_path:
+            self._open_disk_tier(self.db_path)
+
+    def _open_disk_tier(self, db_path: str):
+        """Open (or create) the SQLite file backing the persistent tier"""
+        try:
+            directory = os.path.dirname(db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(db_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS query_embeddings ("
+                "key TEXT PRIMARY KEY, model TEXT NOT NULL, embedding BLOB NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS query_embeddings_created_at ON query_embeddings (created_at)"
+            )
+            self._conn.commit()
+            self._prune()
+            logger.info(f"Query embedding cache persisting to {db_path}")
+        except Exception as e:
+            logger.warning(f"Query embedding disk cache unavailable, using memory only: {e}")
+            self._conn = None
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        """Lower-case and collapse whitespace so trivially different queries share an entry"""
+        return re.sub(r'\s+', ' ', query).strip().lower()
+
+    def make_key(self, query: str, model: str) -> str:
+        """Cache key for a query under a given embedding model"""
+        return hashlib.sha256(f"{model}\n{self.normalize_query(query)}".encode('utf-8')).hexdigest()
+
+    async def get(self, query: str, model: str) -> Optional[List[float]]:
+        """Look a query up in memory, then on disk"""
+        key = self.make_key(query, model)
+
+        embedding = self._memory.get(key)
+        if embedding is not None:
+            self._memory.move_to_end(key)
+            self.memory_hits += 1
+            return embedding
+
+        embedding = await asyncio.to_thread(self._disk_get, key) if self._conn is not None else None
+        if embedding is not None:
+            self.disk_hits += 1
+            self._memory_put(key, embedding)
+            return embedding
+
+        self.misses += 1
+        return None
+
+    async def put(self, query: str, model: str, embedding: List[float]):
+        """Store an embedding in both tiers"""
+        key = self.make_key(query, model)
+        self._memory_put(key, embedding)
+        if self._conn is not None:
+            await asyncio.to_thread(self._disk_put, key, model, embedding)
+
+    async def get_or_compute(
+        self,
+        query: str,
+        model: str,
+        compute: Callable[[], Awaitable[List[float]]]
+    ) -> List[float]:
+        """Return a cached embedding, computing it once even under concurrent identical queries"""
+        embedding = await self.get(query, model)
+        if embedding is not None:
+            return embedding
+
+        key = self.make_key(query, model)
+        while True:
+            pending = self._in_flight.get(key)
+            if pending is None:
+                break
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                # Only our own cancellation propagates; if the leader was cancelled, take over from it
+                if not pending.cancelled():
+                    raise
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            embedding = await compute()
+            self._memory_put(key, embedding)
+            # Waiters need not wait for the disk write
+            future.set_result(embedding)
+            if self._conn is not None:
+                await asyncio.to_thread(self._disk_put, key, model, embedding)
+            return embedding
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception retrieved when nobody else was waiting on it
+            future.exception()
+            raise
+        finally:
+            # Cancellation (or any other BaseException) must still release the waiters
+            if not future.done():
+                future.cancel()
+            self._in_flight.pop(key, None)
+
+    def clear(self):
+        """Drop every cached embedding from both tiers"""
+        self._memory.clear()
+        if self._conn is not None:
+            with self._conn_lock:
+                self._conn.execute("DELETE FROM query_embeddings")
+                self._conn.commit()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and tier sizes"""
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            'memory_entries': len(self._memory),
+            'max_entries': self.max_entries,
+            'memory_hits': self.memory_hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_rate': (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            'persistent': self._conn is not None,
+            'max_disk_entries': self.max_disk_entries,
+            'disk_pruned': self.disk_pruned
+        }
+
+    def _memory_put(self, key: str, embedding: List[float]):
+        """Insert into the LRU, evicting the least recently used entry when full"""
+        self._memory[key] = embedding
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _disk_get(self, key: str) -> Optional[List[float]]:
+        """Read an embedding from the persistent tier"""
+        if self._conn is None:
+            return None
+        try:
+            with self._conn_lock:
+                row = self._conn.execute(
+                    "SELECT embedding FROM query_embeddings WHERE key = ?", (key,)
+                ).fetchone()
+            if row is None:
+                return None
+            return array('f', row[0]).tolist()
+        except Exception as e:
+            logger.warning(f"Query embedding disk cache read failed: {e}")
+            return None
+
+    def _disk_put(self, key: str, model: str, embedding: List[float]):
+        """Write an embedding to the persistent tier as packed float32"""
+        if self._conn is None:
+            return
+        try:
+            with self._conn_lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO query_embeddings (key, model, embedding, created_at) VALUES (?, ?, ?, ?)",
+                    (key, model, array('f', embedding).tobytes(), time.time())
+                )
+                self._conn.commit()
+                self._disk_writes += 1
+                if self._disk_writes % self.PRUNE_EVERY == 0:
+                    self._prune()
+        except Exception as e:
+            logger.warning(f"Query embedding disk cache write failed: {e}")
+
+    def _prune(self):
+        """Delete all but the newest max_disk_entries rows (caller holds the lock, or is the constructor)"""
+        cursor = self._conn.execute(
+            "DELETE FROM query_embeddings WHERE key IN ("
+            "SELECT key FROM query_embeddings ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_disk_entries,)
+        )
+        self._conn.commit()
+        if cursor.rowcount > 0:
+            self.disk_pruned += cursor.rowcount
+
+# Create singleton instance
+query_embedding_cache = QueryEmbeddingCache()
@@ -6,9 +6,10 @@ Generates and manages document embeddings using OpenAI and Firebase
 import os
 import time
 import logging
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Union, Iterable, Iterator, Set
 from datetime import datetime
 import asyncio
+import re
 import numpy as np
 
 # Firebase imports
@@ -16,7 +17,15 @@ from firebase_admin import firestore, storage
 
 # OpenAI and processing imports
 from services.openai_service import openai_service
-import tiktoken
+from services.openai_scheduler import Priority
+from services.vector_index import vector_index
+from services.bulk_writer import FirestoreBulkWriter
+from services.document_cache import document_cache
+from services.embedding_cache import query_embedding_cache
+from services.chunker import TokenChunker
+from services.tokenizer import tokenizer
+from services.firestore_aggregates import firestore_aggregates
+import openai
 
 logger = logging.getLogger(__name__)
 
@@ -33,13 +42,16 @@ class EmbeddingsService:
         self.embedding_model = "text-embedding-3-small"  # Cost-effective, good quality
         self.max_chunk_size = 1000  # Tokens per chunk
         self.chunk_overlap = 200    # Overlap between chunks
-        self.max_chunks_per_doc = 50  # Prevent runaway processing
         
-        # Token encoding
-        try:
-            self.encoding = tiktoken.encoding_for_model("gpt-4o-mini")
-        except KeyError:
-            self.encoding = tiktoken.get_encoding("cl100k_base")
+        # Batched embedding requests
+        self.embedding_batch_max_tokens = int(os.getenv("EMBEDDING_BATCH_MAX_TOKENS", 50000))
+        self.embedding_batch_max_inputs = int(os.getenv("EMBEDDING_BATCH_MAX_INPUTS", 256))
+        self.embedding_concurrency = int(os.getenv("EMBEDDING_CONCURRENCY", 4))
+        self.embedding_max_retries = 5
+        self._rate_limit_until = 0.0  # Shared pause derived from rate-limit headers
+        
+        # Chunking uses the shared encoder
+        self.chunker = TokenChunker(tokenizer.encoding, self.max_chunk_size, self.chunk_overlap)
     
     @property
     def db(self):
@@ -59,10 +71,15 @@ class EmbeddingsService:
     async def process_document_embeddings(
         self, 
         document_id: str,
-        content: str,
+        content: Union[str, Iterable[str]],
         metadata: Dict[str, Any]
     ) -> List[str]:
-        """Generate embeddings for a document and store in Firestore"""
+        """
+        Generate embeddings for a document and store in Firestore
+        
+        content may be a string or an iterable of text segments (e.g. DocumentProcessor.iter_text);
+        chunks, embedding batches and writes are streamed so memory stays bounded for any document size.
+        """
         
         try:
             if not openai_service.is_available():
@@ -70,25 +87,36 @@ class EmbeddingsService:
             
             logger.info(f"Generating embeddings for document {document_id}")
             
-            # Split content into chunks
-            chunks = await self._split_into_chunks(content, metadata)
+            metadata = await self._record_filter_metadata(document_id, metadata)
+            segments = [content] if isinstance(content, str) else content
+            chunks = self.chunker.iter_stream_chunks(segments, metadata)
+            batches = self._batch_chunks_by_tokens(chunks)
             
-            if len(chunks) > self.max_chunks_per_doc:
-                logger.warning(f"Document {document_id} has {len(chunks)} chunks, limiting to {self.max_chunks_per_doc}")
-                chunks = chunks[:self.max_chunks_per_doc]
+            # Send many chunks per API request, with a bounded number of requests in flight
+            batch_results = []
+            pending = set()
+            try:
+                while True:
+                    # Reading and tokenizing the next batch is blocking CPU work, so it runs in a worker thread
+                    next_batch = await asyncio.to_thread(next, batches, None)
+                    if next_batch is None:
+                        break
+                    batch_start, batch = next_batch
+                    if len(pending) >= self.embedding_concurrency:
+                        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                        batch_results.extend(task.result() for task in done)
+                    pending.add(asyncio.create_task(self._run_chunk_batch(document_id, batch, batch_start)))
+                
+                if pending:
+                    done, pending = await asyncio.wait(pending)
+                    batch_results.extend(task.result() for task in done)
+            finally:
+                for task in pending:
+                    task.cancel()
             
             chunk_ids = []
-            
-            # Process chunks in batches to avoid rate limits
-            batch_size = 5
-            for i in range(0, len(chunks), batch_size):
-                batch = chunks[i:i + batch_size]
-                batch_results = await self._process_chunk_batch(document_id, batch, i)
-                chunk_ids.extend(batch_results)
-                
-                # Small delay between batches
-                if i + batch_size < len(chunks):
-                    await asyncio.sleep(1)
+            for _, batch_chunk_ids in sorted(batch_results, key=lambda result: result[0]):
+                chunk_ids.extend(batch_chunk_ids)
             
             logger.info(f"Generated {len(chunk_ids)} embeddings for document {document_id}")
             return chunk_ids
@@ -97,95 +125,44 @@ class EmbeddingsService:
             logger.error(f"Failed to generate embeddings for document {document_id}: {str(e)}")
             raise
     
-    async def _split_into_chunks(self, content: str, metadata: Dict[str, Any]) -> List[Dict[str, Any]]:
-        """Split content into overlapping chunks"""
-        
-        # Split by paragraphs first, then by sentences if needed
-        paragraphs = content.split('\n\n')
-        chunks = []
-        current_chunk = ""
-        current_tokens = 0
+    async def _record_filter_metadata(self, document_id: str, metadata: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Chunk metadata with access level, shelter and category taken from the knowledge_documents
+        record rather than the caller, since search pre-filters on them. Without a record they are
+        left unset, so search checks access against the record at query time.
+        """
+        # Re-read: the caller may have just created or edited the record
+        document_cache.invalidate(document_id)
+        record = await document_cache.get(document_id) or {}
+        metadata = dict(metadata or {})
+        for field in vector_index.FILTER_FIELDS:
+            metadata[field] = record.get(field)
+        return metadata
+    
+    def _batch_chunks_by_tokens(self, chunks: Iterable[Dict[str, Any]]) -> Iterator[tuple]:
+        """Group chunks lazily into (start_index, chunks) request batches that fit the token budget"""
+        batch = []
+        batch_start = 0
+        batch_tokens = 0
         
-        for paragraph in paragraphs:
-            paragraph = paragraph.strip()
-            if not paragraph:
-                continue
+        for i, chunk in enumerate(chunks):
+            chunk_tokens = chunk['token_count']
+            if batch and (batch_tokens + chunk_tokens > self.embedding_batch_max_tokens or
+                          len(batch) >= self.embedding_batch_max_inputs):
+                yield batch_start, batch
+                batch = []
+                batch_start = i
+                batch_tokens = 0
             
-            paragraph_tokens = self._count_tokens(paragraph)
-            
-            # If paragraph itself is too long, split by sentences
-            if paragraph_tokens > self.max_chunk_size:
-                sentences = self._split_by_sentences(paragraph)
-                for sentence in sentences:
-                    sentence_tokens = self._count_tokens(sentence)
-                    
-                    if current_tokens + sentence_tokens > self.max_chunk_size and current_chunk:
-                        # Save current chunk
-                        chunks.append(self._create_chunk(current_chunk, len(chunks), metadata))
-                        
-                        # Start new chunk with overlap
-                        overlap_text = self._get_overlap_text(current_chunk)
-                        current_chunk = overlap_text + " " + sentence
-                        current_tokens = self._count_tokens(current_chunk)
-                    else:
-                        current_chunk += " " + sentence if current_chunk else sentence
-                        current_tokens += sentence_tokens
-            else:
-                # Regular paragraph processing
-                if current_tokens + paragraph_tokens > self.max_chunk_size and current_chunk:
-                    # Save current chunk
-                    chunks.append(self._create_chunk(current_chunk, len(chunks), metadata))
-                    
-                    # Start new chunk with overlap
-                    overlap_text = self._get_overlap_text(current_chunk)
-                    current_chunk = overlap_text + "\n\n" + paragraph
-                    current_tokens = self._count_tokens(current_chunk)
-                else:
-                    current_chunk += "\n\n" + paragraph if current_chunk else paragraph
-                    current_tokens += paragraph_tokens
-        
-        # Add final chunk if not empty
-        if current_chunk.strip():
-            chunks.append(self._create_chunk(current_chunk, len(chunks), metadata))
+            batch.append(chunk)
+            batch_tokens += chunk_tokens
         
-        logger.info(f"Split content into {len(chunks)} chunks")
-        return chunks
-    
-    def _create_chunk(self, content: str, index: int, metadata: Dict[str, Any]) -> Dict[str, Any]:
-        """Create a chunk object with metadata"""
-        return {
-            'content': content.strip(),
-            'chunk_index': index,
-            'token_count': self._count_tokens(content),
-            'char_count': len(content),
-            'metadata': metadata
-        }
+        if batch:
+            yield batch_start, batch
     
-    def _split_by_sentences(self, text: str) -> List[str]:
-        """Split text by sentences"""
-        # Simple sentence splitting
-        import re
-        sentences = re.split(r'[.!?]+', text)
-        return [s.strip() for s in sentences if s.strip()]
-    
-    def _get_overlap_text(self, text: str, target_tokens: int = None) -> str:
-        """Get overlap text from end of chunk"""
-        if target_tokens is None:
-            target_tokens = self.chunk_overlap
-        
-        words = text.split()
-        overlap_words = []
-        overlap_tokens = 0
-        
-        # Take words from the end until we reach target tokens
-        for word in reversed(words):
-            word_tokens = self._count_tokens(word)
-            if overlap_tokens + word_tokens > target_tokens:
-                break
-            overlap_words.insert(0, word)
-            overlap_tokens += word_tokens
-        
-        return " ".join(overlap_words)
+    async def _run_chunk_batch(self, document_id: str, chunks: List[Dict[str, Any]], batch_start_index: int) -> tuple:
+        """Process one batch, returning (start_index, chunk_ids) so results can be put back in order"""
+        return batch_start_index, await self._process_chunk_batch(document_id, chunks, batch_start_index)
     
     async def _process_chunk_batch(
         self, 
@@ -197,40 +174,132 @@ class EmbeddingsService:
         
         chunk_ids = []
         
-        for i, chunk in enumerate(chunks):
+        try:
+            # One API request for the whole batch
+            embeddings = await self._embed_texts(
+                [chunk['content'] for chunk in chunks],
+                sum(chunk['token_count'] for chunk in chunks)
+            )
+        except Exception as e:
+            logger.error(f"Failed to embed chunks {batch_start_index}-{batch_start_index + len(chunks) - 1} "
+                         f"for document {document_id}: {str(e)}")
+            return chunk_ids
+        
+        # Queue every chunk on one bulk writer so the batch costs a handful of commits
+        writer = FirestoreBulkWriter(self.db)
+        stored_chunks = {}
+        chunks_collection = self.db.collection('knowledge_chunks')
+        
+        for i, (chunk, embedding_vector) in enumerate(zip(chunks, embeddings)):
+            chunk_data = {
+                'document_id': document_id,
+                'chunk_index': batch_start_index + i,
+                'content': chunk['content'],
+                'embedding': embedding_vector,
+                'token_count': chunk['token_count'],
+                'char_count': chunk['char_count'],
+                'created_at': firestore.SERVER_TIMESTAMP,
+                'metadata': chunk['metadata']
+            }
+            
+            # Allocate the id up front so failures can be reported per chunk
+            chunk_ref = chunks_collection.document()
+            writer.create(chunk_ref, chunk_data)
+            stored_chunks[chunk_ref.id] = chunk_data
+        
+        result = await writer.flush()
+        
+        for chunk_id, error in result.failed.items():
+            logger.error(f"Failed to store chunk {stored_chunks[chunk_id]['chunk_index']} "
+                         f"for document {document_id}: {error}")
+        
+        for chunk_id in sorted(result.succeeded, key=lambda cid: stored_chunks[cid]['chunk_index']):
+            chunk_ids.append(chunk_id)
+            logger.debug(f"Generated embedding for chunk {chunk_id}")
+        
+        # Keep the resident search index in sync
+        vector_index.add_chunks([
+            {'chunk_id': chunk_id, **{k: v for k, v in stored_chunks[chunk_id].items() if k != 'created_at'}}
+            for chunk_id in chunk_ids
+        ])
+        
+        return chunk_ids
+    
+    async def _embed_texts(self, texts: List[str], estimated_tokens: int) -> List[List[float]]:
+        """Embed many texts in one request, backing off according to rate-limit headers"""
+        
+        for attempt in range(self.embedding_max_retries):
+            # Honour any pause another request learned from the rate-limit headers
+            wait_seconds = self._rate_limit_until - time.time()
+            if wait_seconds > 0:
+                await asyncio.sleep(wait_seconds)
+            
             try:
-                # Generate embedding
-                embedding_response = await openai_service.client.embeddings.create(
-                    model=self.embedding_model,
-                    input=chunk['content']
-                )
-                
-                embedding_vector = embedding_response.data[0].embedding
-                
-                # Store chunk in Firestore
-                chunk_data = {
-                    'document_id': document_id,
-                    'chunk_index': batch_start_index + i,
-                    'content': chunk['content'],
-                    'embedding': embedding_vector,
-                    'token_count': chunk['token_count'],
-                    'char_count': chunk['char_count'],
-                    'created_at': firestore.SERVER_TIMESTAMP,
-                    'metadata': chunk['metadata']
-                }
-                
-                # Add to Firestore
-                chunk_ref = self.db.collection('knowledge_chunks').add(chunk_data)
-                chunk_id = chunk_ref[1].id
-                chunk_ids.append(chunk_id)
-                
-                logger.debug(f"Generated embedding for chunk {chunk_id}")
-                
-            except Exception as e:
-                logger.error(f"Failed to process chunk {i} for document {document_id}: {str(e)}")
+                # Ingestion is bulk traffic, so chat requests are scheduled ahead of it
+                async with openai_service.scheduler.slot(estimated_tokens, Priority.BULK):
+                    raw_response = await openai_service.client.embeddings.with_raw_response.create(
+                        model=self.embedding_model,
+                        input=texts
+                    )
+            except openai.RateLimitError as e:
+                headers = e.response.headers if getattr(e, 'response', None) is not None else {}
+                delay = self._retry_delay_from_headers(headers, attempt)
+                logger.warning(f"Embedding rate limit hit, backing off {delay:.2f}s (attempt {attempt + 1})")
+                self._rate_limit_until = max(self._rate_limit_until, time.time() + delay)
                 continue
+            
+            self._update_rate_limit_from_headers(raw_response.headers)
+            response = raw_response.parse()
+            return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
         
-        return chunk_ids
+        raise Exception(f"Embedding request still rate limited after {self.embedding_max_retries} attempts")
+    
+    def _update_rate_limit_from_headers(self, headers) -> None:
+        """Pause further requests when the remaining request or token quota runs low"""
+        try:
+            remaining_requests = headers.get('x-ratelimit-remaining-requests')
+            remaining_tokens = headers.get('x-ratelimit-remaining-tokens')
+            
+            delay = 0.0
+            if remaining_requests is not None and int(remaining_requests) <= 0:
+                delay = max(delay, self._parse_reset_duration(headers.get('x-ratelimit-reset-requests')))
+            if remaining_tokens is not None and int(remaining_tokens) < self.embedding_batch_max_tokens:
+                delay = max(delay, self._parse_reset_duration(headers.get('x-ratelimit-reset-tokens')))
+            
+            if delay > 0:
+                self._rate_limit_until = max(self._rate_limit_until, time.time() + delay)
+        except (TypeError, ValueError):
+            pass
+    
+    def _retry_delay_from_headers(self, headers, attempt: int) -> float:
+        """Work out how long to wait after a 429 response"""
+        try:
+            if headers.get('retry-after-ms'):
+                return float(headers['retry-after-ms']) / 1000
+            if headers.get('retry-after'):
+                return float(headers['retry-after'])
+            reset = max(
+                self._parse_reset_duration(headers.get('x-ratelimit-reset-requests')),
+                self._parse_reset_duration(headers.get('x-ratelimit-reset-tokens'))
+            )
+            if reset > 0:
+                return reset
+        except (TypeError, ValueError):
+            pass
+        
+        # Exponential fallback when the headers carry no hint
+        return min(2 ** attempt, 30)
+    
+    def _parse_reset_duration(self, value: Optional[str]) -> float:
+        """Parse OpenAI reset durations such as '20ms', '1.5s' or '6m0s' into seconds"""
+        if not value:
+            return 0.0
+        
+        units = {'h': 3600, 'm': 60, 's': 1, 'ms': 0.001}
+        parts = re.findall(r'(\d+(?:\.\d+)?)(ms|h|m|s)', value)
+        if not parts:
+            return float(value)
+        return sum(float(amount) * units[unit] for amount, unit in parts)
     
     async def semantic_search(
         self, 
@@ -250,56 +319,41 @@ class EmbeddingsService:
             # Generate query embedding
             query_embedding = await self._generate_query_embedding(query)
             
-            # Build Firestore query with filters
-            chunks_query = self.db.collection('knowledge_chunks')
+            # Make sure the resident index reflects the knowledge_chunks collection
+            await vector_index.ensure_loaded()
             
-            # Apply category filter if specified
-            if categories:
-                # We'll filter in memory since Firestore doesn't support array_contains_any with embeddings
-                pass
+            # Finish every await before building the mask, so it is scored against the rows it was built from
+            legacy_documents = await self._resolve_legacy_documents(user_role, categories, shelter_id)
             
-            # Get all chunks (in production, consider pagination)
-            chunks = chunks_query.limit(500).stream()  # Limit for performance
+            # Restrict scoring to the chunks this caller may see
+            index_version = vector_index.version
+            search_mask = self._build_search_mask(user_role, categories, shelter_id, legacy_documents)
+            if not search_mask.any():
+                return []
             
-            # Calculate similarities
-            similarities = []
-            for chunk_doc in chunks:
-                chunk_data = chunk_doc.to_dict()
-                
-                # Get document metadata for access control
-                document_id = chunk_data['document_id']
-                
-                # Check access permissions
-                if not await self._check_access_permission(document_id, user_role, shelter_id):
-                    continue
-                
-                # Apply category filter
-                if categories:
-                    doc_category = await self._get_document_category(document_id)
-                    if doc_category not in categories:
-                        continue
-                
-                # Calculate cosine similarity
-                similarity = self._cosine_similarity(
-                    query_embedding, 
-                    chunk_data['embedding']
-                )
-                
-                if similarity >= similarity_threshold:
-                    similarities.append({
-                        'chunk_id': chunk_doc.id,
-                        'document_id': document_id,
-                        'content': chunk_data['content'],
-                        'similarity': similarity,
-                        'chunk_index': chunk_data.get('chunk_index', 0),
-                        'metadata': chunk_data.get('metadata', {})
-                    })
-            
-            # Sort by similarity and return top results
-            similarities.sort(key=lambda x: x['similarity'], reverse=True)
+            # Score the allowed corpus with one matrix-vector product
+            matches = vector_index.search(
+                query_embedding,
+                limit=limit,
+                similarity_threshold=similarity_threshold,
+                mask=search_mask,
+                version=index_version
+            )
+            
+            similarities = [
+                {
+                    'chunk_id': chunk['chunk_id'],
+                    'document_id': chunk['document_id'],
+                    'content': chunk['content'],
+                    'similarity': similarity,
+                    'chunk_index': chunk.get('chunk_index', 0),
+                    'metadata': chunk.get('metadata', {})
+                }
+                for chunk, similarity in matches
+            ]
             
             # Enrich with document metadata
-            enriched_results = await self._enrich_search_results(similarities[:limit])
+            enriched_results = await self._enrich_search_results(similarities)
             
             logger.info(f"Semantic search for '{query}' returned {len(enriched_results)} results")
             return enriched_results
@@ -308,14 +362,91 @@ class EmbeddingsService:
             logger.error(f"Semantic search failed: {str(e)}")
             return []
     
-    async def _generate_query_embedding(self, query: str) -> List[float]:
-        """Generate embedding for search query"""
-        try:
-            response = await openai_service.client.embeddings.create(
-                model=self.embedding_model,
-                input=query
+    def _unresolved_rows(self, categories: Optional[List[str]]):
+        """Rows stored before chunk metadata carried the filter fields; they are resolved per document"""
+        unresolved = vector_index.bitmap('access_level', [None])
+        if categories:
+            unresolved = unresolved | vector_index.bitmap('category', [None])
+        return unresolved
+    
+    async def _resolve_legacy_documents(
+        self,
+        user_role: str,
+        categories: Optional[List[str]],
+        shelter_id: Optional[str]
+    ) -> Set[str]:
+        """Legacy documents (see _unresolved_rows) this caller may search"""
+        unresolved = self._unresolved_rows(categories)
+        if not unresolved.any():
+            return set()
+        
+        legacy_documents = vector_index.document_ids(unresolved)
+        await document_cache.get_many(legacy_documents)
+        
+        allowed_documents = set()
+        for document_id in legacy_documents:
+            if not await self._check_access_permission(document_id, user_role, shelter_id):
+                continue
+            if categories:
+                doc_category = await self._get_document_category(document_id)
+                if doc_category not in categories:
+                    continue
+            allowed_documents.add(document_id)
+        return allowed_documents
+    
+    def _build_search_mask(
+        self,
+        user_role: str,
+        categories: Optional[List[str]],
+        shelter_id: Optional[str],
+        legacy_documents: Set[str]
+    ):
+        """
+        Pre-filter index rows by access level, shelter and category from chunk metadata
+
+        Synchronous on purpose: the mask must describe the current rows until it is scored.
+        Legacy rows are only kept for documents in legacy_documents, so documents that
+        appeared after they were resolved stay hidden.
+        """
+        is_admin = user_role in ['admin', 'super_admin']
+        
+        # Mirrors _check_access_permission, evaluated over the whole index at once
+        access_mask = vector_index.bitmap('access_level', ['public'])
+        if is_admin:
+            access_mask = access_mask | vector_index.bitmap('access_level', ['internal'])
+            access_mask = access_mask | (
+                vector_index.bitmap('access_level', ['shelter-specific']) &
+                vector_index.bitmap('shelter_id', [shelter_id])
             )
+        if categories:
+            access_mask = access_mask & vector_index.bitmap('category', categories)
+        
+        unresolved = self._unresolved_rows(categories)
+        mask = access_mask & ~unresolved
+        if legacy_documents:
+            mask = mask | (unresolved & vector_index.document_mask(legacy_documents))
+        
+        return mask
+    
+    async def embed_query(self, query: str) -> List[float]:
+        """Embedding for a user query, shared with semantic search through the query embedding cache"""
+        return await self._generate_query_embedding(query)
+    
+    async def _generate_query_embedding(self, query: str) -> List[float]:
+        """Generate embedding for search query, reusing cached embeddings for repeated queries"""
+        
+        async def create_embedding() -> List[float]:
+            # Query embeddings sit on the chat path
+            async with openai_service.scheduler.slot(tokenizer.count(query), Priority.CHAT) as grant:
+                response = await openai_service.client.embeddings.create(
+                    model=self.embedding_model,
+                    input=query
+                )
+                grant.actual_tokens = response.usage.total_tokens if response.usage else None
             return response.data[0].embedding
+        
+        try:
+            return await query_embedding_cache.get_or_compute(query, self.embedding_model, create_embedding)
         except Exception as e:
             logger.error(f"Query embedding generation failed: {str(e)}")
             raise
@@ -347,14 +478,12 @@ class EmbeddingsService:
         """Check if user has access to document"""
         try:
             # Get document metadata
-            doc_ref = self.db.collection('knowledge_documents').document(document_id)
-            doc_data = doc_ref.get()
+            doc_dict = await document_cache.get(document_id)
             
-            if not doc_data.exists:
+            if doc_dict is None:
                 return False
             
-            doc_dict = doc_data.to_dict()
-            access_level = doc_dict.get('access_level', 'public')
+            access_level = doc_dict.get('access_level') or 'public'
             
             # Access control logic
             if access_level == 'public':
@@ -374,11 +503,10 @@ class EmbeddingsService:
     async def _get_document_category(self, document_id: str) -> str:
         """Get document category"""
         try:
-            doc_ref = self.db.collection('knowledge_documents').document(document_id)
-            doc_data = doc_ref.get()
+            doc_dict = await document_cache.get(document_id)
             
-            if doc_data.exists:
-                return doc_data.to_dict().get('category', 'general')
+            if doc_dict is not None:
+                return doc_dict.get('category') or 'general'
             return 'general'
         except Exception:
             return 'general'
@@ -387,56 +515,42 @@ class EmbeddingsService:
         """Enrich search results with document metadata"""
         enriched = []
         
+        try:
+            documents = await document_cache.get_many(result['document_id'] for result in results)
+        except Exception as e:
+            logger.error(f"Failed to enrich results: {str(e)}")
+            return results
+        
         for result in results:
-            try:
-                # Get document details
-                doc_ref = self.db.collection('knowledge_documents').document(result['document_id'])
-                doc_data = doc_ref.get()
-                
-                if doc_data.exists:
-                    doc_dict = doc_data.to_dict()
-                    enriched.append({
-                        **result,
-                        'document_title': doc_dict.get('title', 'Untitled'),
-                        'document_category': doc_dict.get('category', 'general'),
-                        'document_summary': doc_dict.get('summary', ''),
-                        'document_path': doc_dict.get('file_path', ''),
-                        'access_level': doc_dict.get('access_level', 'public')
-                    })
-                else:
-                    enriched.append(result)
-                    
-            except Exception as e:
-                logger.error(f"Failed to enrich result: {str(e)}")
-                enriched.append(result)
+            doc_dict = documents.get(result['document_id'])
+            
+            # Skip chunks whose document was deleted by another worker since the index loaded
+            if doc_dict is None:
+                continue
+            
+            enriched.append({
+                **result,
+                'document_title': doc_dict.get('title') or 'Untitled',
+                'document_category': doc_dict.get('category') or 'general',
+                'document_summary': doc_dict.get('summary') or '',
+                'document_path': doc_dict.get('file_path') or '',
+                'access_level': doc_dict.get('access_level') or 'public'
+            })
         
         return enriched
     
-    def _count_tokens(self, text: str) -> int:
-        """Count tokens in text"""
-        try:
-            return len(self.encoding.encode(text))
-        except Exception:
-            # Fallback to word count
-            return len(text.split())
-    
     async def get_embedding_stats(self) -> Dict[str, Any]:
         """Get statistics about stored embeddings"""
         try:
-            # Count documents
-            docs_ref = self.db.collection('knowledge_documents')
-            docs_count = len(list(docs_ref.stream()))
-            
-            # Count chunks
-            chunks_ref = self.db.collection('knowledge_chunks')
-            chunks_count = len(list(chunks_ref.stream()))
+            # Count chunks server side (no embedding vectors are downloaded)
+            chunks_count = await firestore_aggregates.count(self.db.collection('knowledge_chunks'))
             
-            # Category breakdown
+            # Category breakdown in one pass over the category field, which also counts the documents
             categories = {}
-            for doc in docs_ref.stream():
-                doc_data = doc.to_dict()
-                category = doc_data.get('category', 'general')
+            for doc in self.db.collection('knowledge_documents').select(['category']).stream():
+                category = doc.to_dict().get('category', 'general')
                 categories[category] = categories.get(category, 0) + 1
+            docs_count = sum(categories.values())
             
             return {
                 'total_documents': docs_count,
@@ -444,6 +558,7 @@ class EmbeddingsService:
                 'average_chunks_per_doc': chunks_count / docs_count if docs_count > 0 else 0,
                 'categories': categories,
                 'embedding_model': self.embedding_model,
+                'query_embedding_cache': query_embedding_cache.get_stats(),
                 'last_updated': datetime.now().isoformat()
             }
             
@@ -0,0 +1,135 @@
+"""
+SHELTR-AI FAQ Index
+Character n-gram TF-IDF inverted index used to shortlist FAQ questions before fuzzy rescoring
+"""
+
+import re
+import math
+import difflib
+import logging
+from collections import Counter, defaultdict
+from typing import Dict, List, Any, Optional, Iterable, Tuple
+
+logger = logging.getLogger(__name__)
+
+class FAQIndexEntry:
+    """One question variant of an FAQ with its precomputed forms"""
+    __slots__ = ('seq', 'faq_id', 'question', 'grams', 'matcher', 'norm')
+
+    def __init__(self, seq: int, faq_id: str, question: str, grams: Counter):
+        self.seq = seq
+        self.faq_id = faq_id
+        self.question = question
+        self.grams = grams
+        # SequenceMatcher caches its analysis of the second sequence, so keep one per question
+        self.matcher = difflib.SequenceMatcher(None, '', question)
+        self.norm = 0.0
+
+class FAQIndex:
+    """Inverted index over FAQ question variants, updated incrementally as FAQs change"""
+
+    def __init__(self, ngram_size: int = 3, candidate_limit: int = 8):
+        self.ngram_size = ngram_size
+        self.candidate_limit = candidate_limit
+
+        self._entries: Dict[int, FAQIndexEntry] = {}
+        self._entries_by_faq: Dict[str, List[int]] = defaultdict(list)
+        self._postings: Dict[str, Dict[int, int]] = defaultdict(dict)  # gram -> {entry seq: term frequency}
+        self._next_seq = 0
+        self._norms_stale = False
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Lower-case, drop punctuation and collapse whitespace for n-gram extraction"""
+        return re.sub(r'\s+', ' ', re.sub(r'[^\w\s]', ' ', text.lower())).strip()
+
+    def ngrams(self, text: str) -> Counter:
+        """Padded character n-grams of the normalized text"""
+        padded = f" {self.normalize(text)} "
+        n = self.ngram_size
+        if len(padded) < n:
+            return Counter([padded])
+        return Counter(padded[i:i + n] for i in range(len(padded) - n + 1))
+
+    def upsert(self, faq_id: str, questions: Iterable[str]):
+        """Index (or re-index) every question variant of one FAQ"""
+        self.remove(faq_id)
+        for question in questions:
+            entry = FAQIndexEntry(self._next_seq, faq_id, question.lower(), self.ngrams(question))
+            self._next_seq += 1
+            self._entries[entry.seq] = entry
+            self._entries_by_faq[faq_id].append(entry.seq)
+            for gram, tf in entry.grams.items():
+                self._postings[gram][entry.seq] = tf
+        # Document frequencies moved, so entry norms are recomputed on the next search
+        self._norms_stale = True
+
+    def remove(self, faq_id: str):
+        """Drop every question variant of one FAQ"""
+        for seq in self._entries_by_faq.pop(faq_id, []):
+            entry = self._entries.pop(seq)
+            for gram in entry.grams:
+                postings = self._postings.get(gram)
+                if postings is not None:
+                    postings.pop(seq, None)
+                    if not postings:
+                        del self._postings[gram]
+            self._norms_stale = True
+
+    def candidates(self, message: str) -> List[FAQIndexEntry]:
+        """Top question variants by TF-IDF cosine similarity to the message"""
+        if not self._entries:
+            return []
+        if self._norms_stale:
+            self._refresh_norms()
+
+        scores: Dict[int, float] = defaultdict(float)
+        for gram, query_tf in self.ngrams(message).items():
+            postings = self._postings.get(gram)
+            if not postings:
+                continue
+            idf = self._idf(len(postings))
+            query_weight = query_tf * idf
+            for seq, tf in postings.items():
+                scores[seq] += query_weight * tf * idf
+
+        ranked = sorted(
+            scores.items(),
+            key=lambda item: item[1] / self._entries[item[0]].norm,
+            reverse=True
+        )[:self.candidate_limit]
+        return [self._entries[seq] for seq, _ in ranked]
+
+    def best_match(self, message: str, threshold: int) -> Optional[Tuple[str, int]]:
+        """Rescore the shortlisted variants with difflib and return (faq_id, score) of the best one"""
+        message_lower = message.lower().strip()
+        best: Optional[Tuple[str, int]] = None
+        best_score = 0
+
+        # Walk candidates in insertion order so ties resolve the way a full scan would
+        for entry in sorted(self.candidates(message), key=lambda e: e.seq):
+            matcher = entry.matcher
+            matcher.set_seq1(message_lower)
+            # quick_ratio is an upper bound on ratio, so it can rule a candidate out cheaply
+            if int(matcher.quick_ratio() * 100) <= best_score:
+                continue
+            score = int(matcher.ratio() * 100)
+            if score > best_score and score >= threshold:
+                best_score = score
+                best = (entry.faq_id, score)
+
+        return best
+
+    def _idf(self, document_frequency: int) -> float:
+        """Smoothed inverse document frequency"""
+        return math.log((len(self._entries) + 1) / (document_frequency + 1)) + 1.0
+
+    def _refresh_norms(self):
+        """Recompute each entry's TF-IDF vector length"""
+        idf = {gram: self._idf(len(postings)) for gram, postings in self._postings.items()}
+        for entry in self._entries.values():
+            entry.norm = math.sqrt(sum((tf * idf[gram]) ** 2 for gram, tf in entry.grams.items())) or 1.0
+        self._norms_stale = False
@@ -7,7 +7,8 @@ import logging
 from typing import Dict, List, Optional, Any
 from datetime import datetime
 import re
-import difflib
+
+from services.faq_index import FAQIndex
 
 logger = logging.getLogger(__name__)
 
@@ -19,6 +20,17 @@ class FAQService:
         self.confidence_threshold = 70  # Minimum similarity score for FAQ match
         self.role_specific_faqs = self._initialize_role_specific_faqs()
         
+        # Inverted indexes over question variants so lookups only fuzzy-match a shortlist
+        self.faq_index = FAQIndex()
+        for faq_id, faq_data in self.faq_database.items():
+            self.faq_index.upsert(faq_id, faq_data["questions"])
+        self.role_faq_indexes: Dict[str, FAQIndex] = {}
+        for role, role_faqs in self.role_specific_faqs.items():
+            role_index = FAQIndex()
+            for faq_id, faq_data in role_faqs.items():
+                role_index.upsert(faq_id, faq_data["questions"])
+            self.role_faq_indexes[role] = role_index
+        
     def _initialize_faq_database(self) -> Dict[str, Dict[str, Any]]:
         """Initialize the FAQ database with common questions and answers"""
         
@@ -374,27 +386,19 @@ class FAQService:
         if user_role not in self.role_specific_faqs:
             return None
             
-        role_faqs = self.role_specific_faqs[user_role]
-        user_message_lower = user_message.lower().strip()
-        best_match = None
-        best_score = 0
-        
-        for faq_id, faq_data in role_faqs.items():
-            for question in faq_data["questions"]:
-                similarity = difflib.SequenceMatcher(None, user_message_lower, question.lower()).ratio()
-                score = int(similarity * 100)
-                
-                if score > best_score and score >= self.confidence_threshold:
-                    best_score = score
-                    best_match = {
-                        "id": f"{user_role}_{faq_id}",
-                        "confidence": score,
-                        "answer": faq_data["answer"],
-                        "category": f"{user_role}_support",
-                        "actions": faq_data.get("actions", [])
-                    }
+        match = self.role_faq_indexes[user_role].best_match(user_message, self.confidence_threshold)
+        if not match:
+            return None
         
-        return best_match
+        faq_id, score = match
+        faq_data = self.role_specific_faqs[user_role][faq_id]
+        return {
+            "id": f"{user_role}_{faq_id}",
+            "confidence": score,
+            "answer": faq_data["answer"],
+            "category": f"{user_role}_support",
+            "actions": faq_data.get("actions", [])
+        }
         
     async def find_faq_match(self, user_message: str, user_role: str = "public") -> Optional[Dict[str, Any]]:
         """Find the best FAQ match for a user message, checking role-specific FAQs first"""
@@ -405,32 +409,25 @@ class FAQService:
             if role_match:
                 return role_match
         
-        # Fall back to general FAQ database
-        user_message_lower = user_message.lower().strip()
-        best_match = None
-        best_score = 0
+        # Fall back to general FAQ database, fuzzy-matching only the indexed shortlist
+        match = self.faq_index.best_match(user_message, self.confidence_threshold)
+        if not match:
+            return None
         
-        for faq_id, faq_data in self.faq_database.items():
-            for question in faq_data["questions"]:
-                # Use built-in difflib for similarity matching
-                similarity = difflib.SequenceMatcher(None, user_message_lower, question.lower()).ratio()
-                score = int(similarity * 100)  # Convert to percentage
-                
-                if score > best_score and score >= self.confidence_threshold:
-                    best_score = score
-                    best_match = {
-                        "id": faq_id,
-                        "confidence": score,
-                        "answer": faq_data["answer"],
-                        "category": faq_data["category"],
-                        "agent_suggestion": faq_data["agent_suggestion"],
-                        "actions": faq_data.get("actions", []),
-                        "role_detection": faq_data.get("role_detection"),
-                        "priority": faq_data.get("priority", "normal")
-                    }
+        faq_id, score = match
+        faq_data = self.faq_database[faq_id]
+        best_match = {
+            "id": faq_id,
+            "confidence": score,
+            "answer": faq_data["answer"],
+            "category": faq_data["category"],
+            "agent_suggestion": faq_data["agent_suggestion"],
+            "actions": faq_data.get("actions", []),
+            "role_detection": faq_data.get("role_detection"),
+            "priority": faq_data.get("priority", "normal")
+        }
         
-        if best_match:
-            logger.info(f"FAQ match found: {best_match['id']} (confidence: {best_match['confidence']})")
+        logger.info(f"FAQ match found: {best_match['id']} (confidence: {best_match['confidence']})")
             
         return best_match
     
@@ -454,6 +451,7 @@ class FAQService:
         
         try:
             self.faq_database[faq_id] = faq_data
+            self.faq_index.upsert(faq_id, faq_data["questions"])
             logger.info(f"Added new FAQ: {faq_id}")
             return True
         except Exception as e:
@@ -466,6 +464,8 @@ class FAQService:
         try:
             if faq_id in self.faq_database:
                 self.faq_database[faq_id].update(faq_data)
+                if "questions" in faq_data:
+                    self.faq_index.upsert(faq_id, faq_data["questions"])
                 logger.info(f"Updated FAQ: {faq_id}")
                 return True
             else:
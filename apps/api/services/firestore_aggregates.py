@@ -0,0 +1,91 @@
+"""
+SHELTR-AI Firestore Aggregates
+Count and sum helpers built on Firestore aggregation queries, so stats never download the documents they count
+"""
+
+import os
+import asyncio
+import logging
+from typing import Dict, Any, Set
+
+logger = logging.getLogger(__name__)
+
+class FirestoreAggregates:
+    """
+    Runs COUNT/SUM aggregation queries server side (one read per 1000 index entries)
+
+    When aggregations are unavailable (an older client library, or an emulator that rejects them),
+    it falls back to streaming key-only (or single-field) projections of the matching documents.
+    """
+
+    def __init__(self):
+        self.enabled = os.getenv("FIRESTORE_AGGREGATION_QUERIES", "true").lower() == "true"
+        self._unsupported: Set[str] = set()
+
+        # Counters
+        self.aggregations = 0
+        self.fallbacks = 0
+
+    async def count(self, query) -> int:
+        """Number of documents matching a query or collection reference"""
+        return await asyncio.to_thread(self.count_blocking, query)
+
+    async def sum(self, query, field: str) -> float:
+        """Sum of a numeric field over the documents matching a query (non-numeric values are ignored)"""
+        return await asyncio.to_thread(self.sum_blocking, query, field)
+
+    def count_blocking(self, query) -> int:
+        """count() for synchronous callers such as scripts"""
+        value = self._aggregate('count', lambda: query.count(alias='value'))
+        if value is not None:
+            return int(value)
+
+        self.fallbacks += 1
+        # An empty projection returns document keys only, no field data
+        return sum(1 for _ in query.select([]).stream())
+
+    def sum_blocking(self, query, field: str) -> float:
+        """sum() for synchronous callers such as scripts"""
+        value = self._aggregate('sum', lambda: query.sum(field, alias='value'))
+        if value is not None:
+            return value
+
+        self.fallbacks += 1
+        total = 0
+        for snapshot in query.select([field]).stream():
+            try:
+                value = snapshot.get(field)
+            except KeyError:
+                continue
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                total += value
+        return total
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'enabled': self.enabled,
+            'unsupported': sorted(self._unsupported),
+            'aggregations': self.aggregations,
+            'fallbacks': self.fallbacks
+        }
+
+    def _aggregate(self, kind: str, build):
+        """Value of a single-result aggregation query, or None if the fallback should be used"""
+        if not self.enabled or kind in self._unsupported:
+            return None
+        try:
+            results = build().get()
+            self.aggregations += 1
+            return results[0][0].value
+        except AttributeError:
+            # Client library predates this aggregation; stop trying
+            self._unsupported.add(kind)
+            logger.warning(f"Firestore {kind} aggregation not available in this client, streaming instead")
+        except Exception as e:
+            if type(e).__name__ in ('Unimplemented', 'MethodNotImplemented', 'NotImplementedError'):
+                self._unsupported.add(kind)
+            logger.warning(f"Firestore {kind} aggregation failed, streaming instead: {str(e)}")
+        return None
+
+# Create singleton instance
+firestore_aggregates = FirestoreAggregates()
@@ -0,0 +1,68 @@
+"""
+SHELTR-AI HyperLogLog
+Fixed-size distinct-count sketches, so "how many different users" never grows with the number of users
+"""
+
+import math
+import hashlib
+from typing import Iterable, Optional
+
+class HyperLogLog:
+    """
+    2^precision one-byte registers (4 KiB at the default precision of 12, about 1.6% standard error)
+
+    Sketches of the same precision merge by taking the register-wise maximum, so the sketch of
+    a union is exact to compute from the sketches of its parts and merging is idempotent.
+    """
+
+    def __init__(self, precision: int = 12, registers: Optional[bytes] = None):
+        self.precision = precision
+        self.size = 1 << precision
+        if registers is not None and len(registers) != self.size:
+            raise ValueError(f"Expected {self.size} registers, got {len(registers)}")
+        self.registers = bytearray(registers) if registers is not None else bytearray(self.size)
+
+    @classmethod
+    def union(cls, sketches: Iterable["HyperLogLog"], precision: int = 12) -> "HyperLogLog":
+        merged = cls(precision)
+        for sketch in sketches:
+            merged.merge(sketch)
+        return merged
+
+    def add(self, value: str) -> bool:
+        """Add a value; True if a register changed (the sketch needs saving)"""
+        hashed = int.from_bytes(hashlib.blake2b(str(value).encode('utf-8'), digest_size=8).digest(), 'big')
+        index = hashed >> (64 - self.precision)
+        remaining = 64 - self.precision
+        rest = hashed & ((1 << remaining) - 1)
+        # Position of the first 1-bit in the remaining bits
+        rank = remaining - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+            return True
+        return False
+
+    def merge(self, other: "HyperLogLog") -> bool:
+        """Fold another sketch into this one; True if a register changed"""
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge sketches of different precision")
+        changed = False
+        for index, rank in enumerate(other.registers):
+            if rank > self.registers[index]:
+                self.registers[index] = rank
+                changed = True
+        return changed
+
+    def count(self) -> int:
+        """Estimated number of distinct values added"""
+        m = self.size
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -rank for rank in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # Small-range correction (linear counting)
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def to_bytes(self) -> bytes:
+        return bytes(self.registers)
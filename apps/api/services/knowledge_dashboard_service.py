@@ -10,6 +10,11 @@ from typing import List, Dict, Optional, Any
 from firebase_admin import firestore, storage
 import logging
 
+from services.vector_index import vector_index
+from services.document_cache import document_cache
+from services.semantic_cache import semantic_response_cache
+from services.firestore_aggregates import firestore_aggregates
+
 logger = logging.getLogger(__name__)
 
 class KnowledgeDashboardService:
@@ -105,9 +110,9 @@ class KnowledgeDashboardService:
                     
                     # Check if embeddings exist
                     chunks_query = self.db.collection('knowledge_chunks').where('document_id', '==', doc['id'])
-                    chunks = list(chunks_query.stream())
-                    if chunks:
-                        doc['chunk_count'] = len(chunks)
+                    chunk_count = await firestore_aggregates.count(chunks_query)
+                    if chunk_count:
+                        doc['chunk_count'] = chunk_count
                         doc['embedding_status'] = 'completed'
                     
                     documents.append(doc)
@@ -248,6 +253,16 @@ class KnowledgeDashboardService:
                 **updates,
                 'updated_at': firestore.SERVER_TIMESTAMP
             })
+            document_cache.invalidate(document_id)
+            
+            # Search pre-filters on copies of these fields in chunk metadata, so keep the copies current
+            chunk_fields = {field: updates[field] for field in vector_index.FILTER_FIELDS if field in updates}
+            if chunk_fields:
+                self._update_chunk_metadata(document_id, chunk_fields)
+                vector_index.update_document_metadata(document_id, chunk_fields)
+            
+            # Title or access changes alter what cached answers may cite
+            semantic_response_cache.invalidate(f"document {document_id} updated")
             
             # Update in Firebase Storage if content changed
             if 'content' in updates:
@@ -264,6 +279,23 @@ class KnowledgeDashboardService:
             logger.error(f"Failed to update knowledge document: {str(e)}")
             return False
     
+    def _update_chunk_metadata(self, document_id: str, fields: Dict[str, Any]):
+        """Copy edited document fields into the metadata of every stored chunk of the document"""
+        chunk_updates = {f"metadata.{field}": value for field, value in fields.items()}
+        chunks_query = self.db.collection('knowledge_chunks').where('document_id', '==', document_id)
+        
+        batch = self.db.batch()
+        pending = 0
+        for chunk in chunks_query.select([]).stream():
+            batch.update(chunk.reference, chunk_updates)
+            pending += 1
+            if pending == 500:
+                batch.commit()
+                batch = self.db.batch()
+                pending = 0
+        if pending:
+            batch.commit()
+    
     async def delete_knowledge_document(self, document_id: str) -> bool:
         """Delete a knowledge document"""
         try:
@@ -283,9 +315,11 @@ class KnowledgeDashboardService:
                 chunks = list(chunks_query.stream())
                 for chunk in chunks:
                     chunk.reference.delete()
+                vector_index.remove_document(document_id)
                 
                 # Delete from Firestore
                 doc.reference.delete()
+                document_cache.invalidate(document_id)
             
             logger.info(f"Deleted knowledge document: {document_id}")
             return True
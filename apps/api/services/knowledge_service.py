@@ -10,6 +10,7 @@ from typing import Dict, List, Any, Optional, Union
 from datetime import datetime
 from pathlib import Path
 import tempfile
+import asyncio
 
 # Firebase imports
 from firebase_admin import firestore, storage
@@ -18,6 +19,9 @@ from fastapi import UploadFile
 # SHELTR services
 from services.document_processor import document_processor
 from services.embeddings_service import embeddings_service
+from services.vector_index import vector_index
+from services.document_cache import document_cache
+from services.firestore_aggregates import firestore_aggregates
 
 logger = logging.getLogger(__name__)
 
@@ -69,14 +73,15 @@ class KnowledgeService:
         """Complete document ingestion pipeline"""
         
         document_id = None
+        processing_result = None
         try:
             logger.info(f"Starting ingestion of {file_path}")
             
             # 1. Validate inputs
             await self._validate_ingestion_params(file_path, access_level, shelter_id)
             
-            # 2. Process document content
-            processing_result = await self.document_processor.process_document(file_path)
+            # 2. Extract and profile document content once; the extracted text is streamed into embeddings below
+            processing_result = await self.document_processor.process_document(file_path, include_content=False)
             
             # 3. Upload to Firebase Storage
             storage_path = await self._upload_to_storage(file_path, access_level, shelter_id)
@@ -119,7 +124,7 @@ class KnowledgeService:
             # 5. Generate embeddings
             chunk_ids = await self.embeddings_service.process_document_embeddings(
                 document_id=document_id,
-                content=processing_result['content'],
+                content=self.document_processor.iter_text(processing_result['text_path']),
                 metadata={
                     'document_id': document_id,
                     'title': document_data['title'],
@@ -157,6 +162,8 @@ class KnowledgeService:
                 'chunks_created': 0,
                 'embeddings_generated': 0
             }
+        finally:
+            self.document_processor.discard_text(processing_result)
     
     async def ingest_from_upload(
         self,
@@ -436,6 +443,10 @@ class KnowledgeService:
             # Delete document
             self.db.collection('knowledge_documents').document(document_id).delete()
             
+            # Drop the chunks from the resident search index and cached metadata
+            vector_index.remove_document(document_id)
+            document_cache.invalidate(document_id)
+            
             logger.info(f"Deleted document {document_id} and associated chunks")
             return True
             
@@ -449,19 +460,24 @@ class KnowledgeService:
             # Get embedding stats
             embedding_stats = await self.embeddings_service.get_embedding_stats()
             
-            # Get additional stats
+            # Get additional stats from aggregation queries
             docs_ref = self.db.collection('knowledge_documents')
             
-            # Access level breakdown
-            access_levels = {'public': 0, 'internal': 0, 'shelter-specific': 0}
-            total_size = 0
-            
-            for doc in docs_ref.stream():
-                doc_data = doc.to_dict()
-                access_level = doc_data.get('access_level', 'public')
-                if access_level in access_levels:
-                    access_levels[access_level] += 1
-                total_size += doc_data.get('file_size', 0)
+            # Access level breakdown; documents without an access level default to public, unrecognized levels are not counted
+            public, internal, shelter_specific, with_level, total_documents, total_size = await asyncio.gather(
+                firestore_aggregates.count(docs_ref.where('access_level', '==', 'public')),
+                firestore_aggregates.count(docs_ref.where('access_level', '==', 'internal')),
+                firestore_aggregates.count(docs_ref.where('access_level', '==', 'shelter-specific')),
+                # Every string sorts at or after '', so this counts the documents that have an access level
+                firestore_aggregates.count(docs_ref.where('access_level', '>=', '')),
+                firestore_aggregates.count(docs_ref),
+                firestore_aggregates.sum(docs_ref, 'file_size')
+            )
+            access_levels = {
+                'public': public + max(total_documents - with_level, 0),
+                'internal': internal,
+                'shelter-specific': shelter_specific
+            }
             
             return {
                 **embedding_stats,
@@ -535,6 +551,9 @@ class KnowledgeService:
             chunks_query = self.db.collection('knowledge_chunks').where('document_id', '==', document_id)
             for chunk in chunks_query.stream():
                 chunk.reference.delete()
+            
+            vector_index.remove_document(document_id)
+            document_cache.invalidate(document_id)
                 
         except Exception as e:
             logger.error(f"Cleanup failed for document {document_id}: {str(e)}")
@@ -0,0 +1,253 @@
+"""
+SHELTR-AI OpenAI Request Scheduler
+Queues OpenAI calls behind request and token budgets, serving higher-priority traffic first
+"""
+
+import os
+import time
+import heapq
+import asyncio
+import logging
+from collections import deque
+from enum import IntEnum
+from typing import Dict, Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+class Priority(IntEnum):
+    """Scheduling classes; lower values are served first"""
+    EMERGENCY = 0
+    CHAT = 1
+    CLASSIFICATION = 2
+    SUMMARIZATION = 3
+    BULK = 4
+
+class SchedulerTimeout(Exception):
+    """Raised when a request waited in the queue longer than its timeout"""
+    pass
+
+class TokenBucket:
+    """Continuously refilling budget, e.g. 60 requests or 200k tokens per minute"""
+
+    def __init__(self, capacity: float, per_seconds: float = 60.0):
+        self.capacity = capacity
+        self.refill_rate = capacity / per_seconds
+        self.tokens = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.refill_rate)
+        self._updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` can be taken (0 if available now)"""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.refill_rate
+
+    def take(self, amount: float, now: float):
+        """Spend from the bucket; may go negative when reconciling actual usage"""
+        self._refill(now)
+        self.tokens -= min(amount, self.capacity)
+
+    def refund(self, amount: float, now: float):
+        """Return over-estimated budget"""
+        self._refill(now)
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+class SchedulerGrant:
+    """A granted slot; set actual_tokens once usage is known so the token budget is corrected"""
+    __slots__ = ('estimated_tokens', 'actual_tokens', 'priority', 'wait_seconds')
+
+    def __init__(self, estimated_tokens: int, priority: Priority, wait_seconds: float):
+        self.estimated_tokens = estimated_tokens
+        self.actual_tokens: Optional[int] = None
+        self.priority = priority
+        self.wait_seconds = wait_seconds
+
+class _Slot:
+    """Async context manager returned by OpenAIRequestScheduler.slot"""
+
+    def __init__(self, scheduler: "OpenAIRequestScheduler", estimated_tokens: int, priority: Priority, timeout: Optional[float]):
+        self.scheduler = scheduler
+        self.estimated_tokens = estimated_tokens
+        self.priority = priority
+        self.timeout = timeout
+        self.grant: Optional[SchedulerGrant] = None
+
+    async def __aenter__(self) -> SchedulerGrant:
+        self.grant = await self.scheduler.acquire(self.estimated_tokens, self.priority, self.timeout)
+        return self.grant
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.scheduler.reconcile(self.grant)
+        return False
+
+class OpenAIRequestScheduler:
+    """Priority queue in front of OpenAI with requests-per-minute and tokens-per-minute buckets"""
+
+    # How long each class may wait for budget before giving up
+    DEFAULT_TIMEOUTS = {
+        Priority.EMERGENCY: 30.0,
+        Priority.CHAT: 15.0,
+        Priority.CLASSIFICATION: 15.0,
+        Priority.SUMMARIZATION: 60.0,
+        Priority.BULK: 300.0,
+    }
+
+    def __init__(self, requests_per_minute: Optional[int] = None, tokens_per_minute: Optional[int] = None):
+        self.requests_per_minute = requests_per_minute or int(os.getenv("OPENAI_RATE_LIMIT_PER_MINUTE", 60))
+        self.tokens_per_minute = tokens_per_minute or int(os.getenv("OPENAI_TOKENS_PER_MINUTE", 200000))
+        self.request_bucket = TokenBucket(self.requests_per_minute)
+        self.token_bucket = TokenBucket(self.tokens_per_minute)
+
+        self._queue: List[tuple] = []  # (priority, sequence, estimated tokens, enqueued at, future)
+        self._sequence = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+
+        # Metrics
+        self.granted = {priority.name: 0 for priority in Priority}
+        self.timeouts = {priority.name: 0 for priority in Priority}
+        self.cancellations = {priority.name: 0 for priority in Priority}
+        self.max_queue_depth = 0
+        self._recent_waits: deque = deque(maxlen=500)
+
+    def slot(self, estimated_tokens: int, priority: Priority = Priority.CHAT, timeout: Optional[float] = None) -> _Slot:
+        """`async with scheduler.slot(tokens, priority) as grant:` around a single OpenAI call"""
+        return _Slot(self, estimated_tokens, priority, timeout)
+
+    async def acquire(self, estimated_tokens: int, priority: Priority = Priority.CHAT, timeout: Optional[float] = None) -> SchedulerGrant:
+        """Wait for request and token budget, queueing behind higher-priority callers"""
+        estimated_tokens = max(1, int(estimated_tokens))
+        now = time.monotonic()
+
+        # Fast path: nothing queued and budget available
+        if not self._queue and self._budget_wait(estimated_tokens, now) == 0:
+            self._spend(estimated_tokens, now)
+            return self._granted(estimated_tokens, priority, 0.0)
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, self._sequence, estimated_tokens, now, future))
+        self._sequence += 1
+        self.max_queue_depth = max(self.max_queue_depth, len(self._queue))
+        self._ensure_dispatcher()
+
+        try:
+            wait_seconds = await asyncio.wait_for(
+                asyncio.shield(future),
+                timeout if timeout is not None else self.DEFAULT_TIMEOUTS[priority]
+            )
+        except asyncio.TimeoutError:
+            self._abandon(future, estimated_tokens)
+            self.timeouts[priority.name] += 1
+            logger.warning(f"OpenAI request ({priority.name}) timed out waiting for rate-limit budget")
+            raise SchedulerTimeout(f"OpenAI request queue timeout ({priority.name})")
+        except asyncio.CancelledError:
+            # The caller went away (client disconnect, an outer timeout); don't spend budget on it
+            self._abandon(future, estimated_tokens)
+            self.cancellations[priority.name] += 1
+            raise
+
+        return self._granted(estimated_tokens, priority, wait_seconds)
+
+    def reconcile(self, grant: Optional[SchedulerGrant]):
+        """Correct the token budget with the usage the API actually reported"""
+        if grant is None or grant.actual_tokens is None:
+            return
+        difference = grant.actual_tokens - grant.estimated_tokens
+        now = time.monotonic()
+        if difference > 0:
+            self.token_bucket.take(difference, now)
+        elif difference < 0:
+            self.token_bucket.refund(-difference, now)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Queue depth, throughput and wait-time metrics"""
+        waits = sorted(self._recent_waits)
+        depth_by_priority = {priority.name: 0 for priority in Priority}
+        for priority, _, _, _, future in self._queue:
+            if not future.done():
+                depth_by_priority[Priority(priority).name] += 1
+        return {
+            'requests_per_minute': self.requests_per_minute,
+            'tokens_per_minute': self.tokens_per_minute,
+            'available_requests': round(self.request_bucket.tokens, 2),
+            'available_tokens': round(self.token_bucket.tokens),
+            'queue_depth': sum(depth_by_priority.values()),
+            'queue_depth_by_priority': depth_by_priority,
+            'max_queue_depth': self.max_queue_depth,
+            'granted': self.granted,
+            'timeouts': self.timeouts,
+            'cancellations': self.cancellations,
+            'wait_seconds': {
+                'samples': len(waits),
+                'avg': sum(waits) / len(waits) if waits else 0.0,
+                'p95': waits[int(len(waits) * 0.95)] if waits else 0.0,
+                'max': waits[-1] if waits else 0.0
+            }
+        }
+
+    def _budget_wait(self, estimated_tokens: int, now: float) -> float:
+        return max(
+            self.request_bucket.wait_time(1, now),
+            self.token_bucket.wait_time(estimated_tokens, now)
+        )
+
+    def _spend(self, estimated_tokens: int, now: float):
+        self.request_bucket.take(1, now)
+        self.token_bucket.take(estimated_tokens, now)
+
+    def _refund(self, estimated_tokens: int):
+        now = time.monotonic()
+        self.request_bucket.refund(1, now)
+        self.token_bucket.refund(estimated_tokens, now)
+
+    def _abandon(self, future: asyncio.Future, estimated_tokens: int):
+        """Withdraw a queued request, refunding the budget if it was granted just before"""
+        if future.done() and not future.cancelled():
+            self._refund(estimated_tokens)
+        future.cancel()
+        if self._wakeup is not None:
+            # It may be the head the dispatcher is sleeping on
+            self._wakeup.set()
+
+    def _granted(self, estimated_tokens: int, priority: Priority, wait_seconds: float) -> SchedulerGrant:
+        self.granted[priority.name] += 1
+        self._recent_waits.append(wait_seconds)
+        return SchedulerGrant(estimated_tokens, priority, wait_seconds)
+
+    def _ensure_dispatcher(self):
+        """Start the dispatcher if it is idle, or wake it so it re-reads the queue head"""
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.get_running_loop().create_task(self._dispatch())
+        else:
+            self._wakeup.set()
+
+    async def _dispatch(self):
+        """Grant queued requests in priority order as budget refills"""
+        while self._queue:
+            priority, _, estimated_tokens, enqueued_at, future = self._queue[0]
+            if future.done():
+                # Timed out or cancelled while queued
+                heapq.heappop(self._queue)
+                continue
+
+            now = time.monotonic()
+            wait = self._budget_wait(estimated_tokens, now)
+            if wait == 0:
+                heapq.heappop(self._queue)
+                self._spend(estimated_tokens, now)
+                future.set_result(now - enqueued_at)
+                continue
+
+            # Sleep until budget refills, or until a more urgent request arrives
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
@@ -6,14 +6,17 @@ Intelligent AI-powered chatbot responses using GPT-4o-mini
 import os
 import time
 import logging
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, AsyncIterator
 from datetime import datetime
 import asyncio
 
 import openai
-import tiktoken
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 
+from services.openai_scheduler import OpenAIRequestScheduler, Priority, SchedulerTimeout
+from services.tokenizer import tokenizer
+from services.context_assembler import context_assembler
+
 logger = logging.getLogger(__name__)
 
 class OpenAIService:
@@ -21,6 +24,9 @@ class OpenAIService:
     
     def __init__(self):
         """Initialize OpenAI client with SHELTR configuration"""
+        # Every OpenAI call waits here for request and token budget
+        self.scheduler = OpenAIRequestScheduler()
+        
         try:
             # Initialize OpenAI client
             api_key = os.getenv("OPENAI_API_KEY")
@@ -42,17 +48,6 @@ class OpenAIService:
             self.temperature = float(os.getenv("OPENAI_TEMPERATURE", 0.7))
             self.max_context_tokens = int(os.getenv("OPENAI_MAX_CONTEXT_TOKENS", 4000))
             
-            # Initialize token encoder
-            try:
-                self.encoding = tiktoken.encoding_for_model(self.model)
-            except KeyError:
-                logger.warning(f"Model {self.model} not found in tiktoken, using cl100k_base")
-                self.encoding = tiktoken.get_encoding("cl100k_base")
-            
-            # Rate limiting
-            self.requests_per_minute = int(os.getenv("OPENAI_RATE_LIMIT_PER_MINUTE", 60))
-            self.request_timestamps = []
-            
             self.available = True
             logger.info(f"✅ OpenAI service initialized with model: {self.model}")
             
@@ -61,28 +56,26 @@ class OpenAIService:
             self.client = None
             self.available = False
     
-    def _check_rate_limit(self) -> bool:
-        """Check if we're within rate limits"""
-        if not self.available:
-            return False
-            
-        current_time = time.time()
-        minute_ago = current_time - 60
-        
-        # Remove old requests
-        self.request_timestamps = [
-            timestamp for timestamp in self.request_timestamps 
-            if timestamp > minute_ago
-        ]
-        
-        # Check if we can make a new request
-        if len(self.request_timestamps) >= self.requests_per_minute:
-            logger.warning("Rate limit reached, request denied")
-            return False
-        
-        # Add current request
-        self.request_timestamps.append(current_time)
-        return True
+    def _estimate_request_tokens(self, messages: List[Dict[str, str]], max_tokens: int) -> int:
+        """Prompt tokens plus the completion budget, used to reserve tokens-per-minute quota"""
+        return context_assembler.message_tokens(messages) + max_tokens
+    
+    def _build_messages(
+        self,
+        message: str,
+        context: Dict[str, Any],
+        system_prompt: str = None
+    ) -> List[Dict[str, str]]:
+        """Assemble the chat messages for a completion request within the context token budget"""
+        return context_assembler.assemble(
+            message=message,
+            budget=self.max_context_tokens,
+            system_prompt=system_prompt,
+            knowledge=context.get("knowledge_passages"),
+            knowledge_max_tokens=context.get("knowledge_max_tokens"),
+            summary=context.get("conversation_summary"),
+            history=context.get("conversation_history", [])
+        )
     
     @retry(
         stop=stop_after_attempt(3),
@@ -93,59 +86,32 @@ class OpenAIService:
         self, 
         message: str, 
         context: Dict[str, Any],
-        system_prompt: str = None
+        system_prompt: str = None,
+        priority: Priority = Priority.CHAT
     ) -> str:
         """Generate AI response with context awareness and retry logic"""
         
-        if not self.available or not self._check_rate_limit():
-            raise Exception("OpenAI service unavailable or rate limited")
+        if not self.available:
+            raise Exception("OpenAI service unavailable")
         
         try:
-            # Prepare messages for OpenAI
-            messages = []
-            
-            # Add system prompt
-            if system_prompt:
-                messages.append({
-                    "role": "system",
-                    "content": system_prompt
-                })
-            
-            # Add conversation context if available
-            conversation_history = context.get("conversation_history", [])
-            for exchange in conversation_history[-3:]:  # Last 3 exchanges
-                if "user_message" in exchange and "bot_response" in exchange:
-                    messages.append({
-                        "role": "user", 
-                        "content": exchange["user_message"]
-                    })
-                    messages.append({
-                        "role": "assistant", 
-                        "content": exchange["bot_response"]
-                    })
-            
-            # Add current message
-            messages.append({
-                "role": "user",
-                "content": message
-            })
-            
-            # Count tokens and ensure we're within limits
-            total_tokens = sum(self.count_tokens(msg["content"]) for msg in messages)
-            if total_tokens > self.max_context_tokens:
-                # Truncate conversation history
-                messages = messages[:1] + messages[-2:]  # Keep system + last exchange
+            messages = self._build_messages(message, context, system_prompt)
             
-            # Generate response
-            start_time = time.time()
-            response = await self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                max_tokens=self.max_tokens,
-                temperature=self.temperature,
-                presence_penalty=0.1,  # Encourage varied responses
-                frequency_penalty=0.1   # Reduce repetition
-            )
+            # Generate response once the scheduler grants budget
+            async with self.scheduler.slot(
+                self._estimate_request_tokens(messages, self.max_tokens), priority
+            ) as grant:
+                start_time = time.time()
+                response = await self.client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    max_tokens=self.max_tokens,
+                    temperature=self.temperature,
+                    presence_penalty=0.1,  # Encourage varied responses
+                    frequency_penalty=0.1   # Reduce repetition
+                )
+                if response.usage:
+                    grant.actual_tokens = response.usage.total_tokens
             
             response_time = time.time() - start_time
             
@@ -164,10 +130,78 @@ class OpenAIService:
         except openai.APITimeoutError as e:
             logger.warning(f"OpenAI timeout: {e}")
             raise
+        except SchedulerTimeout:
+            raise
         except Exception as e:
             logger.error(f"OpenAI API error: {e}")
             raise Exception(f"AI response generation failed: {str(e)}")
     
+    async def generate_response_stream(
+        self,
+        message: str,
+        context: Dict[str, Any],
+        system_prompt: str = None,
+        priority: Priority = Priority.CHAT
+    ) -> AsyncIterator[str]:
+        """Stream the AI response as text deltas as soon as the model produces them"""
+        
+        if not self.available:
+            raise Exception("OpenAI service unavailable")
+        
+        messages = self._build_messages(message, context, system_prompt)
+        prompt_tokens = context_assembler.message_tokens(messages)
+        
+        try:
+            # The slot is reconciled on exit, including when the consumer abandons the stream
+            async with self.scheduler.slot(prompt_tokens + self.max_tokens, priority) as grant:
+                start_time = time.time()
+                first_token_time = None
+                streamed = []
+                
+                try:
+                    stream = await self.client.chat.completions.create(
+                        model=self.model,
+                        messages=messages,
+                        max_tokens=self.max_tokens,
+                        temperature=self.temperature,
+                        presence_penalty=0.1,
+                        frequency_penalty=0.1,
+                        stream=True,
+                        # The final chunk then carries the usage of the whole request
+                        stream_options={"include_usage": True}
+                    )
+                    
+                    async for chunk in stream:
+                        if getattr(chunk, 'usage', None):
+                            grant.actual_tokens = chunk.usage.total_tokens
+                        if not chunk.choices:
+                            continue
+                        delta = chunk.choices[0].delta.content
+                        if delta:
+                            if first_token_time is None:
+                                first_token_time = time.time() - start_time
+                            streamed.append(delta)
+                            yield delta
+                finally:
+                    if grant.actual_tokens is None:
+                        # Cut short before the usage chunk; charge what was actually generated
+                        grant.actual_tokens = prompt_tokens + tokenizer.count("".join(streamed))
+            
+            logger.info(f"OpenAI stream completed in {time.time() - start_time:.2f}s, "
+                       f"first token after {first_token_time or 0:.2f}s")
+            
+        except openai.RateLimitError as e:
+            logger.warning(f"OpenAI rate limit hit: {e}")
+            raise
+        except openai.APITimeoutError as e:
+            logger.warning(f"OpenAI timeout: {e}")
+            raise
+        except SchedulerTimeout:
+            raise
+        except Exception as e:
+            logger.error(f"OpenAI streaming error: {e}")
+            raise Exception(f"AI response streaming failed: {str(e)}")
+    
     async def classify_intent(
         self, 
         message: str, 
@@ -215,7 +249,8 @@ class OpenAIService:
             response = await self.generate_response(
                 message=classification_prompt,
                 context={"task": "intent_classification"},
-                system_prompt="You are a precise intent classification system. Always respond with valid JSON."
+                system_prompt="You are a precise intent classification system. Always respond with valid JSON.",
+                priority=Priority.CLASSIFICATION
             )
             
             # Try to parse JSON response
@@ -241,26 +276,37 @@ class OpenAIService:
     async def summarize_conversation(
         self, 
         conversation_history: List[Dict], 
-        max_summary_tokens: int = 100
-    ) -> str:
-        """Generate conversation summary for context management"""
+        max_summary_tokens: int = 100,
+        previous_summary: Optional[str] = None
+    ) -> Optional[str]:
+        """
+        Generate conversation summary for context management
+        
+        With previous_summary, the exchanges are folded into it so the result is a rolling summary
+        of the whole conversation. Returns None if no summary could be produced.
+        """
         
         if not self.available or not conversation_history:
-            return "No conversation history available."
+            return None
         
         # Format conversation for summarization
         conversation_text = ""
-        for exchange in conversation_history[-10:]:  # Last 10 exchanges
+        for exchange in conversation_history:
             if "user_message" in exchange and "bot_response" in exchange:
                 conversation_text += f"User: {exchange['user_message']}\n"
                 conversation_text += f"Assistant: {exchange['bot_response']}\n\n"
         
+        earlier_text = f"""
+        Summary of the conversation so far:
+        {previous_summary}
+        """ if previous_summary else ""
+        
         summary_prompt = f"""
         Summarize this conversation in 2-3 sentences, focusing on:
         - Main topics discussed
         - Key requests or actions
         - Current conversation context
-        
+        {earlier_text}
         Conversation:
         {conversation_text}
         
@@ -271,7 +317,8 @@ class OpenAIService:
             summary = await self.generate_response(
                 message=summary_prompt,
                 context={"task": "summarization"},
-                system_prompt="You are a conversation summarizer. Provide clear, concise summaries."
+                system_prompt="You are a conversation summarizer. Provide clear, concise summaries.",
+                priority=Priority.SUMMARIZATION
             )
             
             # Ensure summary isn't too long
@@ -283,17 +330,11 @@ class OpenAIService:
             
         except Exception as e:
             logger.error(f"Conversation summarization failed: {e}")
-            return "Unable to summarize conversation."
+            return None
     
     def count_tokens(self, text: str) -> int:
-        """Count tokens in text for context management"""
-        if not self.available:
-            return len(text.split())  # Rough estimate
-        
-        try:
-            return len(self.encoding.encode(text))
-        except Exception:
-            return len(text.split())  # Fallback to word count
+        """Count tokens in text for context management (memoized by the shared tokenizer)"""
+        return tokenizer.count(text)
     
     def is_available(self) -> bool:
         """Check if OpenAI service is available"""
@@ -311,11 +352,12 @@ class OpenAIService:
         try:
             # Test with a simple request
             start_time = time.time()
-            test_response = await self.client.chat.completions.create(
-                model=self.model,
-                messages=[{"role": "user", "content": "Hi"}],
-                max_tokens=5
-            )
+            async with self.scheduler.slot(10, Priority.CLASSIFICATION):
+                test_response = await self.client.chat.completions.create(
+                    model=self.model,
+                    messages=[{"role": "user", "content": "Hi"}],
+                    max_tokens=5
+                )
             response_time = time.time() - start_time
             
             return {
@@ -323,7 +365,9 @@ class OpenAIService:
                 "model": self.model,
                 "response_time": f"{response_time:.2f}s",
                 "features_available": True,
-                "rate_limit_remaining": self.requests_per_minute - len(self.request_timestamps)
+                "rate_limit_remaining": int(self.scheduler.request_bucket.tokens),
+                "scheduler": self.scheduler.get_stats(),
+                "tokenizer": tokenizer.get_stats()
             }
             
         except Exception as e:
@@ -0,0 +1,388 @@
+"""
+SHELTR-AI Platform Metrics
+Materialized counters for the Super Admin dashboard, updated at write time and rebuilt by a backfill job
+"""
+
+import os
+import random
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Any, Optional
+
+from firebase_admin import firestore
+
+from services.analytics_rollups import analytics_rollups
+from services.bulk_writer import FirestoreBulkWriter
+from services.firestore_aggregates import firestore_aggregates
+
+logger = logging.getLogger(__name__)
+
+TRACKED_ROLES = ('super_admin', 'admin', 'participant', 'donor')
+
+def user_profiles(db):
+    """
+    Every user profile: the root users collection (written by the web app) and each
+    tenants/{tenant_id}/users collection (written by /auth/register), as one collection group
+    """
+    return db.collection_group('users')
+
+def day_key(value: Any) -> Optional[str]:
+    """UTC date bucket ('YYYY-MM-DD') for a Firestore timestamp, datetime or ISO string"""
+    if not value:
+        return None
+    try:
+        if isinstance(value, str):
+            value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        if not hasattr(value, 'date'):
+            return None
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc)
+        return value.date().isoformat()
+    except Exception:
+        return None
+
+def donation_value(amount: Any) -> float:
+    """Donation amount from either a plain number or an {'total': ...} / {'amount': ...} map"""
+    if isinstance(amount, dict):
+        amount = amount.get('total', 0) or amount.get('amount', 0)
+    try:
+        return float(amount or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+class PlatformMetricsStore:
+    """
+    Keeps three aggregate documents in the platform_metrics collection:
+
+    - users: total, by_role and by_shelter
+    - donations: total_amount, total_count and by_shelter
+    - shelters: totals over the shelters collection
+
+    Daily buckets live in a daily subcollection under users and donations, one document per
+    day and shard ({date}_{shard}), so no document grows with time or takes every day's writes.
+    Configure a TTL policy on expires_at to prune them. get_snapshot() folds the last
+    SNAPSHOT_DAYS of shards back into daily_new/daily_active and daily maps.
+    """
+
+    # Days of daily buckets the dashboard reads
+    SNAPSHOT_DAYS = 7
+
+    def __init__(self):
+        self._db = None
+        self.collection = os.getenv("PLATFORM_METRICS_COLLECTION", "platform_metrics")
+        # Daily buckets expire (expires_at) this many days after their date
+        self.retention_days = int(os.getenv("PLATFORM_METRICS_RETENTION_DAYS", 90))
+        # Each day's counters are spread over this many documents (Firestore sustains ~1 write/s per document)
+        self.daily_shards = int(os.getenv("PLATFORM_METRICS_DAILY_SHARDS", 4))
+
+        # Users already counted as active today by this worker
+        self._active_day: Optional[str] = None
+        self._active_seen: set = set()
+        self._background: set = set()
+
+    @property
+    def db(self):
+        """Lazy initialization of Firestore client"""
+        if self._db is None:
+            self._db = firestore.client()
+        return self._db
+
+    # Write-time updates
+
+    async def record_user_created(self, role: str, shelter_id: Optional[str] = None, created_at: Any = None):
+        """Count a newly registered user"""
+        fields = {
+            'total': firestore.Increment(1),
+            'by_role': {role: firestore.Increment(1)}
+        }
+        if shelter_id:
+            fields['by_shelter'] = {shelter_id: firestore.Increment(1)}
+        await self._apply('users', fields, day_key(created_at) or self._today(), {'new': firestore.Increment(1)})
+        await analytics_rollups.record_new_user(created_at)
+
+    async def record_user_role_changed(
+        self,
+        old_role: Optional[str],
+        new_role: str,
+        old_shelter_id: Optional[str] = None,
+        new_shelter_id: Optional[str] = None
+    ):
+        """Move a user between role and shelter counters"""
+        if old_role == new_role and old_shelter_id == new_shelter_id:
+            return
+        fields = {}
+        if old_role != new_role:
+            by_role = {new_role: firestore.Increment(1)}
+            if old_role:
+                by_role[old_role] = firestore.Increment(-1)
+            fields['by_role'] = by_role
+
+        by_shelter = {}
+        if old_shelter_id:
+            by_shelter[old_shelter_id] = firestore.Increment(-1)
+        if new_shelter_id:
+            by_shelter[new_shelter_id] = firestore.Increment(1)
+        if old_shelter_id != new_shelter_id and by_shelter:
+            fields['by_shelter'] = by_shelter
+        await self._apply('users', fields)
+
+    async def record_user_deleted(self, role: Optional[str], shelter_id: Optional[str] = None):
+        """Remove a deleted user from the totals (daily signup buckets are history and stay)"""
+        fields = {'total': firestore.Increment(-1)}
+        if role:
+            fields['by_role'] = {role: firestore.Increment(-1)}
+        if shelter_id:
+            fields['by_shelter'] = {shelter_id: firestore.Increment(-1)}
+        await self._apply('users', fields)
+
+    def record_user_active(self, uid: str):
+        """
+        Count a user towards today's active users on their first authenticated request of the (UTC) day
+
+        The write runs in the background so the request never waits for it.
+        """
+        today = self._today()
+        if self._active_day != today:
+            self._active_day, self._active_seen = today, set()
+        if uid in self._active_seen:
+            return
+        self._active_seen.add(uid)
+        task = asyncio.get_running_loop().create_task(asyncio.to_thread(self._mark_active, today, uid))
+        # Keep a reference until it finishes so the task is not garbage collected
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def record_donation(self, amount: Any, created_at: Any = None, shelter_id: Optional[str] = None):
+        """Count a donation towards the totals and its day's bucket"""
+        value = donation_value(amount)
+        if value <= 0:
+            return
+        fields = {
+            'total_amount': firestore.Increment(value),
+            'total_count': firestore.Increment(1)
+        }
+        if shelter_id:
+            fields['by_shelter'] = {
+                shelter_id: {'amount': firestore.Increment(value), 'count': firestore.Increment(1)}
+            }
+        await self._apply('donations', fields, day_key(created_at) or self._today(), {
+            'amount': firestore.Increment(value),
+            'count': firestore.Increment(1)
+        })
+        await analytics_rollups.record_donation(value, created_at)
+
+    # Reads
+
+    async def get_snapshot(self) -> Optional[Dict[str, Dict[str, Any]]]:
+        """The users, donations and shelters aggregates with their recent daily buckets, or None until backfilled"""
+        try:
+            return await asyncio.to_thread(self._read_snapshot)
+        except Exception as e:
+            logger.error(f"Error reading platform metrics: {str(e)}")
+            return None
+
+    def _read_snapshot(self) -> Optional[Dict[str, Dict[str, Any]]]:
+        refs = [self.db.collection(self.collection).document(name) for name in ('users', 'donations', 'shelters')]
+        docs = {doc.id: doc.to_dict() for doc in self.db.get_all(refs) if doc.exists}
+        if len(docs) < 3:
+            return None
+
+        since = (datetime.now(timezone.utc) - timedelta(days=self.SNAPSHOT_DAYS - 1)).date().isoformat()
+        users, donations = docs['users'], docs['donations']
+        users['daily_new'], users['daily_active'], donations['daily'] = {}, {}, {}
+        for shard in self._daily('users').where('date', '>=', since).stream():
+            data = shard.to_dict()
+            day = data['date']
+            users['daily_new'][day] = users['daily_new'].get(day, 0) + data.get('new', 0)
+            users['daily_active'][day] = users['daily_active'].get(day, 0) + data.get('active', 0)
+        for shard in self._daily('donations').where('date', '>=', since).stream():
+            data = shard.to_dict()
+            bucket = donations['daily'].setdefault(data['date'], {'amount': 0.0, 'count': 0})
+            bucket['amount'] += data.get('amount', 0.0)
+            bucket['count'] += data.get('count', 0)
+        return docs
+
+    @staticmethod
+    def sum_days(buckets: Dict[str, Any], days: int, field: Optional[str] = None) -> float:
+        """Sum the daily buckets for the last `days` days, today included"""
+        if not buckets:
+            return 0
+        today = datetime.now(timezone.utc).date()
+        total = 0
+        for offset in range(days):
+            bucket = buckets.get((today - timedelta(days=offset)).isoformat())
+            if bucket is None:
+                continue
+            total += bucket.get(field, 0) if field else bucket
+        return total
+
+    # Backfill
+
+    async def rebuild(self) -> Dict[str, Any]:
+        """
+        Recompute every aggregate from the source collections and overwrite the stored documents
+
+        Counter updates that land while the scan runs can be lost, so run this off-peak.
+        """
+        now = datetime.now(timezone.utc)
+        cutoff = (now - timedelta(days=self.retention_days)).date().isoformat()
+        today = now.date().isoformat()
+
+        users = {
+            'total': 0,
+            'by_role': {role: 0 for role in TRACKED_ROLES},
+            'by_shelter': {}
+        }
+        users_daily = {
+            today: {'new': 0, 'active': firestore_aggregates.count_blocking(self._active_days().where('date', '==', today))}
+        }
+        for doc in user_profiles(self.db).select(['role', 'shelter_id', 'createdAt', 'created_at']).stream():
+            data = doc.to_dict()
+            users['total'] += 1
+            role = data.get('role', 'participant')
+            users['by_role'][role] = users['by_role'].get(role, 0) + 1
+            shelter_id = data.get('shelter_id')
+            if shelter_id:
+                users['by_shelter'][shelter_id] = users['by_shelter'].get(shelter_id, 0) + 1
+            # Profiles from the web app use createdAt, those from /auth/register created_at
+            created = day_key(data.get('createdAt') or data.get('created_at'))
+            if created and created >= cutoff:
+                bucket = users_daily.setdefault(created, {'new': 0, 'active': 0})
+                bucket['new'] += 1
+
+        donations = {'total_amount': 0.0, 'total_count': 0, 'by_shelter': {}}
+        donations_daily: Dict[str, Dict[str, Any]] = {}
+        for doc in self.db.collection('demo_donations').select(['amount', 'created_at', 'shelter_id']).stream():
+            data = doc.to_dict()
+            value = donation_value(data.get('amount'))
+            if value <= 0:
+                continue
+            donations['total_amount'] += value
+            donations['total_count'] += 1
+            buckets: List[Dict[str, Any]] = []
+            created = day_key(data.get('created_at'))
+            if created and created >= cutoff:
+                buckets.append(donations_daily.setdefault(created, {'amount': 0.0, 'count': 0}))
+            shelter_id = data.get('shelter_id')
+            if shelter_id:
+                buckets.append(donations['by_shelter'].setdefault(shelter_id, {'amount': 0.0, 'count': 0}))
+            for bucket in buckets:
+                bucket['amount'] += value
+                bucket['count'] += 1
+
+        shelters = {
+            'total_shelters': 0,
+            'active_shelters': 0,
+            'total_capacity': 0,
+            'current_occupancy': 0,
+            'services_provided': 0
+        }
+        for doc in self.db.collection('shelters').select(['status', 'capacity', 'occupancy_rate', 'services']).stream():
+            data = doc.to_dict()
+            shelters['total_shelters'] += 1
+            if data.get('status', 'active') == 'active':
+                shelters['active_shelters'] += 1
+            capacity = data.get('capacity', 50)  # Default 50 beds
+            shelters['total_capacity'] += capacity
+            shelters['current_occupancy'] += int(capacity * data.get('occupancy_rate', 0.77))
+            services = data.get('services', [])
+            shelters['services_provided'] += len(services) if services else 3  # Default 3 services
+
+        batch = self.db.batch()
+        for name, fields in (('users', users), ('donations', donations), ('shelters', shelters)):
+            fields['rebuilt_at'] = firestore.SERVER_TIMESTAMP
+            batch.set(self.db.collection(self.collection).document(name), fields)
+        batch.commit()
+        await self._replace_daily('users', users_daily)
+        await self._replace_daily('donations', donations_daily)
+
+        logger.info(
+            f"Platform metrics rebuilt: {users['total']} users, {donations['total_count']} donations, "
+            f"{shelters['total_shelters']} shelters"
+        )
+        return {
+            'users': users['total'],
+            'donations': donations['total_count'],
+            'shelters': shelters['total_shelters']
+        }
+
+    async def _apply(
+        self,
+        name: str,
+        fields: Dict[str, Any],
+        day: Optional[str] = None,
+        daily: Optional[Dict[str, Any]] = None
+    ):
+        """Merge counter increments into an aggregate (and a day's bucket) without blocking the event loop"""
+        await asyncio.to_thread(self._write, name, fields, day, daily)
+
+    def _write(
+        self,
+        name: str,
+        fields: Dict[str, Any],
+        day: Optional[str] = None,
+        daily: Optional[Dict[str, Any]] = None
+    ):
+        """Blocking merge for _apply, in one batch; failures never block the write that triggered them"""
+        try:
+            batch = self.db.batch()
+            if fields:
+                fields['updated_at'] = firestore.SERVER_TIMESTAMP
+                batch.set(self.db.collection(self.collection).document(name), fields, merge=True)
+            if daily:
+                shard = self._daily(name).document(f"{day}_{random.randrange(self.daily_shards)}")
+                batch.set(shard, {**daily, **self._daily_keys(day)}, merge=True)
+            batch.commit()
+        except Exception as e:
+            logger.error(f"Error updating {name} platform metrics: {str(e)}")
+
+    def _daily(self, name: str):
+        """The per-day shard documents of an aggregate"""
+        return self.db.collection(self.collection).document(name).collection('daily')
+
+    def _daily_keys(self, day: str) -> Dict[str, Any]:
+        """Fields every daily shard carries: its date for range reads and an expiry for the TTL policy"""
+        expires_at = datetime.fromisoformat(day).replace(tzinfo=timezone.utc) + timedelta(days=self.retention_days)
+        return {'date': day, 'expires_at': expires_at}
+
+    async def _replace_daily(self, name: str, days: Dict[str, Dict[str, Any]]):
+        """Swap every daily shard of an aggregate for one rebuilt document per day"""
+        writer = FirestoreBulkWriter(self.db)
+        for shard in self._daily(name).select([]).stream():
+            writer.delete(shard.reference, key=shard.id)
+        await writer.flush()
+
+        writer = FirestoreBulkWriter(self.db)
+        for day, counts in days.items():
+            writer.set(self._daily(name).document(f"{day}_0"), {**counts, **self._daily_keys(day)}, key=day)
+        result = await writer.flush()
+        if result.failed:
+            logger.error(f"Failed to write {len(result.failed)} daily {name} buckets")
+
+    def _active_days(self):
+        """One marker document per active user and day; configure a TTL policy on expires_at to prune them"""
+        return self.db.collection(self.collection).document('users').collection('active_days')
+
+    def _mark_active(self, today: str, uid: str):
+        """Create today's marker for a user and count them only if no worker has done so already"""
+        try:
+            self._active_days().document(f"{today}_{uid}").create({
+                'date': today,
+                'uid': uid,
+                'expires_at': datetime.now(timezone.utc) + timedelta(days=self.retention_days)
+            })
+        except Exception as e:
+            if type(e).__name__ not in ('AlreadyExists', 'Conflict'):
+                # Let a later request try again
+                self._active_seen.discard(uid)
+                logger.error(f"Error recording active user: {str(e)}")
+            return
+        self._write('users', {}, today, {'active': firestore.Increment(1)})
+
+    @staticmethod
+    def _today() -> str:
+        return datetime.now(timezone.utc).date().isoformat()
+
+# Create singleton instance
+platform_metrics = PlatformMetricsStore()
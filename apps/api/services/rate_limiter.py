@@ -0,0 +1,191 @@
+"""
+SHELTR-AI Rate Limiter
+Sliding-window-counter rate limiting with O(1) work and constant memory per key
+"""
+
+import os
+import math
+import time
+import logging
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+class RateLimitResult:
+    """Outcome of one rate-limit check"""
+    def __init__(self, allowed: bool, limit: int, remaining: int, retry_after: float = 0.0):
+        self.allowed = allowed
+        self.limit = limit
+        self.remaining = remaining
+        self.retry_after = retry_after
+
+    def headers(self) -> Dict[str, str]:
+        """Standard rate-limit response headers"""
+        headers = {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(self.remaining)
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(max(1, math.ceil(self.retry_after)))
+        return headers
+
+def evaluate_sliding_window(
+    previous: int,
+    current: int,
+    elapsed: float,
+    limit: int,
+    window_seconds: float
+) -> RateLimitResult:
+    """Decide whether one more request fits, weighting the previous window by how much of it still overlaps"""
+    weight = 1.0 - elapsed
+    estimate = previous * weight + current
+    if estimate + 1 <= limit:
+        return RateLimitResult(True, limit, max(0, int(limit - estimate - 1)))
+
+    # Wait until enough of the previous window has slid out (or the current one ends)
+    if current + 1 > limit or previous == 0:
+        retry_after = (1.0 - elapsed) * window_seconds
+    else:
+        needed_weight = (limit - current - 1) / previous
+        retry_after = (weight - needed_weight) * window_seconds
+    return RateLimitResult(False, limit, 0, retry_after)
+
+class InMemoryRateLimitBackend:
+    """Per-process counters: two integers per key, evicted once a key has been idle for two windows"""
+
+    def __init__(self, max_keys: Optional[int] = None):
+        self.max_keys = max_keys or int(os.getenv("RATE_LIMIT_MAX_KEYS", 100000))
+        # key -> [window index, current count, previous count, last seen]
+        self._counters: "OrderedDict[str, list]" = OrderedDict()
+        self.evictions = 0
+
+    async def hit(self, key: str, limit: int, window_seconds: float, now: float) -> RateLimitResult:
+        window_index = int(now // window_seconds)
+        elapsed = (now % window_seconds) / window_seconds
+
+        counter = self._counters.get(key)
+        if counter is None or counter[0] < window_index - 1:
+            previous, current = 0, 0
+        elif counter[0] == window_index - 1:
+            previous, current = counter[1], 0
+        else:
+            previous, current = counter[2], counter[1]
+
+        result = evaluate_sliding_window(previous, current, elapsed, limit, window_seconds)
+        if result.allowed:
+            current += 1
+
+        if counter is None:
+            self._counters[key] = [window_index, current, previous, now]
+        else:
+            counter[:] = [window_index, current, previous, now]
+            self._counters.move_to_end(key)
+
+        self._evict_idle(now, window_seconds)
+        return result
+
+    def _evict_idle(self, now: float, window_seconds: float):
+        """Drop keys whose counters have fully slid out, oldest first"""
+        idle_before = now - 2 * window_seconds
+        while self._counters:
+            key, counter = next(iter(self._counters.items()))
+            if counter[3] > idle_before and len(self._counters) <= self.max_keys:
+                break
+            del self._counters[key]
+            self.evictions += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'backend': 'memory',
+            'tracked_keys': len(self._counters),
+            'max_keys': self.max_keys,
+            'evictions': self.evictions
+        }
+
+class RedisRateLimitBackend:
+    """Counters shared by every worker through a Redis-protocol server"""
+
+    def __init__(self, client, key_prefix: str = "sheltr:ratelimit:"):
+        self.client = client
+        self.key_prefix = key_prefix
+        self.errors = 0
+
+    async def hit(self, key: str, limit: int, window_seconds: float, now: float) -> RateLimitResult:
+        window_index = int(now // window_seconds)
+        elapsed = (now % window_seconds) / window_seconds
+        current_key = f"{self.key_prefix}{key}:{window_index}"
+        previous_key = f"{self.key_prefix}{key}:{window_index - 1}"
+
+        try:
+            # Count optimistically in one round trip, then hand the slot back if it was over the limit
+            async with self.client.pipeline(transaction=True) as pipe:
+                pipe.incr(current_key)
+                pipe.expire(current_key, int(2 * window_seconds))
+                pipe.get(previous_key)
+                current, _, previous = await pipe.execute()
+        except Exception as e:
+            # Fail open so a Redis outage does not take the chatbot down with it
+            self.errors += 1
+            logger.error(f"Rate limit backend error for {key}: {str(e)}")
+            return RateLimitResult(True, limit, limit)
+
+        result = evaluate_sliding_window(int(previous or 0), int(current) - 1, elapsed, limit, window_seconds)
+        if not result.allowed:
+            try:
+                await self.client.decr(current_key)
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Rate limit backend error for {key}: {str(e)}")
+        return result
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'backend': 'redis',
+            'errors': self.errors
+        }
+
+def create_rate_limit_backend():
+    """Build the backend selected by RATE_LIMIT_BACKEND ('memory' or 'redis')"""
+    if os.getenv("RATE_LIMIT_BACKEND", "memory").lower() == "redis":
+        try:
+            import redis.asyncio as redis_asyncio
+
+            client = redis_asyncio.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+            logger.info("Rate limit backend: redis")
+            return RedisRateLimitBackend(client)
+        except ImportError:
+            logger.warning("redis package not installed, falling back to in-memory rate limiting")
+    return InMemoryRateLimitBackend()
+
+class RateLimiter:
+    """Allows `limit` requests per key in any sliding `window_seconds` interval"""
+
+    def __init__(self, limit: int, window_seconds: float, backend=None, name: str = "default"):
+        self.limit = limit
+        self.window_seconds = window_seconds
+        self.name = name
+        self.backend = backend or create_rate_limit_backend()
+
+        # Counters
+        self.allowed = 0
+        self.rejected = 0
+
+    async def check(self, key: str) -> RateLimitResult:
+        """Consume one request for the key if it is within the limit"""
+        result = await self.backend.hit(f"{self.name}:{key}", self.limit, self.window_seconds, time.time())
+        if result.allowed:
+            self.allowed += 1
+        else:
+            self.rejected += 1
+        return result
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'limit': self.limit,
+            'window_seconds': self.window_seconds,
+            'allowed': self.allowed,
+            'rejected': self.rejected,
+            **self.backend.get_stats()
+        }
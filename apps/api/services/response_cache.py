@@ -0,0 +1,138 @@
+"""
+SHELTR-AI Response Cache
+Stale-while-revalidate caching for expensive read endpoints such as the analytics dashboards
+"""
+
+import os
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Callable, Awaitable, Hashable
+
+logger = logging.getLogger(__name__)
+
+class _Entry:
+    __slots__ = ('value', 'fresh_until', 'stale_until')
+
+    def __init__(self, value: Any, fresh_until: float, stale_until: float):
+        self.value = value
+        self.fresh_until = fresh_until
+        self.stale_until = stale_until
+
+class StaleWhileRevalidateCache:
+    """
+    Serves a cached value while it is fresh, keeps serving it for a stale window while one
+    background task recomputes it, and only makes callers wait when nothing usable is cached.
+    Concurrent recomputations of a key are collapsed into a single task, so the cost of a
+    popular endpoint does not grow with the number of viewers.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: Optional[float] = None,
+        stale_seconds: Optional[float] = None,
+        max_entries: Optional[int] = None
+    ):
+        self.ttl_seconds = ttl_seconds or float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", 30))
+        # How long past the TTL a value may still be served while it is being refreshed
+        self.stale_seconds = stale_seconds or float(os.getenv("RESPONSE_CACHE_STALE_SECONDS", 300))
+        self.max_entries = max_entries or int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", 256))
+
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._refreshing: Dict[Hashable, asyncio.Task] = {}
+
+        # Counters
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+
+    async def get(
+        self,
+        key: Hashable,
+        compute: Callable[[], Awaitable[Any]],
+        cacheable: Optional[Callable[[Any], bool]] = None
+    ) -> Any:
+        """
+        Cached value for key, computing it with compute() when needed
+
+        cacheable can reject results (e.g. error payloads) so they are returned but not stored.
+        """
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None:
+            if now < entry.fresh_until:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.value
+            if now < entry.stale_until:
+                self._entries.move_to_end(key)
+                self.stale_hits += 1
+                self._refresh(key, compute, cacheable)
+                return entry.value
+
+        self.misses += 1
+        # Shielded so a disconnecting client does not cancel the refresh other callers wait on
+        return await asyncio.shield(self._refresh(key, compute, cacheable))
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'ttl_seconds': self.ttl_seconds,
+            'stale_seconds': self.stale_seconds,
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits + self.stale_hits) / lookups if lookups else 0.0,
+            'refreshes': self.refreshes,
+            'refresh_errors': self.refresh_errors,
+            'refreshing': len(self._refreshing)
+        }
+
+    def _refresh(
+        self,
+        key: Hashable,
+        compute: Callable[[], Awaitable[Any]],
+        cacheable: Optional[Callable[[Any], bool]]
+    ) -> asyncio.Task:
+        """The in-flight refresh for key, starting one if there is none"""
+        task = self._refreshing.get(key)
+        if task is None:
+            task = asyncio.create_task(self._run_refresh(key, compute, cacheable))
+            self._refreshing[key] = task
+            task.add_done_callback(lambda done: self._refresh_done(key, done))
+        return task
+
+    async def _run_refresh(
+        self,
+        key: Hashable,
+        compute: Callable[[], Awaitable[Any]],
+        cacheable: Optional[Callable[[Any], bool]]
+    ) -> Any:
+        self.refreshes += 1
+        value = await compute()
+        if cacheable is None or cacheable(value):
+            now = time.monotonic()
+            self._entries[key] = _Entry(value, now + self.ttl_seconds, now + self.ttl_seconds + self.stale_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def _refresh_done(self, key: Hashable, task: asyncio.Task):
+        if self._refreshing.get(key) is task:
+            del self._refreshing[key]
+        # Retrieve the exception so background refreshes nobody awaited do not warn; the stale value stays
+        if not task.cancelled() and task.exception() is not None:
+            self.refresh_errors += 1
+            logger.error(f"Response cache refresh failed for {key}: {str(task.exception())}")
+
+# Create singleton instance
+analytics_response_cache = StaleWhileRevalidateCache(
+    ttl_seconds=float(os.getenv("ANALYTICS_CACHE_TTL_SECONDS", 30)),
+    stale_seconds=float(os.getenv("ANALYTICS_CACHE_STALE_SECONDS", 300))
+)
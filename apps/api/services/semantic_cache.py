@@ -0,0 +1,176 @@
+"""
+SHELTR-AI Semantic Response Cache
+Reuses chatbot answers for new questions whose embeddings fall within a similarity radius of a cached one
+"""
+
+import os
+import time
+import logging
+from collections import OrderedDict
+from typing import Dict, List, Any, Optional
+
+import numpy as np
+
+from services.vector_index import vector_index
+
+logger = logging.getLogger(__name__)
+
+class _Partition:
+    """Cached answers for one (role, agent) pair with their normalized question embeddings"""
+    __slots__ = ('entry_ids', 'vectors', '_matrix')
+
+    def __init__(self):
+        self.entry_ids: List[int] = []
+        self.vectors: List[np.ndarray] = []
+        self._matrix: Optional[np.ndarray] = None
+
+    def add(self, entry_id: int, vector: np.ndarray):
+        self.entry_ids.append(entry_id)
+        self.vectors.append(vector)
+        self._matrix = None
+
+    def remove(self, entry_id: int):
+        position = self.entry_ids.index(entry_id)
+        del self.entry_ids[position]
+        del self.vectors[position]
+        self._matrix = None
+
+    def nearest(self, query: np.ndarray) -> tuple:
+        """(entry_id, similarity) of the closest cached question"""
+        if self._matrix is None:
+            self._matrix = np.vstack(self.vectors)
+        scores = self._matrix @ query
+        best = int(np.argmax(scores))
+        return self.entry_ids[best], float(scores[best])
+
+class SemanticResponseCache:
+    """Bounded, TTL-limited answer cache partitioned by user role and agent"""
+
+    def __init__(
+        self,
+        threshold: Optional[float] = None,
+        ttl_seconds: Optional[int] = None,
+        max_entries: Optional[int] = None
+    ):
+        self.enabled = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+        self.threshold = threshold or float(os.getenv("SEMANTIC_CACHE_THRESHOLD", 0.93))
+        self.ttl_seconds = ttl_seconds or int(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", 3600))
+        self.max_entries = max_entries or int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", 2000))
+
+        self._partitions: Dict[tuple, _Partition] = {}
+        # entry_id -> (partition key, expires_at, question, payload), least recently used first
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._next_id = 0
+        # Bumped on every invalidation so answers generated from older knowledge are not stored
+        self.generation = 0
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> Optional[np.ndarray]:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else None
+
+    def lookup(self, embedding: List[float], role: str, agent: str) -> Optional[Dict[str, Any]]:
+        """Cached payload for the closest question within the similarity radius, or None"""
+        partition = self._partitions.get((role, agent))
+        query = self._normalize(embedding)
+        if partition is None or not partition.entry_ids or query is None:
+            self.misses += 1
+            return None
+
+        entry_id, similarity = partition.nearest(query)
+        if similarity < self.threshold:
+            self.misses += 1
+            return None
+
+        _, expires_at, question, payload = self._entries[entry_id]
+        if expires_at <= time.time():
+            self._remove(entry_id)
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(entry_id)
+        self.hits += 1
+        return {**payload, 'cached_question': question, 'similarity': round(similarity, 4)}
+
+    def store(
+        self,
+        embedding: List[float],
+        role: str,
+        agent: str,
+        question: str,
+        payload: Dict[str, Any],
+        generation: Optional[int] = None
+    ) -> bool:
+        """Cache an answer; skipped if the knowledge base changed since generation started"""
+        if generation is not None and generation != self.generation:
+            return False
+        vector = self._normalize(embedding)
+        if vector is None:
+            return False
+
+        key = (role, agent)
+        entry_id = self._next_id
+        self._next_id += 1
+        self._partitions.setdefault(key, _Partition()).add(entry_id, vector)
+        self._entries[entry_id] = (key, time.time() + self.ttl_seconds, question, payload)
+        self.stores += 1
+
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+        return True
+
+    def invalidate(self, reason: str = ""):
+        """Drop every cached answer, e.g. because knowledge documents changed"""
+        if self._entries:
+            logger.info(f"Semantic response cache invalidated ({len(self._entries)} entries): {reason}")
+        self._partitions = {}
+        self._entries = OrderedDict()
+        self.generation += 1
+        self.invalidations += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'enabled': self.enabled,
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'partitions': len(self._partitions),
+            'threshold': self.threshold,
+            'ttl_seconds': self.ttl_seconds,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'stores': self.stores,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'invalidations': self.invalidations
+        }
+
+    def _remove(self, entry_id: int):
+        entry = self._entries.pop(entry_id, None)
+        if entry is None:
+            return
+        partition = self._partitions.get(entry[0])
+        if partition is not None:
+            partition.remove(entry_id)
+            if not partition.entry_ids:
+                del self._partitions[entry[0]]
+
+# Create singleton instance
+semantic_response_cache = SemanticResponseCache()
+
+# Any change to the indexed knowledge can change the right answer
+vector_index.add_change_listener(
+    lambda document_id: semantic_response_cache.invalidate(f"knowledge changed ({document_id or 'index reload'})")
+)
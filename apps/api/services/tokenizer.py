@@ -0,0 +1,133 @@
+"""
+SHELTR-AI Tokenizer Service
+One shared tiktoken encoder with memoized token counts for strings that repeat across requests
+"""
+
+import os
+import logging
+from collections import OrderedDict
+from typing import Dict, List, Any, Optional, Iterable
+
+import tiktoken
+
+logger = logging.getLogger(__name__)
+
+class TokenizerService:
+    """Loads the encoder once and caches counts for system prompts, FAQ answers and history turns"""
+
+    def __init__(self, max_entries: Optional[int] = None, max_cached_chars: Optional[int] = None):
+        self.model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+        self.max_entries = max_entries or int(os.getenv("TOKEN_COUNT_CACHE_SIZE", 4096))
+        # Long one-off texts (document chunks) are counted but not cached
+        self.max_cached_chars = max_cached_chars or int(os.getenv("TOKEN_COUNT_CACHE_MAX_CHARS", 8192))
+
+        self._encoding = None
+        self._encoding_failed = False
+        self._counts: "OrderedDict[str, int]" = OrderedDict()
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def encoding(self):
+        """Lazily loaded tiktoken encoding shared by every service"""
+        if self._encoding is None and not self._encoding_failed:
+            try:
+                try:
+                    self._encoding = tiktoken.encoding_for_model(self.model)
+                except KeyError:
+                    logger.warning(f"Model {self.model} not found in tiktoken, using cl100k_base")
+                    self._encoding = tiktoken.get_encoding("cl100k_base")
+            except Exception as e:
+                logger.error(f"Failed to load tiktoken encoding: {str(e)}")
+                self._encoding_failed = True
+        return self._encoding
+
+    def count(self, text: str) -> int:
+        """Token count for one string"""
+        if not text:
+            return 0
+
+        cached = self._counts.get(text)
+        if cached is not None:
+            self._counts.move_to_end(text)
+            self.hits += 1
+            return cached
+
+        self.misses += 1
+        count = self._encode_count(text)
+        self._remember(text, count)
+        return count
+
+    def count_many(self, texts: Iterable[str]) -> List[int]:
+        """Token counts for many strings, encoding the uncached ones in a single batch call"""
+        texts = list(texts)
+        counts: List[Optional[int]] = [None] * len(texts)
+        missing: Dict[str, List[int]] = {}
+
+        for i, text in enumerate(texts):
+            if not text:
+                counts[i] = 0
+                continue
+            cached = self._counts.get(text)
+            if cached is not None:
+                self._counts.move_to_end(text)
+                self.hits += 1
+                counts[i] = cached
+            else:
+                missing.setdefault(text, []).append(i)
+
+        if missing:
+            self.misses += len(missing)
+            unique_texts = list(missing)
+            for text, count in zip(unique_texts, self._encode_counts(unique_texts)):
+                self._remember(text, count)
+                for i in missing[text]:
+                    counts[i] = count
+
+        return counts
+
+    def count_messages(self, messages: List[Dict[str, str]]) -> int:
+        """Total content tokens of a chat message list"""
+        return sum(self.count_many(message["content"] for message in messages))
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'model': self.model,
+            'encoding': self._encoding.name if self._encoding is not None else None,
+            'entries': len(self._counts),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
+
+    def _remember(self, text: str, count: int):
+        if len(text) > self.max_cached_chars:
+            return
+        self._counts[text] = count
+        if len(self._counts) > self.max_entries:
+            self._counts.popitem(last=False)
+
+    def _encode_count(self, text: str) -> int:
+        encoding = self.encoding
+        if encoding is None:
+            return len(text.split())  # Rough estimate
+        try:
+            return len(encoding.encode_ordinary(text))
+        except Exception:
+            return len(text.split())  # Fallback to word count
+
+    def _encode_counts(self, texts: List[str]) -> List[int]:
+        encoding = self.encoding
+        if encoding is None or len(texts) == 1:
+            return [self._encode_count(text) for text in texts]
+        try:
+            return [len(tokens) for tokens in encoding.encode_ordinary_batch(texts)]
+        except Exception:
+            return [self._encode_count(text) for text in texts]
+
+# Create singleton instance
+tokenizer = TokenizerService()
@@ -0,0 +1,333 @@
+"""
+SHELTR-AI Vector Index
+Resident in-memory index of knowledge chunk embeddings for fast semantic search
+"""
+
+import os
+import time
+import logging
+import asyncio
+from typing import Dict, List, Any, Optional, Iterable, Tuple, Callable
+
+import numpy as np
+
+# Firebase imports
+from firebase_admin import firestore
+
+logger = logging.getLogger(__name__)
+
+class VectorIndex:
+    """Contiguous float32 matrix of pre-normalized chunk embeddings kept in sync with Firestore"""
+
+    # Chunk metadata fields that can be used to pre-filter a search
+    FILTER_FIELDS = ('access_level', 'shelter_id', 'category')
+
+    def __init__(self):
+        # Firebase client (lazy initialization)
+        self._db = None
+
+        # Index storage - row i of the matrix belongs to self._chunks[i]
+        self._matrix: Optional[np.ndarray] = None
+        self._size = 0
+        self._chunks: List[Dict[str, Any]] = []
+        self._document_ids: List[str] = []
+        self._row_by_chunk_id: Dict[str, int] = {}
+
+        # Per-row metadata columns and lazily built (field, value) -> row bitmaps
+        self._columns: Dict[str, List[Any]] = {field: [] for field in self.FILTER_FIELDS}
+        self._bitmaps: Dict[tuple, np.ndarray] = {}
+
+        # Bumped on every change to the rows, so masks built for one version are never applied to another
+        self._version = 0
+
+        # Score only the selected rows when a filter keeps less than this share of the corpus
+        self.subset_scoring_ratio = 0.3
+
+        # Sync state
+        self._loaded = False
+        self._loaded_at = 0.0
+        self._load_lock = asyncio.Lock()
+        self.refresh_interval = int(os.getenv("VECTOR_INDEX_REFRESH_SECONDS", 300))
+        self.load_page_size = 500
+        
+        # Called with a document id (or None for "anything may have changed") when knowledge changes
+        self._change_listeners: List[Callable[[Optional[str]], None]] = []
+
+    @property
+    def db(self):
+        """Lazy initialization of Firestore client"""
+        if self._db is None:
+            self._db = firestore.client()
+        return self._db
+
+    def add_change_listener(self, listener: Callable[[Optional[str]], None]):
+        """Register a callback for knowledge changes, e.g. to invalidate caches of generated answers"""
+        self._change_listeners.append(listener)
+
+    def _notify_change(self, document_id: Optional[str]):
+        for listener in self._change_listeners:
+            try:
+                listener(document_id)
+            except Exception as e:
+                logger.error(f"Vector index change listener failed: {str(e)}")
+
+    @property
+    def size(self) -> int:
+        """Number of chunks currently indexed"""
+        return self._size
+
+    @property
+    def version(self) -> int:
+        """Row layout version; row masks are only valid for the version they were built against"""
+        return self._version
+
+    async def ensure_loaded(self):
+        """Load the index on first use and reload it once it is older than the refresh interval"""
+        if self._loaded and (time.time() - self._loaded_at) < self.refresh_interval:
+            return
+
+        async with self._load_lock:
+            # Another caller may have finished loading while we waited
+            if self._loaded and (time.time() - self._loaded_at) < self.refresh_interval:
+                return
+            await self.reload()
+
+    async def reload(self):
+        """Rebuild the index from the knowledge_chunks collection"""
+        start_time = time.time()
+
+        chunks = []
+        vectors = []
+        last_doc = None
+
+        # Page through the collection so the whole corpus is indexed, not just the first page
+        while True:
+            query = self.db.collection('knowledge_chunks').order_by('__name__').limit(self.load_page_size)
+            if last_doc is not None:
+                query = query.start_after(last_doc)
+
+            page = list(query.stream())
+            for chunk_doc in page:
+                chunk_data = chunk_doc.to_dict()
+                embedding = chunk_data.pop('embedding', None)
+                if not embedding:
+                    continue
+                chunks.append({'chunk_id': chunk_doc.id, **chunk_data})
+                vectors.append(embedding)
+
+            if len(page) < self.load_page_size:
+                break
+            last_doc = page[-1]
+
+        # Reloads also pick up documents changed by other workers
+        previous_chunk_ids = set(self._row_by_chunk_id)
+        was_loaded = self._loaded
+
+        self._reset()
+        self._append(chunks, vectors)
+        if was_loaded and set(self._row_by_chunk_id) != previous_chunk_ids:
+            self._notify_change(None)
+        self._loaded = True
+        self._loaded_at = time.time()
+
+        logger.info(f"Vector index loaded {self._size} chunks in {time.time() - start_time:.2f}s")
+
+    def add_chunks(self, chunks: List[Dict[str, Any]]):
+        """Add freshly stored chunks (each with 'chunk_id' and 'embedding') to a loaded index"""
+        for document_id in {chunk.get('document_id') for chunk in chunks}:
+            self._notify_change(document_id)
+
+        if not self._loaded or not chunks:
+            # An unloaded index will pick the chunks up from Firestore on first load
+            return
+
+        new_chunks = []
+        vectors = []
+        for chunk in chunks:
+            chunk_data = dict(chunk)
+            embedding = chunk_data.pop('embedding', None)
+            if not embedding or chunk_data.get('chunk_id') in self._row_by_chunk_id:
+                continue
+            new_chunks.append(chunk_data)
+            vectors.append(embedding)
+
+        self._append(new_chunks, vectors)
+
+    def remove_document(self, document_id: str):
+        """Drop every chunk that belongs to a document"""
+        self._notify_change(document_id)
+
+        if not self._loaded or self._size == 0:
+            return
+
+        keep = np.array(self._document_ids[:self._size]) != document_id
+        if keep.all():
+            return
+
+        rows = np.flatnonzero(keep)
+        self._matrix = np.ascontiguousarray(self._matrix[rows])
+        self._chunks = [self._chunks[i] for i in rows]
+        self._document_ids = [self._document_ids[i] for i in rows]
+        for field, column in self._columns.items():
+            self._columns[field] = [column[i] for i in rows]
+        self._size = len(rows)
+        self._reindex()
+
+        logger.debug(f"Removed document {document_id} from vector index")
+
+    def update_document_metadata(self, document_id: str, fields: Dict[str, Any]):
+        """Apply edited document fields (e.g. access_level or category) to the metadata of its indexed chunks"""
+        self._notify_change(document_id)
+
+        fields = {field: value for field, value in fields.items() if field in self.FILTER_FIELDS}
+        if not self._loaded or not fields:
+            return
+
+        rows = [row for row, doc_id in enumerate(self._document_ids) if doc_id == document_id]
+        if not rows:
+            return
+
+        for row in rows:
+            chunk = dict(self._chunks[row])
+            chunk['metadata'] = {**(chunk.get('metadata') or {}), **fields}
+            self._chunks[row] = chunk
+            for field, value in fields.items():
+                self._columns[field][row] = value
+        self._bitmaps = {}
+        self._version += 1
+
+    def document_ids(self, mask: Optional[np.ndarray] = None) -> Iterable[str]:
+        """Distinct document ids present in the index, optionally limited to masked rows"""
+        if mask is None:
+            return set(self._document_ids)
+        return {self._document_ids[row] for row in np.flatnonzero(mask)}
+
+    def bitmap(self, field: str, values: Iterable[Any]) -> np.ndarray:
+        """Boolean row mask of chunks whose metadata field equals any of the values"""
+        mask = np.zeros(self._size, dtype=bool)
+        for value in set(values):
+            key = (field, value)
+            value_bitmap = self._bitmaps.get(key)
+            if value_bitmap is None:
+                value_bitmap = np.fromiter(
+                    (row_value == value for row_value in self._columns[field]),
+                    dtype=bool,
+                    count=self._size
+                )
+                self._bitmaps[key] = value_bitmap
+            mask = mask | value_bitmap
+        return mask
+
+    def document_mask(self, document_ids: Iterable[str]) -> np.ndarray:
+        """Boolean row mask selecting the chunks of the given documents"""
+        allowed = set(document_ids)
+        return np.fromiter(
+            (doc_id in allowed for doc_id in self._document_ids),
+            dtype=bool,
+            count=self._size
+        )
+
+    def search(
+        self,
+        query_embedding: List[float],
+        limit: int = 5,
+        similarity_threshold: float = 0.0,
+        mask: Optional[np.ndarray] = None,
+        version: Optional[int] = None
+    ) -> List[Tuple[Dict[str, Any], float]]:
+        """
+        Return the top-k (chunk, similarity) pairs using one matrix-vector product
+
+        A mask must come with the version it was built against; if the rows have changed since,
+        nothing is returned rather than scoring the mask against the wrong rows.
+        """
+        if self._size == 0 or limit <= 0:
+            return []
+        if mask is not None and (version != self._version or len(mask) != self._size):
+            logger.warning("Vector index changed while a search mask was being built; discarding the mask")
+            return []
+
+        query = np.array(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm == 0 or query.shape[0] != self._matrix.shape[1]:
+            return []
+        query /= norm
+
+        # Rows are pre-normalized, so the dot product is the cosine similarity
+        if mask is None:
+            rows = None
+            scores = self._matrix[:self._size] @ query
+        else:
+            rows = np.flatnonzero(mask)
+            if len(rows) == 0:
+                return []
+            if len(rows) < self._size * self.subset_scoring_ratio:
+                # Narrow filters only pay for the rows the caller may see
+                scores = self._matrix[rows] @ query
+            else:
+                scores = (self._matrix[:self._size] @ query)[rows]
+
+        k = min(limit, len(scores))
+        if k < len(scores):
+            top = np.argpartition(scores, -k)[-k:]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(scores[top])[::-1]]
+
+        return [
+            (self._chunks[row if rows is None else rows[row]], float(scores[row]))
+            for row in top
+            if scores[row] >= similarity_threshold
+        ]
+
+    def _reset(self):
+        """Clear all indexed data"""
+        self._matrix = None
+        self._size = 0
+        self._chunks = []
+        self._document_ids = []
+        self._row_by_chunk_id = {}
+        self._columns = {field: [] for field in self.FILTER_FIELDS}
+        self._bitmaps = {}
+        self._version += 1
+
+    def _append(self, chunks: List[Dict[str, Any]], vectors: List[List[float]]):
+        """Normalize and append rows, growing the backing matrix geometrically"""
+        if not chunks:
+            return
+
+        block = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(block, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        block /= norms
+
+        needed = self._size + len(chunks)
+        if self._matrix is None:
+            self._matrix = np.empty((max(needed, 64), block.shape[1]), dtype=np.float32)
+        elif needed > self._matrix.shape[0]:
+            grown = np.empty((max(needed, self._matrix.shape[0] * 2), self._matrix.shape[1]), dtype=np.float32)
+            grown[:self._size] = self._matrix[:self._size]
+            self._matrix = grown
+
+        self._matrix[self._size:needed] = block
+        self._bitmaps = {}
+        for offset, chunk in enumerate(chunks):
+            self._row_by_chunk_id[chunk['chunk_id']] = self._size + offset
+            self._document_ids.append(chunk.get('document_id'))
+            self._chunks.append(chunk)
+            metadata = chunk.get('metadata') or {}
+            for field, column in self._columns.items():
+                column.append(metadata.get(field))
+        self._size = needed
+        self._version += 1
+
+    def _reindex(self):
+        """Rebuild the row lookups after compaction"""
+        self._bitmaps = {}
+        self._version += 1
+        self._row_by_chunk_id = {
+            chunk['chunk_id']: row for row, chunk in enumerate(self._chunks)
+        }
+
+# Create singleton instance
+vector_index = VectorIndex()
@@ -0,0 +1,317 @@
+"""
+SHELTR-AI WebSocket Hub
+Per-connection send queues with backpressure and heartbeats, ordered per-user message processing,
+and a pub/sub bridge that reaches users connected to other workers
+"""
+
+import os
+import json
+import time
+import uuid
+import asyncio
+import logging
+from typing import Dict, Any, Optional, Set, Callable, Awaitable
+
+logger = logging.getLogger(__name__)
+
+class ClientConnection:
+    """One WebSocket with its own bounded outbound queue, writer task and heartbeat"""
+
+    def __init__(
+        self,
+        websocket,
+        user_id: str,
+        queue_size: int,
+        send_timeout: float,
+        heartbeat_seconds: float,
+        idle_timeout: float,
+        on_close: Callable[["ClientConnection"], None]
+    ):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.send_timeout = send_timeout
+        self.heartbeat_seconds = heartbeat_seconds
+        self.idle_timeout = idle_timeout
+        self.on_close = on_close
+
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.last_seen = time.monotonic()
+        self.closed = False
+        self.max_queue_depth = 0
+        self._writer: Optional[asyncio.Task] = None
+        self._heartbeat: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._writer = asyncio.create_task(self._write_loop())
+        if self.heartbeat_seconds > 0:
+            self._heartbeat = asyncio.create_task(self._heartbeat_loop())
+
+    def touch(self):
+        """Record inbound activity (any frame, including pongs)"""
+        self.last_seen = time.monotonic()
+
+    async def send(self, text: str) -> bool:
+        """
+        Queue a frame, waiting while the queue is full
+
+        A client that stays full for send_timeout is too slow to keep up and is disconnected,
+        so one stalled browser cannot hold server memory or block the producer indefinitely.
+        """
+        if self.closed:
+            return False
+        try:
+            await asyncio.wait_for(self.queue.put(text), self.send_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"WebSocket send queue full for user {self.user_id}, disconnecting slow client")
+            await self.close(code=1013)
+            return False
+        self.max_queue_depth = max(self.max_queue_depth, self.queue.qsize())
+        return True
+
+    async def close(self, code: int = 1000):
+        """Stop the writer and heartbeat and close the socket"""
+        if self.closed:
+            return
+        self.closed = True
+        self.on_close(self)
+        current = asyncio.current_task()
+        for task in (self._writer, self._heartbeat):
+            if task is not None and task is not current:
+                task.cancel()
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass  # Already closed by the client
+
+    async def _write_loop(self):
+        try:
+            while True:
+                text = await self.queue.get()
+                await self.websocket.send_text(text)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.info(f"WebSocket send failed for user {self.user_id}: {str(e)}")
+            await self.close(code=1011)
+
+    async def _heartbeat_loop(self):
+        try:
+            while not self.closed:
+                await asyncio.sleep(self.heartbeat_seconds)
+                if self.idle_timeout > 0 and time.monotonic() - self.last_seen > self.idle_timeout:
+                    logger.info(f"WebSocket idle for user {self.user_id}, closing")
+                    await self.close(code=1001)
+                    return
+                # Skip the ping if the client is already backed up; it has data to read
+                if self.queue.empty():
+                    self.queue.put_nowait(json.dumps({"type": "ping", "timestamp": time.time()}))
+        except asyncio.CancelledError:
+            raise
+
+class InMemoryPubSub:
+    """Process-local stand-in for a message bus: every listener in this process sees every message"""
+
+    def __init__(self):
+        self._listeners: Set[asyncio.Queue] = set()
+
+    async def publish(self, message: Dict[str, Any]):
+        for queue in list(self._listeners):
+            queue.put_nowait(message)
+
+    async def listen(self, handler: Callable[[Dict[str, Any]], Awaitable[None]]):
+        queue: asyncio.Queue = asyncio.Queue()
+        self._listeners.add(queue)
+        try:
+            while True:
+                await handler(await queue.get())
+        finally:
+            self._listeners.discard(queue)
+
+class RedisPubSub:
+    """Bridges workers through a Redis-protocol pub/sub channel"""
+
+    def __init__(self, client, channel: str = "sheltr:websocket"):
+        self.client = client
+        self.channel = channel
+
+    async def publish(self, message: Dict[str, Any]):
+        await self.client.publish(self.channel, json.dumps(message))
+
+    async def listen(self, handler: Callable[[Dict[str, Any]], Awaitable[None]]):
+        pubsub = self.client.pubsub()
+        await pubsub.subscribe(self.channel)
+        try:
+            async for item in pubsub.listen():
+                if item.get("type") == "message":
+                    await handler(json.loads(item["data"]))
+        finally:
+            await pubsub.unsubscribe(self.channel)
+
+def create_pubsub():
+    """Build the bridge selected by WEBSOCKET_PUBSUB ('memory' or 'redis')"""
+    if os.getenv("WEBSOCKET_PUBSUB", "memory").lower() == "redis":
+        try:
+            import redis.asyncio as redis_asyncio
+
+            client = redis_asyncio.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+            logger.info("WebSocket pub/sub: redis")
+            return RedisPubSub(client)
+        except ImportError:
+            logger.warning("redis package not installed, falling back to in-memory WebSocket pub/sub")
+    return InMemoryPubSub()
+
+class ConnectionManager:
+    """Tracks every local WebSocket by user and delivers frames locally or through the bridge"""
+
+    def __init__(self, pubsub=None):
+        self.queue_size = int(os.getenv("WS_SEND_QUEUE_SIZE", 256))
+        self.send_timeout = float(os.getenv("WS_SEND_TIMEOUT_SECONDS", 10))
+        self.heartbeat_seconds = float(os.getenv("WS_HEARTBEAT_SECONDS", 25))
+        # 0 disables idle disconnects for clients that never answer pings
+        self.idle_timeout = float(os.getenv("WS_IDLE_TIMEOUT_SECONDS", 0))
+        self.max_pending_messages = int(os.getenv("WS_MAX_PENDING_MESSAGES", 16))
+
+        self.worker_id = uuid.uuid4().hex
+        self.pubsub = pubsub or create_pubsub()
+        self.active_connections: Dict[str, Set[ClientConnection]] = {}
+        self._inboxes: Dict[str, asyncio.Queue] = {}
+        self._processors: Dict[str, asyncio.Task] = {}
+        self._listener: Optional[asyncio.Task] = None
+
+        # Counters
+        self.slow_disconnects = 0
+        self.rejected_messages = 0
+        self.published = 0
+        self.remote_delivered = 0
+
+    async def connect(self, websocket, user_id: str) -> ClientConnection:
+        """Accept a WebSocket connection and start its writer"""
+        await websocket.accept()
+        self._ensure_listener()
+        connection = ClientConnection(
+            websocket, user_id, self.queue_size, self.send_timeout,
+            self.heartbeat_seconds, self.idle_timeout, self._forget
+        )
+        connection.start()
+        self.active_connections.setdefault(user_id, set()).add(connection)
+        logger.info(f"WebSocket connected for user {user_id}")
+        return connection
+
+    async def disconnect(self, connection: ClientConnection):
+        """Close and remove a WebSocket connection"""
+        await connection.close()
+        logger.info(f"WebSocket disconnected for user {connection.user_id}")
+
+    def submit(self, user_id: str, job: Callable[[], Awaitable[None]]) -> bool:
+        """
+        Queue work for a user; jobs for one user run one at a time in arrival order,
+        while different users are processed concurrently. False if the user's backlog is full.
+        """
+        inbox = self._inboxes.get(user_id)
+        if inbox is None:
+            inbox = self._inboxes[user_id] = asyncio.Queue(maxsize=self.max_pending_messages)
+        try:
+            inbox.put_nowait(job)
+        except asyncio.QueueFull:
+            self.rejected_messages += 1
+            return False
+
+        if user_id not in self._processors:
+            self._processors[user_id] = asyncio.create_task(self._process_user(user_id, inbox))
+        return True
+
+    async def send_to_user(self, user_id: str, frame: Dict[str, Any]):
+        """
+        Deliver a frame to the user's connections here, or publish it for other workers when the
+        user has none here. Chat replies go back over the socket that asked, so the common case
+        (including every streamed token delta) never touches pub/sub.
+        """
+        text = json.dumps(frame)
+        if self.active_connections.get(user_id):
+            await self._deliver_local(user_id, text)
+            return
+        try:
+            await self.pubsub.publish({"origin": self.worker_id, "user_id": user_id, "frame": text})
+            self.published += 1
+        except Exception as e:
+            logger.error(f"Error publishing WebSocket frame for {user_id}: {str(e)}")
+
+    async def send_personal_message(self, message: str, user_id: str):
+        """Send an already serialized message to a specific user's local connections"""
+        await self._deliver_local(user_id, message)
+
+    def connection_count(self) -> int:
+        return sum(len(connections) for connections in self.active_connections.values())
+
+    def get_stats(self) -> Dict[str, Any]:
+        depths = [
+            connection.queue.qsize()
+            for connections in self.active_connections.values()
+            for connection in connections
+        ]
+        return {
+            'worker_id': self.worker_id,
+            'pubsub': type(self.pubsub).__name__,
+            'connections': len(depths),
+            'users': len(self.active_connections),
+            'queued_frames': sum(depths),
+            'max_queued_frames': max(depths) if depths else 0,
+            'users_processing': len(self._processors),
+            'slow_disconnects': self.slow_disconnects,
+            'rejected_messages': self.rejected_messages,
+            'published': self.published,
+            'remote_delivered': self.remote_delivered
+        }
+
+    async def _deliver_local(self, user_id: str, text: str) -> int:
+        connections = list(self.active_connections.get(user_id, ()))
+        if not connections:
+            return 0
+        # Fan out concurrently so one slow tab does not delay the others
+        results = await asyncio.gather(*(connection.send(text) for connection in connections))
+        self.slow_disconnects += sum(1 for sent, connection in zip(results, connections) if not sent and connection.closed)
+        return sum(results)
+
+    async def _process_user(self, user_id: str, inbox: asyncio.Queue):
+        try:
+            while not inbox.empty():
+                job = inbox.get_nowait()
+                try:
+                    await job()
+                except Exception as e:
+                    logger.error(f"WebSocket job failed for user {user_id}: {str(e)}")
+        finally:
+            # No await between the empty check and here, so no job can slip in unprocessed
+            self._processors.pop(user_id, None)
+            self._inboxes.pop(user_id, None)
+
+    def _forget(self, connection: ClientConnection):
+        connections = self.active_connections.get(connection.user_id)
+        if connections is not None:
+            connections.discard(connection)
+            if not connections:
+                del self.active_connections[connection.user_id]
+
+    def _ensure_listener(self):
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.create_task(self._listen())
+
+    async def _listen(self):
+        """Deliver frames published by other workers to users connected here"""
+        async def handle(message: Dict[str, Any]):
+            if message.get("origin") == self.worker_id:
+                return
+            if await self._deliver_local(message["user_id"], message["frame"]):
+                self.remote_delivered += 1
+
+        while True:
+            try:
+                await self.pubsub.listen(handle)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"WebSocket pub/sub listener error: {str(e)}")
+                await asyncio.sleep(1)
+
+# Create singleton instance
+connection_manager = ConnectionManager()
@@ -0,0 +1,9 @@
+"""
+Shared pytest setup for the SHELTR-AI API tests
+"""
+
+import os
+import sys
+
+# Import services the same way main.py and the scripts do
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
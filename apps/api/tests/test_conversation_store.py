@@ -0,0 +1,160 @@
+"""
+Tests for the chatbot conversation stores: the in-process LRU and the Redis backend against fakeredis
+"""
+
+import json
+import asyncio
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from services.chatbot.conversation_store import InMemoryConversationStore, RedisConversationStore
+
+class Context:
+    """Minimal stand-in for ConversationContext"""
+
+    def __init__(self, user_id: str, turns=None):
+        self.user_id = user_id
+        self.turns = list(turns or [])
+
+    def estimate_size(self) -> int:
+        return 100 + sum(len(turn) for turn in self.turns)
+
+def encode(context: Context) -> bytes:
+    return json.dumps({'user_id': context.user_id, 'turns': context.turns}).encode('utf-8')
+
+def decode(payload: bytes) -> Context:
+    data = json.loads(payload)
+    return Context(data['user_id'], data['turns'])
+
+def redis_store(ttl_seconds: int = 60) -> RedisConversationStore:
+    return RedisConversationStore(fakeredis.FakeAsyncRedis(), encode, decode, ttl_seconds=ttl_seconds)
+
+# In-memory backend
+
+def test_memory_store_evicts_least_recently_used_beyond_max_entries():
+    async def scenario():
+        store = InMemoryConversationStore(max_entries=2, max_bytes=10 ** 6, ttl_seconds=60)
+        for user_id in ('a', 'b'):
+            await store.save(user_id, Context(user_id))
+        await store.get('a')  # 'b' is now the least recently used
+        await store.save('c', Context('c'))
+
+        assert await store.get('b') is None
+        assert (await store.get('a')).user_id == 'a'
+        assert store.get_stats()['evictions'] == 1
+
+    asyncio.run(scenario())
+
+def test_memory_store_stays_within_max_bytes():
+    async def scenario():
+        store = InMemoryConversationStore(max_entries=100, max_bytes=1000, ttl_seconds=60)
+        for i in range(10):
+            await store.save(f"user{i}", Context(f"user{i}", ["x" * 200]))
+
+        stats = store.get_stats()
+        assert stats['approx_bytes'] <= 1000
+        assert stats['entries'] == 3
+        assert (await store.get('user9')).user_id == 'user9'
+
+    asyncio.run(scenario())
+
+def test_memory_store_expires_and_slides_ttl(monkeypatch):
+    async def scenario():
+        clock = [1000.0]
+        monkeypatch.setattr("services.chatbot.conversation_store.time.time", lambda: clock[0])
+        store = InMemoryConversationStore(ttl_seconds=60)
+        await store.save('a', Context('a'))
+        await store.save('b', Context('b'))
+
+        clock[0] += 50
+        assert await store.get('a') is not None  # Reading keeps 'a' alive for another 60s
+        clock[0] += 50
+        assert await store.get('a') is not None
+        assert await store.get('b') is None
+        assert store.get_stats()['expirations'] == 1
+
+    asyncio.run(scenario())
+
+# Redis backend
+
+def test_redis_store_round_trips_and_sets_ttl():
+    async def scenario():
+        store = redis_store(ttl_seconds=60)
+        await store.save('a', Context('a', ["hello"]))
+
+        context = await store.get('a')
+        assert context.turns == ["hello"]
+        assert 0 < await store.client.ttl(store._key('a')) <= 60
+        assert await store.get('missing') is None
+        assert store.get_stats()['hits'] == 1
+        assert store.get_stats()['misses'] == 1
+
+    asyncio.run(scenario())
+
+def test_redis_store_saving_refreshes_ttl():
+    async def scenario():
+        store = redis_store(ttl_seconds=60)
+        await store.save('a', Context('a'))
+        await store.client.expire(store._key('a'), 5)
+
+        await store.save('a', Context('a', ["next turn"]))
+        assert await store.client.ttl(store._key('a')) > 5
+
+    asyncio.run(scenario())
+
+def test_redis_store_discards_undecodable_payload():
+    async def scenario():
+        store = redis_store()
+        await store.client.set(store._key('a'), b'\x00not a context')
+
+        assert await store.get('a') is None
+        assert await store.client.exists(store._key('a')) == 0
+        assert store.get_stats()['decode_errors'] == 1
+
+        # The user starts a fresh conversation instead of failing on every message
+        await store.save('a', Context('a'))
+        assert (await store.get('a')).user_id == 'a'
+
+    asyncio.run(scenario())
+
+def test_redis_store_update_applies_mutation_and_keeps_ttl():
+    async def scenario():
+        store = redis_store(ttl_seconds=60)
+        await store.save('a', Context('a', ["one"]))
+
+        def add_turn(context):
+            context.turns.append("two")
+            return True
+
+        assert await store.update('a', add_turn) is True
+        assert (await store.get('a')).turns == ["one", "two"]
+        assert 0 < await store.client.ttl(store._key('a')) <= 60
+        assert await store.update('missing', add_turn) is False
+        assert await store.update('a', lambda context: False) is False
+
+    asyncio.run(scenario())
+
+def test_redis_store_update_retries_when_another_save_lands():
+    async def scenario():
+        server = fakeredis.FakeServer()
+        store = RedisConversationStore(fakeredis.FakeAsyncRedis(server=server), encode, decode, ttl_seconds=60)
+        other_worker = fakeredis.FakeRedis(server=server)
+        await store.save('a', Context('a', ["one"]))
+        seen = []
+
+        def summarize(context):
+            seen.append(list(context.turns))
+            if len(seen) == 1:
+                # Another worker saves a new turn between this read and the write
+                other_worker.set(store._key('a'), encode(Context('a', ["one", "two"])))
+            context.turns.append("summary")
+            return True
+
+        assert await store.update('a', summarize) is True
+        assert seen == [["one"], ["one", "two"]]
+        assert (await store.get('a')).turns == ["one", "two", "summary"]
+        assert store.get_stats()['conflicts'] == 1
+
+    asyncio.run(scenario())